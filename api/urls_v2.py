@@ -8,6 +8,7 @@ from rest_framework_extensions.routers import ExtendedDefaultRouter
 import userprofile.api.views
 import course.api.views
 import course.api.lti_views
+import deviations.api.views
 import exercise.api.views
 import exercise.api.csv.views
 import external_services.api.views
@@ -79,6 +80,9 @@ with api.register(r'courses',
     courses.register(r'bestresultsdata',
                      exercise.api.csv.views.CourseBestResultsDataViewSet,
                      basename='course-resultsdata-best')
+    courses.register(r'gradesdata',
+                     exercise.api.csv.views.CourseGradesDataViewSet,
+                     basename='course-gradesdata')
     courses.register(r'mygroups',
                      course.api.views.CourseOwnStudentGroupsViewSet,
                      basename='course-mygroups')
@@ -88,6 +92,15 @@ with api.register(r'courses',
     courses.register(r'news',
                      course.api.views.CourseNewsViewSet,
                      basename='course-news')
+    courses.register(r'deadlinedeviations',
+                     deviations.api.views.CourseDeadlineDeviationsViewSet,
+                     basename='course-deadlinedeviations')
+    courses.register(r'submissiondeviations',
+                     deviations.api.views.CourseSubmissionDeviationsViewSet,
+                     basename='course-submissiondeviations')
+    courses.register(r'reassignsubmitters',
+                     exercise.api.views.CourseSubmitterReassignViewSet,
+                     basename='course-reassignsubmitters')
     courses.register(r'lineitems',
                     course.api.lti_views.CourseLineItemsViewSet,
                     basename='course-lineitems')
@@ -116,6 +129,7 @@ urlpatterns = [
     re_path(r'^me', userprofile.api.views.MeDetail.as_view()),
     re_path(r'^lti-outcomes', external_services.api.views.LTIExerciseBasicOutcomesView.as_view(), name='lti-outcomes'),
     path('statistics/', lib.api.statistics.BaseStatisticsView.as_view(), name='statistics'),
+    path('query-stats/', lib.api.statistics.QueryStatsView.as_view(), name='query-stats'),
     path(
         'courses/<int:course_id>/statistics/',
         course.api.views.CourseStatisticsView.as_view(),
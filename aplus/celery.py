@@ -26,6 +26,13 @@ def setup_periodic_tasks(sender, **kwargs):
         # Run timed check twice in timeout period, for more timely retries
         sender.add_periodic_task(settings.SUBMISSION_EXPIRY_TIMEOUT/2, retry_submissions.s(), name='retry_submissions')
 
+    if settings.SUBMISSION_STATISTICS_ROLLUP_SCHEDULE:
+        sender.add_periodic_task(
+            settings.SUBMISSION_STATISTICS_ROLLUP_SCHEDULE,
+            sender.signature('exercise.tasks.rollup_submission_statistics'),
+            name='rollup_submission_statistics',
+        )
+
 @app.task
 def enroll():
     """
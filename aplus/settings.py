@@ -292,6 +292,55 @@ SUBMISSION_RETRY_LIMIT = 3
 # requests in this case.
 GRADER_STABLE_THRESHOLD = 5
 
+##########################################################################
+# Hourly rollups of submission statistics for the statistics API
+
+# Schedule of the Celery task that rolls up the whole hours that have passed.
+# If set to None, the statistics are always counted from the submissions.
+SUBMISSION_STATISTICS_ROLLUP_SCHEDULE = 10 * 60
+
+# Maximum number of hours that are rolled up in one database transaction.
+# The first run rolls up all the submissions in the database in batches of this size.
+SUBMISSION_STATISTICS_ROLLUP_MAX_HOURS = 24 * 7
+
+# Number of seconds the submission counts of the staff submission tables are
+# cached, so that they are not counted again for each page of the table.
+SUBMISSION_TABLE_COUNT_CACHE_TIMEOUT = 5 * 60
+
+# Number of seconds the manual assessment queue of an exercise is cached. The
+# queue is built again sooner, if new submitters may have been added to it.
+ASSESSMENT_QUEUE_TIMEOUT = 10 * 60
+
+# Number of seconds an assistant keeps the submitter opened from the manual
+# assessment queue, so that other assistants are given other submitters.
+ASSESSMENT_CLAIM_TIMEOUT = 15 * 60
+
+# Number of processes that render the diplomas of a course in the background
+# job. The processes are forked from the Celery worker, so this should be 1
+# if the worker pool does not allow its processes to have child processes.
+DIPLOMA_RENDER_WORKERS = 1
+
+# Maximum number of seconds the rendered course table of contents and results
+# of a user are cached. They are rendered again whenever the course content
+# or the points of the user change, or a module opens or closes.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Record the number of SQL queries, SQL time and cache calls of each request
+# (lib/querystats.py). Staff users get them in the X-Aplus-Query-Stats header.
+QUERY_STATS_ENABLED = False
+# Requests that make more queries than this are logged as warnings.
+QUERY_STATS_LOG_THRESHOLD = 100
+# Fraction of the requests that are aggregated for the query-stats API.
+QUERY_STATS_SAMPLE_RATE = 0.01
+
+# Profile requests with cProfile (lib/profiler.py). A PROFILER_SAMPLE_RATE
+# fraction of the requests and the requests of staff users with the
+# X-Aplus-Profile header are profiled. The profiles are written to PROFILER_DIR
+# and can be summarized with `manage.py profile_report`.
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_RATE = 0.0
+PROFILER_DIR = join(BASE_DIR, 'profiles')
+
 ## Celery
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
@@ -300,6 +349,7 @@ CELERY_BROKER_URL = 'redis://redis:6379'
 CELERY_RESULT_BACKEND = 'redis://redis:6379'
 
 MIDDLEWARE = [
+    'lib.querystats.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -309,7 +359,8 @@ MIDDLEWARE = [
     'social_django.middleware.SocialAuthExceptionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'lib.request_globals.ClearRequestGlobals'
+    'lib.request_globals.ClearRequestGlobals',
+    'lib.profiler.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'aplus.urls'
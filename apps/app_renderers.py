@@ -30,7 +30,6 @@ data required by the plugin view.
 import logging
 import urllib.request
 
-from bs4 import BeautifulSoup
 from django.template.loader import get_template
 
 from lib.helpers import update_url_params
@@ -165,6 +164,7 @@ class TabRenderer:
         opener = urllib.request.build_opener()
         content = opener.open(url, timeout=5).read()
 
+        from bs4 import BeautifulSoup # pylint: disable=import-outside-toplevel
         soup = BeautifulSoup(content)
 
         # If there's no element specified, use the BODY.
@@ -15,7 +15,6 @@ from django.db import models
 from django.template import loader
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
-import feedparser
 
 from apps.app_renderers import ExternalIFramePluginRenderer, \
     ExternalIFrameTabRenderer, TabRenderer
@@ -186,6 +185,7 @@ class RSSPlugin(BasePlugin):
     )
 
     def render(self):
+        import feedparser # pylint: disable=import-outside-toplevel
         doc = feedparser.parse(self.feed_url)
         feed = doc.feed
 
@@ -615,7 +615,7 @@ class CourseStudentsViewSet(NestedViewSetMixin,
         user = self.get_object().user
         enrollment = self.instance.get_enrollment_for(user)
         enrollment.status = status_code
-        enrollment.save()
+        enrollment.save(update_fields=['status'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -1007,6 +1007,9 @@ class CourseStatisticsView(BaseStatisticsView):
             exercise__course_module__course_instance=course_id,
         )
 
+    def get_rollup_scope(self):
+        return { 'course_instance_id': int(self.kwargs['course_id']) }
+
     def get_object(self):
         obj = super().get_object()
         obj.update({ 'course_id': self.kwargs['course_id'] })
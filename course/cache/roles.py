@@ -0,0 +1,126 @@
+from __future__ import annotations
+from typing import ClassVar, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from lib.cache.cached import CacheBase, DBDataManager, Dependencies, ProxyManager
+from lib.request_globals import RequestGlobal, get_global
+from userprofile.models import UserProfile
+from .menu import CachedTopMenu
+from ..models import CourseInstance, Enrollment, StudentGroup
+
+
+def _group_members(group: StudentGroup) -> Iterator[Tuple[int, int]]:
+    # Deleting a group sets Enrollment.selected_group to null without signals
+    for profile in group.members.all():
+        yield group.course_instance_id, profile.id
+
+
+class CachedEnrollment(CacheBase):
+    """The enrollment of a user in a course instance, or None if there is none"""
+    KEY_PREFIX: ClassVar[str] = 'enrollment'
+    NUM_PARAMS: ClassVar[int] = 2
+    INVALIDATORS = [
+        (Enrollment, [post_delete, post_save], ("course_instance_id", "user_profile_id")),
+        (StudentGroup, [pre_delete], _group_members),
+    ]
+    enrollment: Optional[Enrollment]
+
+    @classmethod
+    def get( # pylint: disable=arguments-differ
+            cls,
+            instance: Union[CourseInstance, int],
+            profile: Union[UserProfile, int],
+            ) -> CachedEnrollment:
+        return super()._get(params=cls.parameter_ids(instance, profile))
+
+    def _generate_data(
+            self,
+            precreated: ProxyManager,
+            prefetched_data: Optional[DBDataManager] = None,
+            ) -> Optional[Dependencies]:
+        instance_id, profile_id = self._params
+        self.enrollment = (
+            Enrollment.objects
+            .filter(course_instance_id=instance_id, user_profile_id=profile_id)
+            .first()
+        )
+        return None
+
+
+class CourseRoles(RequestGlobal):
+    """Remembers the enrollments resolved during a request, so that the role
+    checks of a course page need to look up each enrollment only once.
+
+    Course views activate this with CourseRoles() at the beginning of the
+    request. Outside requests (and before activation) the enrollments are
+    read from the cache on each call.
+    """
+    ABSTRACT = False
+    enrollments: Dict[Tuple[int, int], Optional[Enrollment]]
+
+    def init(self):
+        self.enrollments = {}
+
+    def get_enrollment(self, instance_id: int, profile_id: int) -> Optional[Enrollment]:
+        key = (instance_id, profile_id)
+        if key not in self.enrollments:
+            self.enrollments[key] = CachedEnrollment.get(instance_id, profile_id).enrollment
+        return self.enrollments[key]
+
+    def forget(self, instance_id: int, profile_id: int) -> None:
+        self.enrollments.pop((instance_id, profile_id), None)
+
+
+def get_enrollment(instance: CourseInstance, profile: UserProfile) -> Optional[Enrollment]:
+    roles = get_global(CourseRoles)
+    if roles is None:
+        return CachedEnrollment.get(instance, profile).enrollment
+    return roles.get_enrollment(instance.id, profile.id)
+
+
+def forget_enrollment(sender, instance: Enrollment, **kwargs): # pylint: disable=unused-argument
+    roles = get_global(CourseRoles)
+    if roles is not None:
+        roles.forget(instance.course_instance_id, instance.user_profile_id)
+
+
+def invalidate_enrollment(enrollment: Enrollment) -> None:
+    """Invalidate the enrollment when it is modified without signals, e.g. with
+    QuerySet.update()"""
+    CachedEnrollment.invalidate(enrollment.course_instance_id, enrollment.user_profile_id)
+    forget_enrollment(Enrollment, enrollment)
+
+
+def invalidate_enrollments(enrollments: Sequence[Enrollment]) -> None:
+    """Invalidate the caches that depend on many enrollments with one cache
+    write per cache class, after they have been modified with bulk_create(),
+    bulk_update() or QuerySet.update(), which do not send signals"""
+    # pylint: disable=import-outside-toplevel
+    from exercise.cache.grades import CourseGrades
+    from exercise.cache.stats import CachedSubmitterCounts
+    if not enrollments:
+        return
+    profile_ids = {e.user_profile_id for e in enrollments}
+    user_ids = UserProfile.objects.filter(id__in=profile_ids).values_list('user_id', flat=True)
+    CachedEnrollment.invalidate_many([(e.course_instance_id, e.user_profile_id) for e in enrollments])
+    CachedTopMenu.invalidate_many([(user_id,) for user_id in user_ids])
+    instance_ids = {e.course_instance_id for e in enrollments}
+    CachedSubmitterCounts.invalidate_many([(instance_id,) for instance_id in instance_ids])
+    CourseGrades.invalidate_many([(instance_id,) for instance_id in instance_ids])
+    roles = get_global(CourseRoles)
+    if roles is not None:
+        for e in enrollments:
+            roles.forget(e.course_instance_id, e.user_profile_id)
+
+
+def forget_group_members(sender, instance: StudentGroup, **kwargs): # pylint: disable=unused-argument
+    roles = get_global(CourseRoles)
+    if roles is not None:
+        for instance_id, profile_id in _group_members(instance):
+            roles.forget(instance_id, profile_id)
+
+
+post_save.connect(forget_enrollment, sender=Enrollment)
+post_delete.connect(forget_enrollment, sender=Enrollment)
+pre_delete.connect(forget_group_members, sender=StudentGroup)
@@ -1,8 +1,14 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
+from django.db.models import Model
 from django.db.models.signals import post_save, post_delete
 
 from lib.cache import CachedAbstract
+from userprofile.models import UserProfile
 from ..models import (
+    USERTAG_EXTERNAL,
+    USERTAG_INTERNAL,
     UserTag,
     UserTagging,
 )
@@ -25,6 +31,37 @@ class CachedStudent(CachedAbstract):
             'tag_slugs': [t.slug for t in tags],
         }
 
+    def _generate_many(self, models_list, data_list): # pylint: disable=unused-argument
+        def model_id(model):
+            return model.id if isinstance(model, Model) else model
+
+        user_ids = {model_id(user) for _, user in models_list if user}
+        profiles = {
+            profile.user_id: profile
+            for profile in UserProfile.objects.filter(user_id__in=user_ids)
+        }
+
+        # One query for the taggings of all the users in all the course instances
+        instance_ids = {model_id(course_instance) for course_instance, _ in models_list}
+        taggings = defaultdict(list)
+        for tagging in (UserTagging.objects
+                .filter(course_instance_id__in=instance_ids, user__user_id__in=user_ids)
+                .select_related('tag', 'user')):
+            taggings[(tagging.course_instance_id, tagging.user.user_id)].append(tagging.tag)
+
+        result = []
+        for course_instance, user in models_list:
+            profile = profiles.get(model_id(user)) if user else None
+            if profile is None:
+                result.append({'tag_slugs': []})
+                continue
+            tags = [USERTAG_EXTERNAL if profile.is_external else USERTAG_INTERNAL]
+            tags.extend(taggings[(model_id(course_instance), profile.user_id)])
+            result.append({
+                'tag_slugs': [t.slug for t in tags],
+            })
+        return result
+
 
 def invalidate_student(sender, instance: UserTagging, **kwargs): # pylint: disable=unused-argument
     CachedStudent.invalidate(
@@ -38,10 +75,10 @@ post_delete.connect(invalidate_student, sender=UserTagging)
 
 def invalidate_students(sender, instance: UserTag, **kwargs): # pylint: disable=unused-argument
     course = instance.course_instance
-    for student in course.students.all():
-        CachedStudent.invalidate(
-            course,
-            student.user)
+    CachedStudent.invalidate_many([
+        (course, user_id)
+        for user_id in course.students.values_list('user_id', flat=True)
+    ])
 
 
 post_save.connect(invalidate_students, sender=UserTag)
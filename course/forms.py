@@ -85,7 +85,7 @@ class GroupSelectForm(forms.Form):
     def save(self) -> Enrollment:
         enrollment = self.instance.get_enrollment_for(self.profile.user)
         enrollment.selected_group = self.selected_group
-        enrollment.save()
+        enrollment.save(update_fields=['selected_group'])
         # Deactivate all drafts when changing groups.
         SubmissionDraft.objects.filter(
             exercise__course_module__course_instance=self.instance,
@@ -147,7 +147,7 @@ class GroupEditForm(forms.ModelForm):
 
 class EnrollStudentsForm(forms.Form):
 
-    user_profiles = UsersSearchSelectField(queryset=UserProfile.objects.all(),
+    user_profiles = UsersSearchSelectField(queryset=UserProfile.objects.select_related('user'),
         initial_queryset=UserProfile.objects.none(),
         label=_('LABEL_USERS'),
         required=False,
@@ -1,4 +1,4 @@
-from django.contrib.auth.models import User
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
 from course.models import CourseInstance
@@ -33,40 +33,38 @@ class Command(BaseCommand):
         except CourseInstance.DoesNotExist as exc:
             raise CommandError(f"CourseInstance id={options['course_instance_id']} does not exist!") from exc
 
-        nonexistent_ids = []
-        counter = 0
         try:
             with open(options['student_list_file'], 'r', encoding="utf-8") as f:
-                for row in f:
-                    identifier = row.strip()
-                    if identifier:
-                        if options['email']:
-                            user = User.objects.filter(
-                                email=identifier,
-                            ).exclude(
-                                userprofile__student_id__isnull=True,
-                            ).exclude(
-                                userprofile__student_id='',
-                            ).first()
-                            if user is None:
-                                nonexistent_ids.append(identifier)
-                            elif course_instance.enroll_student(user):
-                                counter += 1
-                        else:
-                            try:
-                                profile = UserProfile.get_by_student_id(identifier)
-                                if course_instance.enroll_student(profile.user):
-                                    counter += 1
-                            except UserProfile.DoesNotExist:
-                                nonexistent_ids.append(identifier)
+                identifiers = [row.strip() for row in f if row.strip()]
         except FileNotFoundError as exc:
             raise CommandError(f"The student list file {options['student_list_file']} was not found!") from exc
         except OSError as e:
-            self.print_results(course_instance, counter, nonexistent_ids)
             raise CommandError("Error in reading the student list file: " + str(e)) from e
 
-        self.print_results(course_instance, counter, nonexistent_ids)
-
+        # The users are looked up with one query and enrolled in bulk
+        profiles = {}
+        if options['email']:
+            for profile in (
+                    UserProfile.objects
+                    .select_related('user')
+                    .filter(user__email__in=identifiers)
+                    .exclude(student_id__isnull=True)
+                    .exclude(student_id='')
+                    .order_by('-user_id')
+                    ):
+                # The user with the smallest id is used if many users have the same email
+                profiles[profile.user.email] = profile
+        else:
+            for profile in UserProfile.objects.filter(
+                    student_id__in=identifiers,
+                    organization=settings.LOCAL_ORGANIZATION,
+                    ):
+                profiles[profile.student_id] = profile
+        nonexistent_ids = [identifier for identifier in identifiers if identifier not in profiles]
+        result = course_instance.enroll_students_bulk(
+            profiles[identifier] for identifier in identifiers if identifier in profiles
+        )
+        self.print_results(course_instance, len(result.enrolled), nonexistent_ids)
 
     def print_results(self, course_instance, counter, nonexistent_ids):
         if nonexistent_ids:
@@ -0,0 +1,74 @@
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lib.profiler import group_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Aggregate the request profiles written by lib.profiler.ProfilerMiddleware '
+        'and print the functions that took the most time in each view'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-d', '--dir', default=settings.PROFILER_DIR,
+            help='Directory of the profiles. Default: PROFILER_DIR',
+        )
+        parser.add_argument(
+            '-n', '--top', type=int, default=20,
+            help='Number of functions printed for each view. Default: 20',
+        )
+        parser.add_argument(
+            '-s', '--sort', choices=('tottime', 'cumtime'), default='tottime',
+            help='Sort the functions by their own time (tottime) or the time '
+            'including the functions they call (cumtime). Default: tottime',
+        )
+        parser.add_argument(
+            '-v', '--view', action='append', default=[],
+            help='Only print the given view. Can be given multiple times.',
+        )
+
+    def handle(self, *args, **options):
+        views = group_profiles(options['dir'])
+        if options['view']:
+            views = {name: views[name] for name in options['view'] if name in views}
+        if not views:
+            self.stdout.write("No profiles found in {}".format(options['dir']))
+            return
+
+        # The slowest views first
+        def total_time(item):
+            return sum(metadata['wall_ms'] for metadata, _ in item[1])
+
+        for view, profiles in sorted(views.items(), key=total_time, reverse=True):
+            requests = len(profiles)
+            wall_ms = sum(metadata['wall_ms'] for metadata, _ in profiles) / requests
+            cpu_ms = sum(metadata['cpu_ms'] for metadata, _ in profiles) / requests
+            instances = sorted({metadata['instance'] for metadata, _ in profiles if metadata['instance']})
+            self.stdout.write(
+                "\n{view}: {requests} requests, {wall:.1f} ms wall, {cpu:.1f} ms CPU per request".format(
+                    view=view,
+                    requests=requests,
+                    wall=wall_ms,
+                    cpu=cpu_ms,
+                )
+            )
+            if instances:
+                self.stdout.write("  Instances: {}".format(", ".join(instances)))
+
+            stats = pstats.Stats(*(path for _, path in profiles))
+            index = 2 if options['sort'] == 'tottime' else 3
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)
+            self.stdout.write("  {:>10} {:>10} {:>10}  {}".format('calls', 'own ms', 'total ms', 'function'))
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in functions[:options['top']]:
+                self.stdout.write("  {:>10} {:>10.1f} {:>10.1f}  {}:{}({})".format(
+                    calls // requests,
+                    tottime * 1000 / requests,
+                    cumtime * 1000 / requests,
+                    filename,
+                    line,
+                    name,
+                ))
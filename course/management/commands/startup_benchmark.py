@@ -0,0 +1,99 @@
+import os
+import re
+import subprocess # nosec
+import sys
+from typing import Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Modules that are slow to import and are only needed by a few views. They are
+# imported lazily, so they must not be imported when Django is set up.
+LAZY_MODULES = (
+    'bs4',
+    'faker',
+    'feedparser',
+    'reportlab',
+)
+
+STARTUP_CODE = "import django; django.setup()"
+URLS_CODE = STARTUP_CODE + "; import aplus.urls"
+
+_importtime_re = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)\s*$')
+
+
+def measure_imports(code: str) -> List[Tuple[str, int, int, int]]:
+    """Runs the code in a new Python process with -X importtime and returns
+    (module, self microseconds, cumulative microseconds, depth) of each import."""
+    result = subprocess.run( # nosec
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+        check=False,
+    )
+    if result.returncode != 0:
+        raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else "Startup failed")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _importtime_re.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return imports
+
+
+def top_level_packages(imports: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """Returns the total self time of the imports of each top-level package"""
+    packages: Dict[str, int] = {}
+    for module, self_us, _, _ in imports:
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return packages
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the import time of starting A+ (django.setup(), as in Celery '
+        'workers and management commands) in a new process with python -X importtime'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--urls', action='store_true',
+            help='Also import the URL configuration and the views, as in the first web request',
+        )
+        parser.add_argument(
+            '-n', '--top', type=int, default=15,
+            help='Number of the slowest packages printed. Default: 15',
+        )
+        parser.add_argument(
+            '-r', '--repeat', type=int, default=3,
+            help='Number of runs. The fastest run is reported. Default: 3',
+        )
+        parser.add_argument(
+            '--max-ms', type=float, default=None,
+            help='Fail if the total import time is over this many milliseconds',
+        )
+
+    def handle(self, *args, **options):
+        code = URLS_CODE if options['urls'] else STARTUP_CODE
+        runs = [measure_imports(code) for _ in range(max(1, options['repeat']))]
+        imports = min(runs, key=lambda run: sum(self_us for _, self_us, _, _ in run))
+        total_ms = sum(self_us for _, self_us, _, _ in imports) / 1000
+
+        self.stdout.write("Imported {} modules in {:.1f} ms".format(len(imports), total_ms))
+        packages = top_level_packages(imports)
+        for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write("  {:>8.1f} ms  {}".format(self_us / 1000, package))
+
+        errors = []
+        if not options['urls']:
+            imported = {module for module, _, _, _ in imports}
+            for module in LAZY_MODULES:
+                if module in imported:
+                    errors.append("{} is imported at startup, but it should be imported lazily".format(module))
+        if options['max_ms'] is not None and total_ms > options['max_ms']:
+            errors.append("The import time {:.1f} ms is over the limit {:.1f} ms".format(total_ms, options['max_ms']))
+        if errors:
+            raise CommandError("\n".join(errors))
@@ -1,3 +1,4 @@
+from dataclasses import dataclass, field
 import datetime
 import json
 import logging
@@ -14,7 +15,7 @@ from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.staticfiles import finders
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F, Q
 from django.db.models.base import DEFERRED
 from django.db.models.signals import post_save, post_delete
@@ -348,6 +349,108 @@ post_save.connect(pseudonymize, sender=Enrollment)
 post_save.connect(check_and_tag_retaking, sender=Enrollment)
 
 
+@dataclass
+class BulkEnrollmentResult:
+    """The users given to CourseInstance.enroll_students_bulk, grouped by what was done"""
+    enrolled: List[UserProfile] = field(default_factory=list)
+    already_enrolled: List[UserProfile] = field(default_factory=list)
+    course_staff: List[UserProfile] = field(default_factory=list)
+
+
+def fill_enrollment_codes(course_instance: 'CourseInstance', enrollments: Sequence[Enrollment]) -> None:
+    """
+    Sets the personal codes of new enrollments and the anonymous ids and names
+    that are missing, like the post_save handlers above do for each saved
+    enrollment. Used before bulk_create() and bulk_update(), which do not
+    send signals.
+    """
+    if not enrollments:
+        return
+    easychars = '0123456789ABCDEFGHJKLMNPQRSTUVXYZ'
+    nums = string.digits + string.ascii_lowercase
+    taken_codes = set()
+    taken_names = set()
+    taken = Enrollment.objects.filter(course_instance=course_instance).values_list('personal_code', 'anon_name')
+    for code, name in taken:
+        taken_codes.add(code)
+        taken_names.add(name)
+    long_names = (
+        len(taken_names) + len(enrollments) > len(DATA["colors"]) * len(DATA["animals"]) * 0.75
+    )
+
+    def namegen():
+        second_name = choice(DATA["colors"])["name"] if long_names else ""
+        return choice(DATA["colors"])["name"] + second_name + " " + choice(DATA["animals"])
+
+    anon_ids = {}
+    for enrollment in enrollments:
+        if enrollment.pk is None:
+            code = get_random_string(6, easychars)
+            while code in taken_codes:
+                code = get_random_string(6, easychars)
+            taken_codes.add(code)
+            enrollment.personal_code = code
+        if not enrollment.anon_name:
+            codename = namegen()
+            i = 0
+            while codename in taken_names:
+                codename = namegen()
+                i += 1
+                if i > 10000:
+                    raise RuntimeError("No anonymous usernames available")
+            taken_names.add(codename)
+            enrollment.anon_name = codename
+        if not enrollment.anon_id:
+            anon_ids[get_random_string(16, nums)] = enrollment
+
+    # The anonymous ids are unique in all course instances
+    for _ in range(10000):
+        if not anon_ids:
+            break
+        taken_ids = set(Enrollment.objects.filter(anon_id__in=anon_ids.keys()).values_list('anon_id', flat=True))
+        if not taken_ids:
+            break
+        for code in taken_ids:
+            anon_ids[get_random_string(16, nums)] = anon_ids.pop(code)
+    else:
+        raise RuntimeError("No anonymous user ids available")
+    for code, enrollment in anon_ids.items():
+        enrollment.anon_id = code
+
+
+def tag_retaking_students(course_instance: 'CourseInstance', profile_ids: Iterable[int]) -> None:
+    """Tags the new students who are enrolled in other instances of the
+    course, like check_and_tag_retaking does for each created enrollment."""
+    from .cache.students import CachedStudent # pylint: disable=import-outside-toplevel
+    retaking = list(
+        Enrollment.objects
+        .filter(
+            user_profile_id__in=list(profile_ids),
+            course_instance__course_id=course_instance.course_id,
+        )
+        .exclude(course_instance_id=course_instance.id)
+        .values_list('user_profile_id', 'user_profile__user_id')
+        .distinct()
+    )
+    if not retaking:
+        return
+    retaking_tag, _ = UserTag.objects.get_or_create(
+        course_instance=course_instance,
+        name='Retaking',
+        slug='retaking',
+        description="This student is retaking this course.",
+        color='#ffcc00',
+    )
+    UserTagging.objects.bulk_create(
+        [
+            UserTagging(tag=retaking_tag, user_id=profile_id, course_instance=course_instance)
+            for profile_id, _ in retaking
+        ],
+        ignore_conflicts=True,
+    )
+    CachedStudent.invalidate_many([(course_instance, user_id) for _, user_id in retaking])
+
+
 class UserTag(UrlMixin, ColorTag):
     course_instance = models.ForeignKey('CourseInstance',
         verbose_name=_('LABEL_COURSE_INSTANCE'),
@@ -922,12 +1025,24 @@ class CourseInstance(CourseInstanceProto, models.Model):
         if self.image:
             resize_image(self.image.path, (800,600))
 
+    def _get_active_role(self, user) -> Optional[int]:
+        enrollment = self._get_enrollment(user)
+        if enrollment and enrollment.status == Enrollment.ENROLLMENT_STATUS.ACTIVE:
+            return enrollment.role
+        return None
+
+    def _get_enrollment(self, user) -> Optional[Enrollment]:
+        # The enrollment is cached and remembered for the rest of the request,
+        # so that the role checks do not query the database each time.
+        from .cache.roles import get_enrollment # pylint: disable=import-outside-toplevel
+        return get_enrollment(self, user.userprofile)
+
     def is_assistant(self, user):
         return (
             user and
             user.is_authenticated and
             isinstance(user, User) and
-            self.assistants.filter(id=user.userprofile.id).exists()
+            self._get_active_role(user) == Enrollment.ENROLLMENT_ROLE.ASSISTANT
         )
 
     def is_teacher(self, user):
@@ -936,7 +1051,7 @@ class CourseInstance(CourseInstanceProto, models.Model):
             user.is_authenticated and (
                 user.is_superuser or (
                     isinstance(user, User) and
-                    self.teachers.filter(id=user.userprofile.id).exists()
+                    self._get_active_role(user) == Enrollment.ENROLLMENT_ROLE.TEACHER
                 ) or (
                     isinstance(user, GraderUser) and
                     (Permission.WRITE, self.course) in user.permissions.courses
@@ -952,18 +1067,17 @@ class CourseInstance(CourseInstanceProto, models.Model):
             user and
             user.is_authenticated and
             isinstance(user, User) and
-            self.students.filter(id=user.userprofile.id).exists()
+            self._get_active_role(user) == Enrollment.ENROLLMENT_ROLE.STUDENT
         )
 
     def is_banned(self, user):
-        return (
-            user and
-            user.is_authenticated and
-            isinstance(user, User) and
-            self.all_students.filter(
-                enrollment__status=Enrollment.ENROLLMENT_STATUS.BANNED,
-                id=user.userprofile.id,
-            ).exists()
+        if not (user and user.is_authenticated and isinstance(user, User)):
+            return False
+        enrollment = self._get_enrollment(user)
+        return bool(
+            enrollment
+            and enrollment.role == Enrollment.ENROLLMENT_ROLE.STUDENT
+            and enrollment.status == Enrollment.ENROLLMENT_STATUS.BANNED
         )
 
     def is_enrollable(self, user):
@@ -1026,24 +1140,112 @@ class CourseInstance(CourseInstanceProto, models.Model):
                 return True
         return False
 
+    def enroll_students_bulk(
+            self,
+            profiles: Iterable[UserProfile],
+            from_sis: bool = False,
+            use_pending: bool = False,
+            skip_course_staff: bool = False,
+            ) -> BulkEnrollmentResult:
+        """
+        Enroll the users as students like enroll_student, but with a constant
+        number of queries. The enrollments are written with bulk_create and
+        bulk_update in one transaction and the caches are invalidated at once.
+
+        If skip_course_staff is set, the teachers and assistants of the course
+        instance and superusers are not enrolled.
+        """
+        from .cache.roles import invalidate_enrollments # pylint: disable=import-outside-toplevel
+        if use_pending:
+            status = Enrollment.ENROLLMENT_STATUS.PENDING
+        else:
+            status = Enrollment.ENROLLMENT_STATUS.ACTIVE
+        profiles_by_id = {profile.id: profile for profile in profiles}
+        superuser_ids = set()
+        if skip_course_staff:
+            superuser_ids = set(
+                UserProfile.objects
+                .filter(id__in=profiles_by_id.keys(), user__is_superuser=True)
+                .values_list('id', flat=True)
+            )
+        existing = {
+            e.user_profile_id: e
+            for e in Enrollment.objects.filter(course_instance=self, user_profile_id__in=profiles_by_id.keys())
+        }
+
+        result = BulkEnrollmentResult()
+        new_enrollments = []
+        changed_enrollments = []
+        for profile_id, profile in profiles_by_id.items():
+            enrollment = existing.get(profile_id)
+            if skip_course_staff and (
+                profile_id in superuser_ids or (
+                    enrollment is not None
+                    and enrollment.status == Enrollment.ENROLLMENT_STATUS.ACTIVE
+                    and enrollment.role in (Enrollment.ENROLLMENT_ROLE.TEACHER, Enrollment.ENROLLMENT_ROLE.ASSISTANT)
+                )
+            ):
+                # Course staff cannot be demoted into students by enrolling them
+                result.course_staff.append(profile)
+            elif enrollment is None:
+                new_enrollments.append(Enrollment(
+                    course_instance=self,
+                    user_profile=profile,
+                    role=Enrollment.ENROLLMENT_ROLE.STUDENT,
+                    status=status,
+                    from_sis=from_sis,
+                ))
+                result.enrolled.append(profile)
+            elif enrollment.status in (Enrollment.ENROLLMENT_STATUS.ACTIVE, Enrollment.ENROLLMENT_STATUS.PENDING):
+                changed = False
+                if enrollment.status == Enrollment.ENROLLMENT_STATUS.PENDING and not use_pending:
+                    enrollment.status = Enrollment.ENROLLMENT_STATUS.ACTIVE
+                    changed = True
+                if not enrollment.from_sis and from_sis and enrollment.role == Enrollment.ENROLLMENT_ROLE.STUDENT:
+                    enrollment.from_sis = from_sis
+                    changed = True
+                if changed:
+                    changed_enrollments.append(enrollment)
+                result.already_enrolled.append(profile)
+            else:
+                enrollment.role = Enrollment.ENROLLMENT_ROLE.STUDENT
+                enrollment.status = status
+                enrollment.from_sis = from_sis
+                changed_enrollments.append(enrollment)
+                result.enrolled.append(profile)
+
+        with transaction.atomic():
+            fill_enrollment_codes(self, new_enrollments + changed_enrollments)
+            if changed_enrollments:
+                Enrollment.objects.bulk_update(
+                    changed_enrollments,
+                    ['role', 'status', 'from_sis', 'anon_name', 'anon_id'],
+                )
+            if new_enrollments:
+                Enrollment.objects.bulk_create(new_enrollments)
+                tag_retaking_students(self, (e.user_profile_id for e in new_enrollments))
+        invalidate_enrollments(new_enrollments + changed_enrollments)
+        return result
+
     def enroll_from_sis(self) -> Tuple[int, int]:
         """
         Enroll students based on the participants information in Student Info System.
         If student has removed herself in SIS, she will also be marked as removed in A+.
 
+        The participants are compared with the existing enrollments as sets,
+        so the number of queries does not depend on the number of students.
+
         Returns
         -------
         Number of enrolled and removed students based on this call.
         -1 if there was problem accessing SIS.
         """
-        from .cache.menu import invalidate_content # pylint: disable=import-outside-toplevel
+        from .cache.roles import invalidate_enrollments # pylint: disable=import-outside-toplevel
 
         sis: StudentInfoSystem = get_sis_configuration()
         if not sis:
             return -1, -1
 
-        addcount = 0
-        delcount = 0
         try:
             participants = sis.get_participants(self.sis_id)
         except HTTPError as exc:
@@ -1053,39 +1255,45 @@ class CourseInstance(CourseInstanceProto, models.Model):
             logger.exception("%s: Error in getting participants from SIS.", self)
             return -1, -1
 
+        # Ignore empty participants list caused by a rare SIS API gateway malfunction
+        if not participants:
+            logger.warning("%s: Received an empty participants list from SIS.", self)
+            return 0, 0
+
         from exercise.models import LearningObject # pylint: disable=import-outside-toplevel
         use_pending = bool(LearningObject.objects.find_enrollment_exercise(self, False))
 
-        for i in participants:
-            try:
-                profile = UserProfile.get_by_student_id(i)
-                if self.enroll_student(profile.user, from_sis=True, use_pending=use_pending):
-                    addcount += 1
+        # Users who have enrolled in SIS, but not yet logged in to A+, do not
+        # have a user profile yet. Duplicate student IDs are skipped.
+        profiles_by_student_id: Dict[str, List[UserProfile]] = {}
+        for profile in (
+                UserProfile.objects
+                .filter(student_id__in=set(participants), organization=settings.LOCAL_ORGANIZATION)
+                .select_related('user')
+                ):
+            profiles_by_student_id.setdefault(profile.student_id, []).append(profile)
+        profiles = [p[0] for p in profiles_by_student_id.values() if len(p) == 1]
 
-            except UserProfile.MultipleObjectsReturned:
-                # Temporary fix for duplicate student IDs
-                pass
-            except UserProfile.DoesNotExist:
-                # This is a common scenario, if the user has enrolled in SIS, but not
-                # yet logged in to A+, then the user profile does not exist yet.
-                pass
+        with transaction.atomic():
+            result = self.enroll_students_bulk(profiles, from_sis=True, use_pending=use_pending)
+            addcount = len(result.enrolled)
 
-        # Ignore empty participants list caused by a rare SIS API gateway malfunction
-        if participants:
             # Remove SIS-enrolled students who are not anymore in SIS participants,
             # for example, because they have first enrolled in SIS, but then
             # unenrolled themselves.
-            qs = (Enrollment.objects
-                  .filter(course_instance=self, from_sis=True)
-                  .exclude(status=Enrollment.ENROLLMENT_STATUS.REMOVED)
-                  .exclude(user_profile__student_id__in=participants)
+            removed = list(
+                Enrollment.objects
+                .filter(course_instance=self, from_sis=True)
+                .exclude(status=Enrollment.ENROLLMENT_STATUS.REMOVED)
+                .exclude(user_profile__student_id__in=participants)
+                .only('id', 'course_instance_id', 'user_profile_id')
             )
-            for e in qs:
-                invalidate_content(Enrollment, e)
-            delcount = qs.update(status=Enrollment.ENROLLMENT_STATUS.REMOVED)
-        else:
-            logger.warning("%s: Received an empty participants list from SIS.", self)
-            return 0, 0
+            delcount = (
+                Enrollment.objects
+                .filter(id__in=[e.id for e in removed])
+                .update(status=Enrollment.ENROLLMENT_STATUS.REMOVED)
+            )
+        invalidate_enrollments(removed)
 
         logger.info("%s: enrolled %d, removed %d students based on SIS", self, addcount, delcount)
         return addcount, delcount
@@ -1137,11 +1345,19 @@ class CourseInstance(CourseInstanceProto, models.Model):
         UserTagging.objects.create(tag=tag, user=user.userprofile, course_instance=self)
 
     def get_enrollment_for(self, user):
+        """Returns the enrollment of the user from the database, so that it
+        can be modified and saved. Use get_cached_enrollment_for() when the
+        enrollment is only read."""
         try:
             return Enrollment.objects.get(course_instance=self, user_profile=user.userprofile)
         except Enrollment.DoesNotExist:
             return None
 
+    def get_cached_enrollment_for(self, user):
+        """Returns the cached enrollment of the user. It is shared with the
+        role checks of the request and must not be modified or saved."""
+        return self._get_enrollment(user)
+
     def get_user_tags(self, user):
         return self.taggings.filter(user=user.uesrprofile).select_related('tag')
 
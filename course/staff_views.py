@@ -12,7 +12,7 @@ from authorization.permissions import ACCESS
 from lib.helpers import settings_text
 from lib.viewbase import BaseFormView, BaseTemplateView, BaseRedirectMixin
 from userprofile.models import UserProfile
-from userprofile.pseudonymize import format_user
+from userprofile.pseudonymize import format_user, get_pseudonyms
 from .cache.students import CachedStudent
 from .forms import EnrollStudentsForm, GroupEditForm
 from .models import (
@@ -66,22 +66,31 @@ class ParticipantsView(CourseInstanceBaseView):
             for k in Enrollment.ENROLLMENT_STATUS.keys()
         }
 
-        participants = ci.all_students.prefetch_tags(ci)
+        participants = list(ci.all_students)
+        cached_students = CachedStudent.get_many([(ci, participant.user_id) for participant in participants])
+        # The pseudonyms of all participants are computed in one pass without
+        # modifying the participant objects
+        pseudonyms = get_pseudonyms(participants) if self.pseudonymize else {}
         data = []
-        for participant in participants:
-            format_user(participant.user, self.pseudonymize, participant)
+        for participant, cached_student in zip(participants, cached_students):
+            person = pseudonyms.get(participant.id)
+            if person is None:
+                person = participant.user
+                student_id = participant.student_id
+            else:
+                student_id = person.student_id
             user_id = participant.user.id
-            user_tags = CachedStudent(ci, participant.user).data
+            user_tags = cached_student.data
             # Existing HTML labels (kept for UI rendering)
             # Pipe-separated tag IDs for lightweight consumption
             tag_id_list = [str(tags[slug].id) for slug in user_tags['tag_slugs'] if slug in tags]
             data.append({
-                'id': participant.student_id or '',
+                'id': student_id or '',
                 'user_id': user_id,
-                'last_name': participant.user.last_name or '',
-                'first_name': participant.user.first_name or '',
-                'username': participant.user.username,
-                'email': participant.user.email or '',
+                'last_name': person.last_name or '',
+                'first_name': person.first_name or '',
+                'username': person.username,
+                'email': person.email or '',
                 'external': participant.is_external,
                 'link': link % (user_id,),
                 **user_tags,
@@ -202,18 +211,14 @@ class EnrollStudentsView(CourseInstanceMixin, BaseFormView):
             else:
                 messages.warning(self.request, _('COULD_NOT_ACCESS_SIS'))
 
-        failed_already_enrolled = []
-        failed_course_staff = []
-        for profile in form.cleaned_data["user_profiles"]:
-            if self.instance.is_course_staff(profile.user):
-                # Course staff cannot be demoted into students by enrolling
-                # them via this view.
-                failed_course_staff.append(profile)
-                continue
-            if not self.instance.enroll_student(profile.user):
-                # If the selected student was already enrolled,
-                # we can show a warning here.
-                failed_already_enrolled.append(profile)
+        result = self.instance.enroll_students_bulk(
+            form.cleaned_data["user_profiles"],
+            skip_course_staff=True,
+        )
+        # If the selected students were already enrolled or are course staff,
+        # we can show a warning here.
+        failed_already_enrolled = result.already_enrolled
+        failed_course_staff = result.course_staff
         if failed_already_enrolled:
             messages.warning(
                 self.request,
@@ -1,14 +1,21 @@
 from datetime import timedelta
+from io import StringIO
+import os
+import tempfile
 
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase, override_settings
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from course.models import Course, CourseInstance, CourseHook, CourseModule, \
-    LearningObjectCategory, StudentGroup
+    Enrollment, LearningObjectCategory, StudentGroup, UserTagging
+from course.cache.roles import CourseRoles
 from exercise.models import BaseExercise, Submission
 from exercise.exercise_models import LearningObject
 
@@ -212,6 +219,35 @@ class CourseTest(CourseTestCase):
         self.assertFalse(self.current_course_instance.is_course_staff(self.user))
         self.assertEqual(0, len(self.current_course_instance.get_course_staff_profiles()))
 
+    def test_course_roles_from_enrollment(self):
+        self.current_course_instance.enroll_student(self.user1)
+        CourseRoles()
+        try:
+            self.assertTrue(self.current_course_instance.is_student(self.user1))
+            with self.assertNumQueries(0):
+                self.assertTrue(self.current_course_instance.is_student(self.user1))
+                self.assertFalse(self.current_course_instance.is_course_staff(self.user1))
+                self.assertFalse(self.current_course_instance.is_banned(self.user1))
+                self.assertIsNotNone(self.current_course_instance.get_cached_enrollment_for(self.user1))
+
+            self.current_course_instance.add_assistant(self.user1.userprofile)
+            self.assertTrue(self.current_course_instance.is_assistant(self.user1))
+            self.assertFalse(self.current_course_instance.is_student(self.user1))
+        finally:
+            CourseRoles.deactivate()
+
+    def test_enrollment_for_writing_is_fresh(self):
+        self.current_course_instance.enroll_student(self.user1)
+        CourseRoles()
+        try:
+            cached = self.current_course_instance.get_cached_enrollment_for(self.user1)
+            Enrollment.objects.filter(id=cached.id).update(anon_name="Changed elsewhere")
+            enrollment = self.current_course_instance.get_enrollment_for(self.user1)
+            self.assertIsNot(enrollment, cached)
+            self.assertEqual(enrollment.anon_name, "Changed elsewhere")
+        finally:
+            CourseRoles.deactivate()
+
     def test_course_instance_submitters(self):
         students = self.current_course_instance.get_submitted_profiles()
         self.assertEqual(1, len(students))
@@ -394,6 +430,88 @@ class CourseTest(CourseTestCase):
         self.assertTrue(self.current_course_instance.is_student(self.user1))
         self.assertTrue(self.current_course_instance.is_student(self.user2))
 
+    def test_enroll_students_bulk(self):
+        instance = self.current_course_instance
+        instance.add_assistant(self.grader.userprofile)
+        instance.enroll_student(self.user1)
+        result = instance.enroll_students_bulk(
+            [
+                self.user.userprofile,
+                self.user1.userprofile,
+                self.user2.userprofile,
+                self.grader.userprofile,
+                self.superuser.userprofile,
+            ],
+            skip_course_staff=True,
+        )
+        self.assertEqual(result.enrolled, [self.user.userprofile, self.user2.userprofile])
+        self.assertEqual(result.already_enrolled, [self.user1.userprofile])
+        self.assertEqual(result.course_staff, [self.grader.userprofile, self.superuser.userprofile])
+        self.assertTrue(instance.is_student(self.user))
+        self.assertTrue(instance.is_student(self.user2))
+        self.assertTrue(instance.is_assistant(self.grader))
+        self.assertFalse(instance.is_student(self.superuser))
+
+    def test_enroll_students_command(self):
+        instance = self.current_course_instance
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write("333333\n555555\n000000\n")
+        try:
+            out = StringIO()
+            call_command('enroll_students', str(instance.id), f.name, stdout=out)
+        finally:
+            os.remove(f.name)
+        self.assertIn("000000", out.getvalue())
+        self.assertIn("Enrolled 2 students", out.getvalue())
+        self.assertTrue(instance.is_student(self.user1))
+        self.assertTrue(instance.is_student(self.user2))
+
+    def create_students(self, prefix, count):
+        users = []
+        for i in range(count):
+            user = User.objects.create(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com")
+            user.userprofile.student_id = f"{prefix}{i}"
+            user.userprofile.save()
+            users.append(user)
+        return users
+
+    def test_enroll_students_form_queries(self):
+        # The number of queries does not depend on the number of enrolled students
+        url = reverse("enroll-students", kwargs={
+            'course_slug': self.course.url,
+            'instance_slug': self.current_course_instance.url,
+        })
+        self.client.login(username="staff", password="staffPassword")
+        for users in (self.create_students("warm", 1), self.create_students("few", 2)):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(url, {'user_profiles': [user.id for user in users]})
+        many = self.create_students("many", 6)
+        with self.assertNumQueries(len(queries)):
+            self.client.post(url, {'user_profiles': [user.id for user in many]})
+        for user in many:
+            self.assertTrue(self.current_course_instance.is_student(user))
+
+    def enroll_by_email(self, users):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write("".join(f"{user.email}\n" for user in users))
+        try:
+            call_command(
+                'enroll_students', str(self.current_course_instance.id), f.name, '--email',
+                stdout=StringIO(),
+            )
+        finally:
+            os.remove(f.name)
+
+    def test_enroll_students_command_queries(self):
+        self.enroll_by_email(self.create_students("warm", 1))
+        with CaptureQueriesContext(connection) as queries:
+            self.enroll_by_email(self.create_students("few", 2))
+        many = self.create_students("many", 6)
+        with self.assertNumQueries(len(queries)):
+            self.enroll_by_email(many)
+        for user in many:
+            self.assertTrue(self.current_course_instance.is_student(user))
+
     @override_settings(SIS_PLUGIN_MODULE = 'course.sis_test')
     @override_settings(SIS_PLUGIN_CLASS = 'SisTest')
     def test_student_enroll_from_sis(self):
@@ -437,6 +555,40 @@ class CourseTest(CourseTestCase):
         self.assertFalse(self.past_course_instance.is_student(self.user1))
         self.assertFalse(self.past_course_instance.is_student(self.user2))
 
+    @override_settings(SIS_PLUGIN_MODULE = 'course.sis_test')
+    @override_settings(SIS_PLUGIN_CLASS = 'SisTest')
+    def test_enroll_from_sis_bulk(self):
+        instance = self.current_course_instance
+        # user2 is retaking the course
+        self.past_course_instance.enroll_student(self.user2)
+        # A removed student is enrolled again
+        instance.enroll_student(self.user1)
+        Enrollment.objects.filter(course_instance=instance).update(status=Enrollment.ENROLLMENT_STATUS.REMOVED)
+
+        self.assertEqual(instance.enroll_from_sis(), (2, 0))
+        enrollments = list(Enrollment.objects.filter(course_instance=instance))
+        self.assertEqual(len(enrollments), 2)
+        for enrollment in enrollments:
+            self.assertEqual(enrollment.status, Enrollment.ENROLLMENT_STATUS.ACTIVE)
+            self.assertTrue(enrollment.from_sis)
+            self.assertTrue(enrollment.anon_name)
+            self.assertTrue(enrollment.anon_id)
+        new_enrollment = next(e for e in enrollments if e.user_profile_id == self.user2.userprofile.id)
+        self.assertTrue(new_enrollment.personal_code)
+        self.assertTrue(UserTagging.objects.filter(
+            course_instance=instance,
+            user=self.user2.userprofile,
+            tag__slug='retaking',
+        ).exists())
+        self.assertTrue(instance.is_student(self.user1))
+        self.assertTrue(instance.is_student(self.user2))
+
+        # Nothing changes when the participants are the same, and the number
+        # of queries does not depend on the number of participants
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(instance.enroll_from_sis(), (0, 0))
+        self.assertLessEqual(len(queries), 12)
+
     def test_last_instance_view_hidden_module(self):
         course = Course.objects.create(
             name="Last instance view course",
@@ -1083,3 +1235,12 @@ class CourseTest(CourseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.redirect_chain), 1)
         self.assertEqual(response.redirect_chain[0][0], '/cs-111111/instance2/')
+
+
+class StartupTest(SimpleTestCase):
+
+    def test_slow_modules_are_not_imported_at_startup(self):
+        # Raises CommandError if any of LAZY_MODULES is imported by django.setup()
+        out = StringIO()
+        call_command('startup_benchmark', repeat=1, top=0, stdout=out)
+        self.assertIn('Imported', out.getvalue())
@@ -10,6 +10,7 @@ from lib.helpers import remove_query_param_from_url, update_url_params
 from lib.viewbase import BaseTemplateView
 from userprofile.viewbase import UserProfileMixin
 from exercise.models import LearningObject
+from .cache.roles import CourseRoles
 from .cache.students import CachedStudent
 from .exceptions import TranslationNotFound
 from .permissions import (
@@ -73,7 +74,7 @@ class CourseInstanceBaseMixin:
     @cached_property
     def user_course_data(self):
         if self.instance and self.request.user.is_authenticated and not self.request.user.is_anonymous:
-            return self.instance.get_enrollment_for(self.request.user)
+            return self.instance.get_cached_enrollment_for(self.request.user)
         return None
 
     @cached_property
@@ -92,6 +93,9 @@ class CourseInstanceBaseMixin:
         instance = self.get_course_instance_object()
         if instance is not None: # pylint: disable=too-many-nested-blocks
             self.instance = instance
+            # Remember the enrollments for the rest of the request, so that
+            # the role checks below and deeper in the stack share them
+            CourseRoles()
             user = self.request.user
             is_real_user = user.is_authenticated and not user.is_anonymous
             self.is_student = self.instance.is_student(user)
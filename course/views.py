@@ -7,7 +7,7 @@ from typing import Any
 from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q, prefetch_related_objects
+from django.db.models import Prefetch, Q, prefetch_related_objects
 from django.http import Http404
 from django.http.response import HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
@@ -22,6 +22,15 @@ from authorization.permissions import ACCESS
 from exercise.cache.hierarchy import NoSuchContent
 from exercise.models import LearningObject
 from exercise.submission_models import Submission, SubmissionTagging
+from exercise.submission_table import (
+    SubmissionTablePageMixin,
+    filter_submissions,
+    get_cached_counts,
+    get_next_page_url,
+    get_sort_urls,
+    paginate_submissions,
+    parse_sort,
+)
 from lib.helpers import settings_text, remove_query_param_from_url, is_ajax
 from lib.viewbase import BaseTemplateView, BaseRedirectMixin, BaseFormView, BaseView, BaseRedirectView
 from userprofile.viewbase import UserProfileView
@@ -234,14 +243,14 @@ class Unenroll(CourseInstanceMixin, BaseView):
     access_mode = ACCESS.ENROLLED
 
     def post(self, request, *args, **kwargs):
-        enrollment = self.user_course_data
+        enrollment = self.instance.get_enrollment_for(request.user)
         if (
             enrollment
             and enrollment.role == Enrollment.ENROLLMENT_ROLE.STUDENT
             and enrollment.status == Enrollment.ENROLLMENT_STATUS.ACTIVE
         ):
             enrollment.status = Enrollment.ENROLLMENT_STATUS.REMOVED
-            enrollment.save()
+            enrollment.save(update_fields=['status'])
             messages.success(
                 self.request,
                 format_lazy(
@@ -371,10 +380,10 @@ class LanguageView(CourseInstanceMixin, BaseView):
                     if next_trans != next:
                         response = HttpResponseRedirect(next_trans)
                 if request.user.is_authenticated:
-                    enrollment = self.user_course_data
+                    enrollment = self.instance.get_enrollment_for(request.user) if self.instance else None
                     if enrollment:
                         enrollment.language = lang_code
-                        enrollment.save()
+                        enrollment.save(update_fields=['language'])
                     else:
                         userprofile = request.user.userprofile
                         userprofile.language = lang_code
@@ -390,130 +399,48 @@ class LanguageView(CourseInstanceMixin, BaseView):
         return response
 
 
-class AllSubmissionsView(CourseInstanceBaseView):
+class AllSubmissionsView(SubmissionTablePageMixin, CourseInstanceBaseView):
     access_mode = ACCESS.ASSISTANT
     template_name = 'course/staff/all_submissions_table.html'
+    rows_template_name = 'course/staff/_all_submissions_rows.html'
 
-    # pylint: disable-next=too-many-locals too-many-branches too-many-statements
-    def get_common_objects(self): # noqa: MC0001
+    def get_common_objects(self):
         super().get_common_objects()
 
         # Calculate is_teacher once, outside the loop
         is_teacher = self.instance.is_teacher(self.request.user)
 
-        # Get filter parameters from URL
-        student_id = self.request.GET.get('student_id', '').strip()
-        status = self.request.GET.get('status', '').strip()
-        # Handle exercise_id as comma-separated string (e.g., "45,44,40")
-        exercise_id_param = self.request.GET.get('exercise_id', '').strip()
-        exercise_ids = [e.strip() for e in exercise_id_param.split(',') if e.strip()] if exercise_id_param else []
-        submitter_name = self.request.GET.get('submitter_name', '').strip()
-        start_time = self.request.GET.get('start_time', '').strip()
-        end_time = self.request.GET.get('end_time', '').strip()
-        # Handle tag_id as comma-separated string (e.g., "1,2,3")
-        tag_id_param = self.request.GET.get('tag_id', '').strip()
-        tag_ids = [t.strip() for t in tag_id_param.split(',') if t.strip()] if tag_id_param else []
-        late_penalty = self.request.GET.get('late_penalty', '').strip()
-        assessed_manually = self.request.GET.get('assessed_manually', '').strip()
-
-        # Build filters
-        filters = Q(exercise__course_module__course_instance=self.instance.id)
-
-        if student_id:
-            filters &= Q(submitters__id=student_id)
-
-        if status:
-            if status == 'not_ready':
-                filters &= ~Q(status='ready')
-            else:
-                filters &= Q(status=status)
-
-        if exercise_ids:
-            filters &= Q(exercise_id__in=exercise_ids)
-
-        if submitter_name:
-            filters &= Q(submitters__user__first_name__icontains=submitter_name) | \
-                       Q(submitters__user__last_name__icontains=submitter_name) | \
-                       Q(submitters__user__username__icontains=submitter_name) | \
-                       Q(submitters__student_id__icontains=submitter_name)
-
-        if tag_ids:
-            # Filter for submissions that have ANY of the selected tags
-            filters &= Q(submission_taggings__tag_id__in=tag_ids)
-
-        if late_penalty:
-            if late_penalty == 'yes':
-                # Late penalty was applied (field is not NULL)
-                filters &= Q(late_penalty_applied__isnull=False)
-            elif late_penalty == 'no':
-                # Late penalty was not applied (field is NULL)
-                filters &= Q(late_penalty_applied__isnull=True)
-
-        if assessed_manually:
-            if assessed_manually == 'yes':
-                # Submission was assessed manually (grader field is not NULL)
-                filters &= Q(grader__isnull=False)
-            elif assessed_manually == 'no':
-                # Submission was not assessed manually (grader field is NULL)
-                filters &= Q(grader__isnull=True)
-
-        if start_time:
-            try:
-                start_dt = datetime.datetime.fromisoformat(start_time)
-                # Make timezone aware if needed
-                if timezone.is_naive(start_dt):
-                    start_dt = timezone.make_aware(start_dt)
-                filters &= Q(submission_time__gte=start_dt)
-            except (ValueError, TypeError):
-                pass  # Invalid datetime format, skip filter
-
-        if end_time:
-            try:
-                end_dt = datetime.datetime.fromisoformat(end_time)
-                # Make timezone aware if needed
-                if timezone.is_naive(end_dt):
-                    end_dt = timezone.make_aware(end_dt)
-                filters &= Q(submission_time__lte=end_dt)
-            except (ValueError, TypeError):
-                pass  # Invalid datetime format, skip filter
-
-        # Determine if we should limit
-        # Use larger limit when filters are active, smaller for unfiltered view
-        has_filters = bool(
-            student_id or status or exercise_ids or submitter_name
-            or start_time or end_time or tag_ids or late_penalty
-            or assessed_manually
+        base_queryset, filter_values = filter_submissions(
+            Submission.objects.filter(exercise__course_module__course_instance=self.instance),
+            self.request.GET,
         )
+
+        # Use larger pages when filters are active, smaller for unfiltered view
+        has_filters = any(filter_values.values())
         self.result_limit = 500 if has_filters else 200
 
-        # First, get the base queryset
-        base_queryset = Submission.objects.filter(
-            filters
-        ).select_related(
-            'exercise__course_module__course_instance',
-        # Do not select heavy fields we do not need
-        ).defer(
-            'feedback',
-            'submission_data',
-            'grading_data',
-            'exercise__exercise_info',
-            'exercise__model_answers',
-            'exercise__description',
-            'exercise__templates',
-            'exercise__content',
-            'exercise__course_module__course_instance__description',
-            'exercise__course_module__introduction',
-        ).order_by('-submission_time')
-
-        # Get count BEFORE slicing
-        total_count = base_queryset.count()
-
-        # Always limit for performance
-        base_queryset = base_queryset[:self.result_limit]
-        displayed_count = min(total_count, self.result_limit)
-
-        # Convert to list to evaluate, then manually prefetch
-        submissions_list = list(base_queryset)
+        # The total count is cached, so that it is not recounted for each page
+        total_count = get_cached_counts(
+            f"instance{self.instance.id}",
+            filter_values,
+            lambda: {'submissions': base_queryset.count()},
+        )['submissions']
+
+        self.sort = parse_sort(self.request.GET.get('sort'))
+        page = paginate_submissions(
+            base_queryset.prefetch_related(None).defer(
+                # Do not select heavy fields we do not need
+                'feedback',
+                'submission_data',
+                'grading_data',
+                'meta_data',
+            ),
+            self.request.GET.get('after'),
+            self.result_limit,
+            self.sort,
+        )
+        submissions_list = page.submissions
+        displayed_count = len(submissions_list)
 
         # Pre-fetch all exercises to ensure they're loaded with their subclass
         if submissions_list:
@@ -527,29 +454,16 @@ class AllSubmissionsView(CourseInstanceBaseView):
                 # Directly set the exercise attribute to bypass the foreign key query
                 sub.exercise = exercises_dict.get(sub.exercise_id)
 
-        # Manually prefetch related data after evaluation to avoid queryset conflicts
-        if submissions_list:
-            # Prefetch submitters
+            # Prefetch the submitters and tags of the rows on this page only
             prefetch_related_objects(
                 submissions_list,
                 'submitters__user',
+                Prefetch(
+                    'submission_taggings',
+                    queryset=SubmissionTagging.objects.select_related('tag'),
+                ),
             )
 
-            # Fetch ALL submission taggings for this course instance (more efficient than IN clause)
-            submission_taggings = SubmissionTagging.objects.filter(
-                submission__exercise__course_module__course_instance=self.instance
-            ).select_related('tag')
-
-            # Group by submission_id
-            taggings_by_submission = defaultdict(list)
-            for tagging in submission_taggings:
-                taggings_by_submission[tagging.submission_id].append(tagging)
-
-            # Attach to submissions
-            for sub in submissions_list:
-                sub._prefetched_objects_cache = sub._prefetched_objects_cache or {}
-                sub._prefetched_objects_cache['submission_taggings'] = taggings_by_submission.get(sub.id, [])
-
             # Collect all user profile IDs from all submissions
             user_profile_ids = set()
             for sub in submissions_list:
@@ -581,23 +495,30 @@ class AllSubmissionsView(CourseInstanceBaseView):
                 'is_teacher': is_teacher,
             })
 
+        self.submission_data = row_data
+        self.next_page_url = get_next_page_url(self.request, page.next_cursor)
+        if self.request.GET.get('format') == 'json':
+            # Only the rows are rendered for the following pages
+            self.note('submission_data', 'next_page_url')
+            return
+
         self.tags = self.instance.submissiontags.all().order_by('name')
         self.total_count = total_count
         self.displayed_count = displayed_count
-        self.is_limited = total_count > self.result_limit
-        self.submission_data = row_data
+        self.is_limited = page.next_cursor is not None
 
         # Pass filter values to template for form initialization
-        self.filter_student_id = student_id
-        self.filter_status = status
-        self.filter_exercise_ids = exercise_ids  # List of selected exercise IDs
-        self.filter_submitter_name = submitter_name
-        self.filter_start_time = start_time
-        self.filter_end_time = end_time
-        self.filter_tag_ids = tag_ids  # List of selected tag IDs
-        self.filter_late_penalty = late_penalty
-        self.filter_assessed_manually = assessed_manually
+        self.filter_student_id = filter_values['student_id']
+        self.filter_status = filter_values['status']
+        self.filter_exercise_ids = filter_values['exercise_ids']  # List of selected exercise IDs
+        self.filter_submitter_name = filter_values['submitter_name']
+        self.filter_start_time = filter_values['start_time']
+        self.filter_end_time = filter_values['end_time']
+        self.filter_tag_ids = filter_values['tag_ids']  # List of selected tag IDs
+        self.filter_late_penalty = filter_values['late_penalty']
+        self.filter_assessed_manually = filter_values['assessed_manually']
         self.has_filters = has_filters
+        self.sort_urls = get_sort_urls(self.request, self.sort)
 
         # Get available exercises and statuses for dropdowns
         self.exercises = LearningObject.objects.filter(
@@ -607,6 +528,7 @@ class AllSubmissionsView(CourseInstanceBaseView):
 
         self.note(
             'submission_data',
+            'next_page_url',
             'total_count',
             'displayed_count',
             'result_limit',
@@ -622,6 +544,8 @@ class AllSubmissionsView(CourseInstanceBaseView):
             'filter_late_penalty',
             'filter_assessed_manually',
             'has_filters',
+            'sort',
+            'sort_urls',
             'exercises',
             'statuses',
         )
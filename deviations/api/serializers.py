@@ -0,0 +1,106 @@
+from typing import Any, Dict
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from course.models import CourseModule, UserTag
+from exercise.models import BaseExercise
+from userprofile.models import UserProfile
+
+
+class DeviationGrantSerializer(serializers.Serializer):
+    """
+    The input of granting a deviation to many submitters in many exercises.
+    The exercises and the submitters are selected like in the deviation
+    forms: the submitters are given as user ids.
+    """
+    exercises = serializers.PrimaryKeyRelatedField(
+        many=True,
+        required=False,
+        queryset=BaseExercise.objects.none(),
+    )
+    modules = serializers.PrimaryKeyRelatedField(
+        many=True,
+        required=False,
+        queryset=CourseModule.objects.none(),
+    )
+    submitters = serializers.SlugRelatedField(
+        many=True,
+        required=False,
+        slug_field='user_id',
+        queryset=UserProfile.objects.none(),
+    )
+    submitter_tags = serializers.PrimaryKeyRelatedField(
+        many=True,
+        required=False,
+        queryset=UserTag.objects.none(),
+    )
+    override = serializers.BooleanField(default=False)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        course_instance = self.context['course_instance']
+        self.fields['exercises'].child_relation.queryset = BaseExercise.objects.filter(
+            course_module__course_instance=course_instance
+        )
+        self.fields['modules'].child_relation.queryset = CourseModule.objects.filter(
+            course_instance=course_instance
+        )
+        self.fields['submitters'].child_relation.queryset = course_instance.get_student_profiles()
+        self.fields['submitter_tags'].child_relation.queryset = course_instance.usertags.all()
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        if not attrs.get('exercises') and not attrs.get('modules'):
+            raise serializers.ValidationError(_("EXERCISES_AND_MODULES_MISSING"))
+        if not attrs.get('submitters') and not attrs.get('submitter_tags'):
+            raise serializers.ValidationError(_("SUBMITTERS_AND_TAGS_MISSING"))
+        return attrs
+
+    def get_form_data(self) -> Dict[str, Any]:
+        """
+        Returns the validated data with the keys of the deviation forms, as
+        expected by `get_exercises`, `get_submitters` and `update_by_form`.
+        """
+        data = self.validated_data
+        return {
+            key: [obj.id for obj in data.get(field, [])]
+            for key, field in (
+                ('exercise', 'exercises'),
+                ('module', 'modules'),
+                ('submitter', 'submitters'),
+                ('submitter_tag', 'submitter_tags'),
+            )
+        }
+
+
+class DeadlineDeviationGrantSerializer(DeviationGrantSerializer):
+    seconds = serializers.IntegerField(required=False, min_value=1)
+    new_date = serializers.DateTimeField(required=False)
+    without_late_penalty = serializers.BooleanField(default=True)
+    timezone = serializers.CharField(required=False)
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        attrs = super().validate(attrs)
+        if bool(attrs.get('seconds')) == bool(attrs.get('new_date')):
+            raise serializers.ValidationError(_("SECONDS_AND_DATE_MISSING"))
+        return attrs
+
+    def get_form_data(self) -> Dict[str, Any]:
+        form_data = super().get_form_data()
+        data = self.validated_data
+        form_data.update({
+            'seconds': data.get('seconds'),
+            'new_date': data.get('new_date'),
+            'without_late_penalty': data['without_late_penalty'],
+            'timezone_string': data.get('timezone'),
+        })
+        return form_data
+
+
+class SubmissionDeviationGrantSerializer(DeviationGrantSerializer):
+    extra_submissions = serializers.IntegerField(min_value=1)
+
+    def get_form_data(self) -> Dict[str, Any]:
+        form_data = super().get_form_data()
+        form_data['extra_submissions'] = self.validated_data['extra_submissions']
+        return form_data
@@ -0,0 +1,118 @@
+from typing import List, Type
+
+from rest_framework import status, viewsets
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework_extensions.mixins import NestedViewSetMixin
+
+from course.api.mixins import CourseResourceMixin
+from course.permissions import OnlyCourseTeacherPermission
+from userprofile.models import UserProfile
+from ..models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation, SubmissionRuleDeviation
+from ..viewbase import get_exercises, get_submitters, tag_dl_submitters
+from .serializers import (
+    DeadlineDeviationGrantSerializer,
+    DeviationGrantSerializer,
+    SubmissionDeviationGrantSerializer,
+)
+
+
+class CourseDeviationsViewSetBase(NestedViewSetMixin,
+                                  CourseResourceMixin,
+                                  viewsets.GenericViewSet):
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES + [
+        OnlyCourseTeacherPermission,
+    ]
+    deviation_model: Type[SubmissionRuleDeviation]
+    serializer_class: Type[DeviationGrantSerializer]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update({ 'course_instance': self.instance })
+        return context
+
+    def granted(self, submitters: List[UserProfile]) -> None:
+        """Called after the deviations have been granted to the submitters"""
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        form_data = serializer.get_form_data()
+        exercises = list(get_exercises(form_data))
+        submitters = list(get_submitters(form_data))
+        created, updated = self.deviation_model.objects.grant_many(
+            exercises,
+            submitters,
+            request.user.userprofile,
+            form_data,
+            override=serializer.validated_data['override'],
+        )
+        self.granted(submitters)
+        return Response(
+            {
+                'created': len(created),
+                'updated': len(updated),
+                'unchanged': len(exercises) * len(submitters) - len(created) - len(updated),
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class CourseDeadlineDeviationsViewSet(CourseDeviationsViewSetBase):
+    """
+    The `deadlinedeviations` endpoint grants deadline deviations to many
+    students in many exercises at once.
+
+    Operations
+    ----------
+
+    `POST /courses/<course_id>/deadlinedeviations/`:
+        grants the deadline deviation to each of the students in each of the
+        exercises. Returns the numbers of the created, updated and unchanged
+        deviations.
+
+    - Body data:
+        - `exercises`: exercise ids
+        - `modules`: module ids, whose exercises are included
+        - `submitters`: user ids
+        - `submitter_tags`: student tag ids, whose students are included
+        - One of:
+            - `seconds`: the extra time
+            - `new_date`: the new deadline
+        - `without_late_penalty`: default true
+        - `timezone`: the time zone in which `seconds` is counted,
+          e.g. "Europe/Helsinki"
+        - `override`: whether the existing deviations of the students are
+          overridden. Default false: the existing deviations are unchanged.
+    """
+    deviation_model = DeadlineRuleDeviation
+    serializer_class = DeadlineDeviationGrantSerializer
+
+    def granted(self, submitters: List[UserProfile]) -> None:
+        tag_dl_submitters(self.instance, submitters)
+
+
+class CourseSubmissionDeviationsViewSet(CourseDeviationsViewSetBase):
+    """
+    The `submissiondeviations` endpoint grants extra submissions to many
+    students in many exercises at once.
+
+    Operations
+    ----------
+
+    `POST /courses/<course_id>/submissiondeviations/`:
+        grants the extra submissions to each of the students in each of the
+        exercises. Returns the numbers of the created, updated and unchanged
+        deviations.
+
+    - Body data:
+        - `exercises`: exercise ids
+        - `modules`: module ids, whose exercises are included
+        - `submitters`: user ids
+        - `submitter_tags`: student tag ids, whose students are included
+        - `extra_submissions`
+        - `override`: whether the existing deviations of the students are
+          overridden. Default false: the existing deviations are unchanged.
+    """
+    deviation_model = MaxSubmissionsRuleDeviation
+    serializer_class = SubmissionDeviationGrantSerializer
@@ -0,0 +1,98 @@
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from course.models import CourseInstance
+from deviations.models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
+from exercise.models import BaseExercise
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Tuple[Any, float, int]:
+    """Runs the function repeat times and returns the result, the time of the
+    fastest run in milliseconds and the number of queries of one run."""
+    best_ms = None
+    query_count = 0
+    result = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = func()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        query_count = len(queries)
+        if best_ms is None or elapsed_ms < best_ms:
+            best_ms = elapsed_ms
+    return result, best_ms, query_count
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare fetching the maximum deviations of the students of a course '
+        'instance one student at a time (get_max_deviations) and all at once '
+        '(get_max_deviations_many)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'course_instance_id',
+            help='ID of the CourseInstance whose students and exercises are used',
+        )
+        parser.add_argument(
+            '-n', '--submitters', type=int, default=1000,
+            help='Maximum number of students. Default: 1000',
+        )
+        parser.add_argument(
+            '-r', '--repeat', type=int, default=3,
+            help='Number of runs. The fastest run is reported. Default: 3',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            instance = CourseInstance.objects.get(id=options['course_instance_id'])
+        except CourseInstance.DoesNotExist as exc:
+            raise CommandError(f"CourseInstance id={options['course_instance_id']} does not exist!") from exc
+
+        submitters = list(instance.get_student_profiles()[:options['submitters']])
+        exercise_ids = list(
+            BaseExercise.objects
+            .filter(course_module__course_instance=instance)
+            .values_list('id', flat=True)
+        )
+        repeat = max(1, options['repeat'])
+        self.stdout.write(
+            f"{len(submitters)} students and {len(exercise_ids)} exercises in {instance}"
+        )
+
+        for model in (DeadlineRuleDeviation, MaxSubmissionsRuleDeviation):
+            manager = model.objects
+            value_field = manager.max_order_by.lstrip('-')
+
+            def per_user(manager=manager):
+                return {
+                    (submitter.id, deviation.exercise_id): deviation
+                    for submitter in submitters
+                    for deviation in manager.get_max_deviations(submitter, exercise_ids)
+                }
+
+            def many(manager=manager):
+                return manager.get_max_deviations_many(submitters, exercise_ids)
+
+            per_user_result, per_user_ms, per_user_queries = measure(per_user, repeat)
+            many_result, many_ms, many_queries = measure(many, repeat)
+
+            self.stdout.write(f"\n{model.__name__}: {len(many_result)} deviations")
+            self.stdout.write(
+                f"  get_max_deviations:      {per_user_ms:>10.1f} ms {per_user_queries:>8} queries"
+            )
+            self.stdout.write(
+                f"  get_max_deviations_many: {many_ms:>10.1f} ms {many_queries:>8} queries"
+            )
+
+            # The deviations may differ when many of them have the same value
+            def values(result: Dict[Tuple[int, int], Any], field: str = value_field) -> Dict[Tuple[int, int], Any]:
+                return {key: getattr(deviation, field) for key, deviation in result.items()}
+
+            if values(per_user_result) != values(many_result):
+                raise CommandError(f"The maximum {model.__name__}s of the two methods differ")
@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING, Any, Dict, Generic, Iterable, Optional, TypeVar, Union
+from typing import TYPE_CHECKING, Any, Collection, Dict, Generic, Iterable, List, Optional, Set, Tuple, TypeVar, Union
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import pytz
 
@@ -69,6 +70,65 @@ class SubmissionRuleDeviationManager(models.Manager[TModel], Generic[TModel]):
             previous_exercise_id = deviation.exercise.id
             yield deviation
 
+    def get_max_deviations_many(
+        self,
+        submitters: Iterable[Union[UserProfile, int]],
+        exercises: Iterable[Union[BaseExercise, int]],
+    ) -> Dict[Tuple[int, int], TModel]:
+        """
+        Returns the maximum deviations of many submitters in the given
+        exercises by (submitter id, exercise id), like `get_max_deviations`
+        does for one submitter. The pairs without deviations are not included.
+
+        The number of queries does not depend on the number of submitters:
+        the group memberships of all of the submitters are fetched with one
+        query, and the deviations of the submitters and their group members
+        with another. The exercises of the deviations are not loaded.
+        """
+        submitter_ids = {getattr(submitter, 'id', submitter) for submitter in submitters}
+        exercise_ids = {getattr(exercise, 'id', exercise) for exercise in exercises}
+        if not submitter_ids or not exercise_ids:
+            return {}
+
+        # The submitters who have submitted each exercise together with each
+        # of the given submitters, including the submitter themselves
+        members = (
+            Submission.submitters.through.objects
+            .filter(submission__in=Submission.objects.filter(
+                exercise_id__in=exercise_ids,
+                submitters__in=submitter_ids,
+            ).values('id'))
+            .values_list('submission_id', 'submission__exercise_id', 'userprofile_id')
+        )
+        submission_members: Dict[int, List[int]] = {}
+        submission_exercise: Dict[int, int] = {}
+        for submission_id, exercise_id, profile_id in members:
+            submission_members.setdefault(submission_id, []).append(profile_id)
+            submission_exercise[submission_id] = exercise_id
+        # (exercise id, owner of a deviation) -> the submitters the deviation applies to
+        targets: Dict[Tuple[int, int], Set[int]] = {}
+        for submission_id, profile_ids in submission_members.items():
+            exercise_id = submission_exercise[submission_id]
+            for owner_id in profile_ids:
+                targets.setdefault((exercise_id, owner_id), set()).update(
+                    profile_id for profile_id in profile_ids if profile_id in submitter_ids
+                )
+        owner_ids = submitter_ids.union(owner_id for _, owner_id in targets)
+
+        deviations = (
+            self.filter(exercise_id__in=exercise_ids, submitter_id__in=owner_ids)
+            .order_by('exercise', self.max_order_by)
+        )
+        result: Dict[Tuple[int, int], TModel] = {}
+        for deviation in deviations:
+            applies_to = targets.get((deviation.exercise_id, deviation.submitter_id), set())
+            if deviation.submitter_id in submitter_ids:
+                applies_to = applies_to | {deviation.submitter_id}
+            for submitter_id in applies_to:
+                # The deviations are ordered from the largest one
+                result.setdefault((submitter_id, deviation.exercise_id), deviation)
+        return result
+
     def get_max_deviation(self, submitter: UserProfile, exercise: Union[BaseExercise, int]) -> Optional[TModel]:
         """
         Returns the maximum deviation for the given submitter in the given
@@ -79,6 +139,71 @@ class SubmissionRuleDeviationManager(models.Manager[TModel], Generic[TModel]):
         for deviation in deviations:
             return deviation
 
+    def grant_many(
+        self,
+        exercises: Iterable[BaseExercise],
+        submitters: Iterable[UserProfile],
+        granter: Optional[UserProfile],
+        form_data: Dict[str, Any],
+        override: Union[bool, Collection[Tuple[int, int]]] = False,
+    ) -> Tuple[List[TModel], List[TModel]]:
+        """
+        Grants the deviation described by `form_data` (see `update_by_form`)
+        to each submitter in each exercise. Returns the created deviations
+        and the existing deviations that were overridden.
+
+        Existing deviations are overridden if `override` is True, or if their
+        (submitter id, exercise id) pair is in `override`. The others are left
+        as they are.
+
+        The deviations are written with one bulk insert and one bulk update
+        in a transaction, and the points caches of the affected submitters
+        and the grades of the course instances are invalidated once at the
+        end.
+        """
+        # pylint: disable=import-outside-toplevel
+        from exercise.cache.grades import CourseGrades
+        from exercise.cache.points import invalidate_deviations
+
+        exercises = list(exercises)
+        submitters = list(submitters)
+        # The deadline deviations need the closing times of the modules
+        models.prefetch_related_objects(exercises, 'course_module')
+        created = []
+        updated = []
+        with transaction.atomic():
+            existing = {
+                (deviation.submitter_id, deviation.exercise_id): deviation
+                for deviation in self.select_for_update().filter(
+                    exercise__in=exercises,
+                    submitter__in=submitters,
+                )
+            }
+            now = timezone.now()
+            for exercise in exercises:
+                for submitter in submitters:
+                    deviation = existing.get((submitter.id, exercise.id))
+                    if deviation is None:
+                        deviation = self.model(exercise=exercise, submitter=submitter, granter=granter)
+                        deviation.update_by_form(form_data)
+                        created.append(deviation)
+                    elif override is True or (override and (submitter.id, exercise.id) in override):
+                        deviation.exercise = exercise
+                        deviation.granter = granter
+                        deviation.grant_time = now
+                        deviation.update_by_form(form_data)
+                        updated.append(deviation)
+            self.bulk_create(created)
+            if updated:
+                self.bulk_update(updated, ['granter', 'grant_time', *self.model.form_fields])
+            invalidate_deviations(created + updated)
+            if created or updated:
+                CourseGrades.invalidate_many([
+                    (instance_id,)
+                    for instance_id in {e.course_module.course_instance_id for e in exercises}
+                ])
+        return created, updated
+
 
 class SubmissionRuleDeviation(UrlMixin, models.Model):
     """
@@ -113,6 +238,9 @@ class SubmissionRuleDeviation(UrlMixin, models.Model):
         null=True,
     )
 
+    # The fields that update_by_form() sets
+    form_fields: Tuple[str, ...] = ()
+
     if TYPE_CHECKING:
         id: models.AutoField
 
@@ -168,6 +296,7 @@ class DeadlineRuleDeviation(SubmissionRuleDeviation):
     )
 
     objects = DeadlineRuleDeviationManager()
+    form_fields = ('extra_seconds', 'without_late_penalty')
 
     class Meta(SubmissionRuleDeviation.Meta):
         verbose_name = _('MODEL_NAME_DEADLINE_RULE_DEVIATION')
@@ -250,6 +379,7 @@ class MaxSubmissionsRuleDeviation(SubmissionRuleDeviation):
     )
 
     objects = MaxSubmissionsRuleDeviationManager()
+    form_fields = ('extra_submissions',)
 
     class Meta(SubmissionRuleDeviation.Meta):
         verbose_name = _('MODEL_NAME_MAX_SUBMISSIONS_RULE_DEVIATION')
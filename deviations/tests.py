@@ -3,6 +3,7 @@ from datetime import timedelta
 from django.test import TestCase
 from django.test.client import Client
 from django.utils import timezone
+from rest_framework.test import APIClient
 
 from course.models import (
     Course,
@@ -12,6 +13,7 @@ from course.models import (
     UserTag,
     UserTagging,
 )
+from exercise.cache.points import ExercisePoints
 from exercise.exercise_models import BaseExercise
 from exercise.models import ExerciseWithAttachment, Submission
 from userprofile.models import User
@@ -251,6 +253,39 @@ class DeviationsTest(TestCase):
         self.assertEqual(deviation.exercise.id, self.exercise_with_attachment.id)
         self.assertEqual(deviation.extra_seconds, 3*24*60*60)
 
+    def test_get_max_deviations_many(self):
+        # Test that get_max_deviations_many returns the same deviations as
+        # get_max_deviations for each submitter, also with group submissions.
+        submission = Submission.objects.create(
+            exercise=self.exercise_with_attachment_2,
+            status=Submission.STATUS.READY,
+        )
+        submission.submitters.add(self.user.userprofile, self.user_2.userprofile)
+        submitters = [self.user.userprofile, self.user_2.userprofile, self.teacher.userprofile]
+        exercises = [
+            self.exercise_with_attachment,
+            self.exercise_with_attachment_2,
+            self.module_2_exercise_1,
+        ]
+
+        with self.assertNumQueries(2):
+            deviations = DeadlineRuleDeviation.objects.get_max_deviations_many(submitters, exercises)
+        self.assertEqual(
+            {key: deviation.extra_seconds for key, deviation in deviations.items()},
+            {
+                (self.user.userprofile.id, self.exercise_with_attachment.id): 24*60*60,
+                (self.user.userprofile.id, self.exercise_with_attachment_2.id): 2*24*60*60,
+                (self.user_2.userprofile.id, self.exercise_with_attachment.id): 3*24*60*60,
+                # User 1's deviation applies to user 2 through the group submission
+                (self.user_2.userprofile.id, self.exercise_with_attachment_2.id): 2*24*60*60,
+            },
+        )
+        for submitter in submitters:
+            for deviation in DeadlineRuleDeviation.objects.get_max_deviations(submitter, exercises):
+                self.assertEqual(deviations[(submitter.id, deviation.exercise_id)], deviation)
+
+        self.assertEqual(DeadlineRuleDeviation.objects.get_max_deviations_many([], exercises), {})
+
     def test_update_by_form(self):
         deviation = DeadlineRuleDeviation(
             exercise=self.exercise_with_attachment,
@@ -666,3 +701,131 @@ class DeviationsTest(TestCase):
                 exercise=self.module_2_exercise_2,
                 submitter=self.user.userprofile,
             )
+
+    def test_grant_many(self):
+        exercises = [self.exercise_with_attachment, self.module_2_exercise_1]
+        submitters = [self.user.userprofile, self.user_2.userprofile]
+        # Generate the cached points before the deviations are granted
+        entry = ExercisePoints.get(self.module_2_exercise_1, self.user)
+        self.assertIsNone(entry.personal_deadline)
+
+        created, updated = DeadlineRuleDeviation.objects.grant_many(
+            exercises,
+            submitters,
+            self.teacher.userprofile,
+            {'seconds': 60*60},
+            override={(self.user.userprofile.id, self.exercise_with_attachment.id)},
+        )
+        self.assertEqual(
+            {(d.submitter_id, d.exercise_id) for d in created},
+            {
+                (self.user.userprofile.id, self.module_2_exercise_1.id),
+                (self.user_2.userprofile.id, self.module_2_exercise_1.id),
+            },
+        )
+        self.assertEqual(updated, [self.deadline_rule_deviation_u1_e1])
+        self.deadline_rule_deviation_u1_e1.refresh_from_db()
+        self.assertEqual(self.deadline_rule_deviation_u1_e1.extra_seconds, 60*60)
+        # The deviation that was not selected for overriding is unchanged
+        self.deadline_rule_deviation_u2_e1.refresh_from_db()
+        self.assertEqual(self.deadline_rule_deviation_u2_e1.extra_seconds, 3*24*60*60)
+
+        # The points cache was invalidated although no signals were sent
+        entry = ExercisePoints.get(self.module_2_exercise_1, self.user)
+        self.assertEqual(entry.personal_deadline, self.tomorrow + timedelta(hours=1))
+
+        created, updated = DeadlineRuleDeviation.objects.grant_many(
+            exercises,
+            submitters,
+            self.teacher.userprofile,
+            {'seconds': 2*60*60},
+            override=True,
+        )
+        self.assertEqual(created, [])
+        self.assertEqual(len(updated), 4)
+        entry = ExercisePoints.get(self.module_2_exercise_1, self.user)
+        self.assertEqual(entry.personal_deadline, self.tomorrow + timedelta(hours=2))
+
+    def test_api_grant_deviations(self):
+        client = APIClient()
+        client.force_authenticate(user=self.teacher)
+        url = f'/api/v2/courses/{self.course_instance.id}/deadlinedeviations/'
+
+        response = client.post(
+            url,
+            {
+                'modules': [self.course_module_2.id],
+                'submitter_tags': [self.user_tag.id],
+                'seconds': 60*60,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'created': 2, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(
+            DeadlineRuleDeviation.objects.filter(
+                exercise__course_module=self.course_module_2,
+                submitter=self.user.userprofile,
+            ).count(),
+            2,
+        )
+        self.assertTrue(UserTagging.objects.filter(
+            tag__slug='dl',
+            user=self.user.userprofile,
+            course_instance=self.course_instance,
+        ).exists())
+
+        # The existing deviations are not overridden by default
+        response = client.post(
+            url,
+            {
+                'exercises': [self.exercise_with_attachment.id],
+                'submitters': [self.user.id, self.user_2.id],
+                'seconds': 60*60,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'created': 0, 'updated': 0, 'unchanged': 2})
+
+        response = client.post(
+            f'/api/v2/courses/{self.course_instance.id}/submissiondeviations/',
+            {
+                'exercises': [self.exercise_with_attachment.id],
+                'submitters': [self.user.id],
+                'extra_submissions': 2,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            MaxSubmissionsRuleDeviation.objects.get(
+                exercise=self.exercise_with_attachment,
+                submitter=self.user.userprofile,
+            ).extra_submissions,
+            2,
+        )
+
+        # Missing exercises
+        response = client.post(
+            url,
+            {
+                'submitters': [self.user.id],
+                'seconds': 60*60,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # Only teachers can grant deviations
+        client.force_authenticate(user=self.user)
+        response = client.post(
+            url,
+            {
+                'exercises': [self.exercise_with_attachment.id],
+                'submitters': [self.user.id],
+                'seconds': 60*60,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 403)
@@ -8,7 +8,8 @@ from django import forms
 from django.utils.text import format_lazy
 from django.utils.translation import gettext_lazy as _, ngettext
 
-from course.models import CourseModule, UserTag, UserTagging
+from course.cache.students import CachedStudent
+from course.models import CourseInstance, CourseModule, UserTag, UserTagging
 from course.viewbase import CourseInstanceMixin, CourseInstanceBaseView
 from deviations.models import SubmissionRuleDeviation
 from lib.helpers import is_ajax
@@ -79,16 +80,12 @@ class AddDeviationsView(CourseInstanceMixin, BaseFormView):
             self.request.session[self.session_key] = self.serialize_session_data(form.cleaned_data)
         else:
             self.success_url = self.get_success_no_override_url()
-
-            for exercise in exercises:
-                for submitter in submitters:
-                    new_deviation = self.deviation_model(
-                        exercise=exercise,
-                        submitter=submitter,
-                        granter=self.request.user.userprofile,
-                    )
-                    new_deviation.update_by_form(form.cleaned_data)
-                    new_deviation.save()
+            self.deviation_model.objects.grant_many(
+                exercises,
+                submitters,
+                self.request.user.userprofile,
+                form.cleaned_data,
+            )
             messages.success(self.request, _("SUCCESS_ADDING_DEVIATIONS"))
         return super().form_valid(form)
 
@@ -141,24 +138,14 @@ class OverrideDeviationsView(CourseInstanceMixin, BaseFormView):
                 )
                 continue
 
-        existing_deviations = {(d.submitter_id, d.exercise_id): d for d in self.existing_deviations}
-
-        for exercise in self.exercises:
-            for submitter in self.submitters:
-                existing_deviation = existing_deviations.get((submitter.id, exercise.id))
-                if existing_deviation is not None:
-                    if (submitter.id, exercise.id) in override_deviations:
-                        existing_deviation.granter = self.request.user.userprofile
-                        existing_deviation.update_by_form(self.session_data)
-                        existing_deviation.save()
-                else:
-                    new_deviation = self.deviation_model(
-                        exercise=exercise,
-                        submitter=submitter,
-                        granter=self.request.user.userprofile,
-                    )
-                    new_deviation.update_by_form(self.session_data)
-                    new_deviation.save()
+        # The new deviations are created and the selected existing ones are overridden
+        self.deviation_model.objects.grant_many(
+            self.exercises,
+            self.submitters,
+            self.request.user.userprofile,
+            self.session_data,
+            override=override_deviations,
+        )
 
         del self.request.session[self.session_key]
         messages.success(self.request, _("SUCCESS_OVERRIDING_DEVIATIONS"))
@@ -337,6 +324,29 @@ def get_submitters(form_data: Dict[str, Any]) -> models.QuerySet[UserProfile]:
     ).distinct()
 
 
+def tag_dl_submitters(course_instance: CourseInstance, submitters: Iterable[UserProfile]) -> None:
+    """
+    Adds the 'dl' usertag to the submitters who have been granted deadline
+    deviations in the given course instance.
+    """
+    dl_tag, _ = UserTag.objects.get_or_create(
+        course_instance=course_instance,
+        name='DL',
+        slug='dl',
+        description="This student has deadline deviations.",
+        color='#F0A8A8',
+    )
+    submitters = list(submitters)
+    UserTagging.objects.bulk_create(
+        [
+            UserTagging(tag=dl_tag, user=submitter, course_instance=course_instance)
+            for submitter in submitters
+        ],
+        ignore_conflicts=True,
+    )
+    CachedStudent.invalidate_many([(course_instance, submitter.user_id) for submitter in submitters])
+
+
 def cleanup_dl_usertags(cls, submitter_ids: Iterable[int]) -> None:
     """
     Removes 'dl' usertagging for submitters who no longer have any
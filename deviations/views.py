@@ -4,7 +4,6 @@ from django import forms
 from django.utils.dateparse import parse_datetime
 from django.http import HttpRequest, HttpResponse
 
-from course.models import UserTag, UserTagging
 from exercise.exercise_models import BaseExercise
 from .forms import (
     DeadlineRuleDeviationForm,
@@ -20,6 +19,7 @@ from .viewbase import (
     get_submitters,
     get_exercises,
     cleanup_dl_usertags,
+    tag_dl_submitters,
 )
 from .models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
 
@@ -68,22 +68,8 @@ class AddDeadlinesView(AddDeviationsView):
         timezone_string = self.request.POST.get('timezone_string')
         form.cleaned_data['timezone_string'] = timezone_string
 
-        dl_tag, _ = UserTag.objects.get_or_create(
-            course_instance=self.instance,
-            name='DL',
-            slug='dl',
-            description="This student has deadline deviations.",
-            color='#F0A8A8',
-        )
-
         # Add the 'dl' tag to all submitters
-        submitters = get_submitters(form.cleaned_data)
-        for submitter in submitters:
-            UserTagging.objects.get_or_create(
-                tag=dl_tag,
-                user=submitter,
-                course_instance=self.instance,
-            )
+        tag_dl_submitters(self.instance, get_submitters(form.cleaned_data))
         return super().form_valid(form)
 
 
@@ -0,0 +1,172 @@
+"""
+Rendering the diplomas of all of the students of a course at once.
+
+The design is read once per job into a DiplomaLayout. For the ZIP format,
+each diploma is read from the PDF cache or rendered separately, possibly in
+a pool of forked processes. For the PDF format, all of the diplomas are
+drawn on one canvas, so the layout resources are embedded in the document
+only once.
+"""
+import multiprocessing
+import uuid
+import zipfile
+from io import BytesIO
+from typing import Callable, Dict, List, Optional
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+
+from exercise.cache.grades import CourseGrades
+from lib.helpers import safe_file_name
+from .grade import is_available
+from .models import CourseDiplomaDesign, StudentDiploma
+from .pdf import (
+    DiplomaLayout,
+    DiplomaPage,
+    draw_diploma,
+    new_canvas,
+    read_cached_pdf,
+    render_diploma_pdf,
+    save_cached_pdf,
+)
+from .tasks import BATCH_FORMATS
+
+
+BATCH_DIR = "diploma/batch"
+
+# Shared state for the worker processes. The workers are forked from the main
+# process after this has been filled, so the layout is not pickled for every
+# diploma.
+_render_context: Dict[str, DiplomaLayout] = {}
+
+
+def _render_page(page: DiplomaPage) -> bytes:
+    return render_diploma_pdf(_render_context['layout'], page)
+
+
+def update_design_diplomas(design: CourseDiplomaDesign) -> List[StudentDiploma]:
+    """
+    Creates or updates the diplomas of the students that have a passing grade
+    and to whom the design is available. Returns the diplomas ordered by the
+    name of the student.
+    """
+    grades = CourseGrades.get(design.course).students
+    profiles = [
+        profile
+        for profile in design.course.students.select_related('user')
+        if profile.id in grades
+        and (grades[profile.id].diploma_grade or 0) > 0
+        and is_available(design, profile)
+    ]
+    existing = {
+        diploma.profile_id: diploma
+        for diploma in StudentDiploma.objects.filter(design=design, profile__in=profiles)
+    }
+
+    diplomas = []
+    changed = []
+    created = []
+    for profile in profiles:
+        name = profile.user.get_full_name()
+        grade = grades[profile.id].diploma_grade
+        diploma = existing.get(profile.id)
+        if diploma is None:
+            diploma = StudentDiploma(design=design, profile=profile, name=name, grade=grade)
+            diploma.generate_hashkey()
+            created.append(diploma)
+        elif diploma.name != name or diploma.grade != grade:
+            diploma.name = name
+            diploma.grade = grade
+            changed.append(diploma)
+        diploma.design = design
+        diplomas.append(diploma)
+
+    if changed:
+        StudentDiploma.objects.bulk_update(changed, ['name', 'grade'])
+    if created:
+        StudentDiploma.objects.bulk_create(created)
+
+    diplomas.sort(key=lambda d: (d.name, d.hashkey))
+    return diplomas
+
+
+def _zip_entry_name(diploma: StudentDiploma) -> str:
+    name = safe_file_name(diploma.name.replace(" ", "_")) if diploma.name else ""
+    return "{}_{}.pdf".format(name or "diploma", diploma.hashkey)
+
+
+def render_design_diplomas(
+        design: CourseDiplomaDesign,
+        output_format: str,
+        workers: int = 1,
+        progress: Optional[Callable[[int, int], None]] = None,
+        ) -> str:
+    """
+    Renders the diplomas of the design into a ZIP file of PDF files or into
+    one PDF file, and returns the storage name of the file. The progress
+    callback is called with the number of the rendered diplomas and the
+    total number of diplomas.
+    """
+    if output_format not in BATCH_FORMATS:
+        raise ValueError("Unknown diploma batch format: {}".format(output_format))
+
+    diplomas = update_design_diplomas(design)
+    total = len(diplomas)
+    layout = DiplomaLayout(design)
+    done = 0
+
+    def rendered(count: int = 1) -> None:
+        nonlocal done
+        done += count
+        if progress is not None:
+            progress(done, total)
+
+    output = BytesIO()
+    if output_format == 'pdf':
+        c = new_canvas(output)
+        for diploma in diplomas:
+            draw_diploma(c, layout, DiplomaPage.from_diploma(diploma))
+            rendered()
+        c.save()
+    else:
+        pdfs = [read_cached_pdf(diploma) for diploma in diplomas]
+        rendered(sum(pdf is not None for pdf in pdfs))
+        missing = [i for i, pdf in enumerate(pdfs) if pdf is None]
+        pages = [DiplomaPage.from_diploma(diploma) for diploma in diplomas]
+
+        def store(i: int, pdf: bytes) -> None:
+            pdfs[i] = pdf
+            save_cached_pdf(diplomas[i], pdf)
+            rendered()
+
+        if workers <= 1 or len(missing) <= 1:
+            for i in missing:
+                store(i, render_diploma_pdf(layout, pages[i]))
+        else:
+            _render_context['layout'] = layout
+            try:
+                # The forked workers must not share the database connections
+                # of the main process.
+                connections.close_all()
+                ctx = multiprocessing.get_context('fork')
+                with ctx.Pool(processes=workers) as pool:
+                    results = pool.imap(_render_page, (pages[i] for i in missing))
+                    for i, pdf in zip(missing, results):
+                        store(i, pdf)
+            finally:
+                _render_context.clear()
+
+        with zipfile.ZipFile(output, 'w') as archive:
+            for diploma, pdf in zip(diplomas, pdfs):
+                # The PDF files are already compressed
+                archive.writestr(_zip_entry_name(diploma), pdf, compress_type=zipfile.ZIP_STORED)
+
+    # Only the latest batch of the design is kept
+    prefix = "{:d}-".format(design.id)
+    if default_storage.exists(BATCH_DIR):
+        for old in default_storage.listdir(BATCH_DIR)[1]:
+            if old.startswith(prefix):
+                default_storage.delete("{}/{}".format(BATCH_DIR, old))
+    name = "{}/{}{}.{}".format(BATCH_DIR, prefix, uuid.uuid4().hex, output_format)
+    return default_storage.save(name, ContentFile(output.getvalue()))
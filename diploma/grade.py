@@ -1,7 +1,9 @@
 from copy import copy
 from typing import List, Tuple, Union
 
+from exercise.cache.hierarchy import ContentMixin
 from exercise.cache.points import CachedPoints, Totals
+from userprofile.models import UserProfile
 
 from .models import CourseDiplomaDesign
 
@@ -58,16 +60,30 @@ def assign_grade(cached_points: CachedPoints, diploma_design: CourseDiplomaDesig
     if not (diploma_design and cached_points.user.is_authenticated):
         return -1
 
-    if not diploma_design.course.is_course_staff(cached_points.user):
-        avail = diploma_design.availability
-        opt = diploma_design.USERGROUP
-        external = cached_points.user.userprofile.is_external
-        if (
-            (avail == opt.EXTERNAL_USERS and not external)
-            or (avail == opt.INTERNAL_USERS and external)
-        ):
-            return -1
+    if (
+        not diploma_design.course.is_course_staff(cached_points.user)
+        and not is_available(diploma_design, cached_points.user.userprofile)
+    ):
+        return -1
+
+    return grade_points(cached_points, diploma_design)
+
+
+def is_available(diploma_design: CourseDiplomaDesign, profile: UserProfile) -> bool:
+    """Returns whether the diploma is available to the student's user group"""
+    avail = diploma_design.availability
+    opt = diploma_design.USERGROUP
+    external = profile.is_external
+    return not (
+        (avail == opt.EXTERNAL_USERS and not external)
+        or (avail == opt.INTERNAL_USERS and external)
+    )
+
 
+def grade_points(cached_points: ContentMixin, diploma_design: CourseDiplomaDesign) -> int:
+    """Returns the grade of the points without checking the availability of
+    the diploma. The grade is 0 if the required modules or exercises are not
+    passed."""
     if not all(
         cached_points.entry_for_module(m).passed
         for m in diploma_design.modules_to_pass.all()
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.14 on 2026-10-19 12:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diploma", "0004_auto_20210812_1536"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coursediplomadesign",
+            name="modified",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="LABEL_MODIFIED",
+            ),
+            preserve_default=False,
+        ),
+    ]
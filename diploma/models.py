@@ -77,6 +77,11 @@ class CourseDiplomaDesign(models.Model):
         verbose_name=_('LABEL_MODULES_TO_PASS'),
         blank=True,
     )
+    # The rendered diplomas are cached until the design is modified
+    modified = models.DateTimeField(
+        verbose_name=_('LABEL_MODIFIED'),
+        auto_now=True,
+    )
 
     if TYPE_CHECKING:
         point_limits: List[Union[int, List[Tuple[str, int]]]]
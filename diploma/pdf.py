@@ -1,79 +1,197 @@
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from reportlab.graphics.barcode import qr
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics import renderPDF
-
-
-def text_lines(text, value_map):
-    for key,value in value_map.items():
-        text = text.replace(key, value)
-    return [l.strip() for l in text.split("\n")] # noqa: E741
-
-
-def render_diploma(request, response, diploma): # pylint: disable=too-many-locals
-    design = diploma.design
-
-    c = canvas.Canvas(response)
-
-    marginLeft = 2 * cm
-    marginTop = 2 * cm
-    marginBottom = 2.5 * cm
-    cTop = 29.7 * cm - marginTop
-    cLeft = marginLeft
-    cMiddle = 21 * cm / 2
-    logoHeight = 1.4 * cm
-
-    text_value_map = {
-        '$grade': str(diploma.grade),
-    }
-
-    if design.logo:
-        c.drawImage(
-            design.logo.path,
-            cLeft,
-            cTop - logoHeight,
-            height=logoHeight,
-            preserveAspectRatio=True,
-            anchor="nw"
-        )
-
-    c.setFont("Helvetica-Bold", 30)
-    c.setFillColorRGB(0, 0.25, 0.5)
-    c.drawCentredString(10.5 * cm, cTop - 5 * cm, diploma.name)
-
-    c.setFont("Helvetica", 14)
-    c.setFillColorRGB(0, 0, 0)
-    for i,line in enumerate(text_lines(design.title, text_value_map)):
-        c.drawCentredString(cMiddle, cTop - 7 * cm - (i * 0.8 * cm), line)
-
-    c.setFont("Helvetica", 10)
-    c.setFillColorRGB(0, 0, 0)
-    for i,line in enumerate(text_lines(design.body, text_value_map)):
-        c.drawString(cLeft, cTop - 10 * cm - (i * 0.6 * cm), line)
-
-    c.setFont("Helvetica", 12)
-    c.setFillColorRGB(0, 0, 0)
-    c.drawString(cLeft, cTop - 21 * cm, design.date)
-
-    c.drawString(cLeft, cTop - 23.5 * cm, design.signature_name)
-    c.drawString(cLeft, cTop - 24 * cm, design.signature_title)
-
-    c.setFont("Helvetica", 7)
-    c.setFillColorRGB(0, 0, 0)
-    for i,line in enumerate(text_lines(design.small_print, text_value_map)):
-        c.drawString(cLeft, marginBottom - (i * 0.3 * cm), line)
-
-    qr_code = qr.QrCodeWidget(request.build_absolute_uri(diploma.get_absolute_url()))
-    bounds = qr_code.getBounds()
-    width = bounds[2] - bounds[0]
-    height = bounds[3] - bounds[1]
-    d = Drawing(1200, 1200, transform=[60./width,0,0,60./height,0,0])
-    d.add(qr_code)
-    renderPDF.draw(d, c, 16.7 * cm, cTop - 24.3 * cm)
-
-    c.showPage()
-    #c.setAuthor("A+")
-    c.setTitle("Course Diploma")
-    #c.setSubject("")
-    c.save()
+import hashlib
+from dataclasses import dataclass
+from io import BytesIO
+import os
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.graphics.barcode import qr
+from reportlab.graphics.shapes import Drawing
+from reportlab.graphics import renderPDF
+
+from .models import CourseDiplomaDesign, StudentDiploma
+
+
+PDF_CACHE_DIR = "diploma/pdf"
+
+
+def text_lines(text, value_map):
+    for key,value in value_map.items():
+        text = text.replace(key, value)
+    return [l.strip() for l in text.split("\n")] # noqa: E741
+
+
+@dataclass
+class DiplomaPage:
+    """The values of a diploma that differ between the students"""
+    name: str
+    grade: int
+    url: str
+
+    @classmethod
+    def from_diploma(cls, diploma: StudentDiploma) -> 'DiplomaPage':
+        return cls(
+            name=diploma.name,
+            grade=diploma.grade,
+            url=urljoin(settings.BASE_URL, diploma.get_absolute_url()),
+        )
+
+
+class DiplomaLayout:
+    """
+    The parts of the diploma that are the same for all students of a design.
+    The logo is read and the texts are split into lines once, so that many
+    diplomas can be rendered without reading the design again.
+    """
+    def __init__(self, design: CourseDiplomaDesign) -> None:
+        self.logo: Optional[ImageReader] = None
+        if design.logo:
+            with design.logo.open('rb') as logo:
+                self.logo = ImageReader(BytesIO(logo.read()))
+        # The grade does not contain line breaks, so it can be substituted
+        # after the texts have been split into lines
+        self.title = text_lines(design.title, {})
+        self.body = text_lines(design.body, {})
+        self.small_print = text_lines(design.small_print, {})
+        self.date = design.date
+        self.signature_name = design.signature_name
+        self.signature_title = design.signature_title
+
+
+def fill_lines(lines: List[str], value_map: Dict[str, str]) -> List[str]:
+    filled = []
+    for line in lines:
+        for key,value in value_map.items():
+            line = line.replace(key, value)
+        filled.append(line)
+    return filled
+
+
+def draw_diploma(c: canvas.Canvas, layout: DiplomaLayout, page: DiplomaPage) -> None: # pylint: disable=too-many-locals
+    """Draws the diploma on a new page of the canvas"""
+    marginLeft = 2 * cm
+    marginTop = 2 * cm
+    marginBottom = 2.5 * cm
+    cTop = 29.7 * cm - marginTop
+    cLeft = marginLeft
+    cMiddle = 21 * cm / 2
+    logoHeight = 1.4 * cm
+
+    text_value_map = {
+        '$grade': str(page.grade),
+    }
+
+    if layout.logo is not None:
+        c.drawImage(
+            layout.logo,
+            cLeft,
+            cTop - logoHeight,
+            height=logoHeight,
+            preserveAspectRatio=True,
+            anchor="nw"
+        )
+
+    c.setFont("Helvetica-Bold", 30)
+    c.setFillColorRGB(0, 0.25, 0.5)
+    c.drawCentredString(10.5 * cm, cTop - 5 * cm, page.name)
+
+    c.setFont("Helvetica", 14)
+    c.setFillColorRGB(0, 0, 0)
+    for i,line in enumerate(fill_lines(layout.title, text_value_map)):
+        c.drawCentredString(cMiddle, cTop - 7 * cm - (i * 0.8 * cm), line)
+
+    c.setFont("Helvetica", 10)
+    c.setFillColorRGB(0, 0, 0)
+    for i,line in enumerate(fill_lines(layout.body, text_value_map)):
+        c.drawString(cLeft, cTop - 10 * cm - (i * 0.6 * cm), line)
+
+    c.setFont("Helvetica", 12)
+    c.setFillColorRGB(0, 0, 0)
+    c.drawString(cLeft, cTop - 21 * cm, layout.date)
+
+    c.drawString(cLeft, cTop - 23.5 * cm, layout.signature_name)
+    c.drawString(cLeft, cTop - 24 * cm, layout.signature_title)
+
+    c.setFont("Helvetica", 7)
+    c.setFillColorRGB(0, 0, 0)
+    for i,line in enumerate(fill_lines(layout.small_print, text_value_map)):
+        c.drawString(cLeft, marginBottom - (i * 0.3 * cm), line)
+
+    qr_code = qr.QrCodeWidget(page.url)
+    bounds = qr_code.getBounds()
+    width = bounds[2] - bounds[0]
+    height = bounds[3] - bounds[1]
+    d = Drawing(1200, 1200, transform=[60./width,0,0,60./height,0,0])
+    d.add(qr_code)
+    renderPDF.draw(d, c, 16.7 * cm, cTop - 24.3 * cm)
+
+    c.showPage()
+
+
+def new_canvas(output: BytesIO) -> canvas.Canvas:
+    c = canvas.Canvas(output)
+    #c.setAuthor("A+")
+    c.setTitle("Course Diploma")
+    #c.setSubject("")
+    return c
+
+
+def render_diploma_pdf(layout: DiplomaLayout, page: DiplomaPage) -> bytes:
+    output = BytesIO()
+    c = new_canvas(output)
+    draw_diploma(c, layout, page)
+    c.save()
+    return output.getvalue()
+
+
+def cached_pdf_name(diploma: StudentDiploma) -> str:
+    """
+    Returns the storage name of the rendered diploma. The name changes when
+    the grade, the name of the student or the design changes, so the stored
+    file is never stale.
+    """
+    name_hash = hashlib.md5(diploma.name.encode('utf-8')).hexdigest()[:8] # nosec
+    return "{}/{}/{:d}-{:d}-{}.pdf".format(
+        PDF_CACHE_DIR,
+        diploma.hashkey,
+        diploma.grade,
+        int(diploma.design.modified.timestamp()),
+        name_hash,
+    )
+
+
+def read_cached_pdf(diploma: StudentDiploma) -> Optional[bytes]:
+    name = cached_pdf_name(diploma)
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name, 'rb') as f:
+        return f.read()
+
+
+def save_cached_pdf(diploma: StudentDiploma, pdf: bytes) -> None:
+    """Stores the rendered diploma and removes the earlier versions of it"""
+    name = cached_pdf_name(diploma)
+    directory, filename = os.path.split(name)
+    if default_storage.exists(directory):
+        for old in default_storage.listdir(directory)[1]:
+            if old != filename:
+                default_storage.delete(os.path.join(directory, old))
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(pdf))
+
+
+def get_diploma_pdf(diploma: StudentDiploma, layout: Optional[DiplomaLayout] = None) -> bytes:
+    """Returns the stored diploma, or renders and stores it"""
+    pdf = read_cached_pdf(diploma)
+    if pdf is None:
+        if layout is None:
+            layout = DiplomaLayout(diploma.design)
+        pdf = render_diploma_pdf(layout, DiplomaPage.from_diploma(diploma))
+        save_cached_pdf(diploma, pdf)
+    return pdf
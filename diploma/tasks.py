@@ -0,0 +1,47 @@
+import logging
+from typing import Optional
+
+from django.conf import settings
+
+from aplus.celery import app
+from .models import CourseDiplomaDesign
+
+logger = logging.getLogger('aplus.diploma')
+
+# A ZIP file of the PDF files of the diplomas, or one PDF file of all of them
+BATCH_FORMATS = ('zip', 'pdf')
+
+
+@app.task(bind=True)
+def render_diplomas(self, design_id: int, output_format: str) -> Optional[str]:
+    """
+    Renders the diplomas of the design into a file in the default storage
+    and returns the storage name of the file.
+    """
+    try:
+        design = CourseDiplomaDesign.objects.select_related('course').get(pk=design_id)
+    except CourseDiplomaDesign.DoesNotExist:
+        logger.warning("render_diplomas task: diploma design id %s not found", design_id)
+        return None
+    if design.course is None:
+        logger.warning("render_diplomas task: diploma design %s has no course", design_id)
+        return None
+
+    def progress(current: int, total: int) -> None:
+        self.update_state(
+            state='PROGRESS',
+            meta={
+                'current': current,
+                'total': total,
+            },
+        )
+
+    # reportlab is imported only when diplomas are rendered, because it is
+    # slow to import at startup
+    from .batch import render_design_diplomas # pylint: disable=import-outside-toplevel
+    return render_design_diplomas(
+        design,
+        output_format,
+        workers=settings.DIPLOMA_RENDER_WORKERS,
+        progress=progress,
+    )
@@ -1,6 +1,18 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+import zipfile
+from unittest import mock
 
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from lib.testdata import CourseTestCase
 from .grade import calculate_grade
+from .models import CourseDiplomaDesign, StudentDiploma
+from .views import BATCH_START_TIMEOUT, batch_cache_key
 
 
 class GradeTest(TestCase):
@@ -46,3 +58,91 @@ class GradeTest(TestCase):
         self.assertEqual(calculate_grade(self.GRADE_3, self.DIFFICULTY_BOUNDS, True), 3)
         self.assertEqual(calculate_grade(self.GRADE_4, self.DIFFICULTY_BOUNDS, True), 4)
         self.assertEqual(calculate_grade(self.GRADE_5, self.DIFFICULTY_BOUNDS, True), 5)
+
+
+class DiplomaBatchTest(CourseTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.design = CourseDiplomaDesign.objects.create(
+            course=self.instance,
+            availability=CourseDiplomaDesign.USERGROUP.ALL_USERS,
+            point_limits=[50, 100],
+            title="Course diploma\nGrade $grade",
+            date="today",
+        )
+
+    def test_update_design_diplomas(self):
+        from .batch import update_design_diplomas # pylint: disable=import-outside-toplevel
+        self.setUpStudents(2)
+        diplomas = update_design_diplomas(self.design)
+        # Only the test student has a passing grade
+        self.assertEqual([d.profile for d in diplomas], [self.student.userprofile])
+        self.assertEqual(diplomas[0].grade, 1)
+        hashkey = diplomas[0].hashkey
+
+        self.submission3.set_points(2, 2)
+        self.submission3.set_ready()
+        self.submission3.save()
+        diplomas = update_design_diplomas(self.design)
+        self.assertEqual(diplomas[0].hashkey, hashkey)
+        self.assertEqual(StudentDiploma.objects.get(hashkey=hashkey).grade, 2)
+
+    def test_cached_pdf(self):
+        from .batch import update_design_diplomas # pylint: disable=import-outside-toplevel
+        from .pdf import cached_pdf_name, get_diploma_pdf # pylint: disable=import-outside-toplevel
+        diploma = update_design_diplomas(self.design)[0]
+        pdf = get_diploma_pdf(diploma)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        name = cached_pdf_name(diploma)
+        self.assertTrue(default_storage.exists(name))
+
+        response = self.client.get(diploma.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, pdf)
+
+        diploma.grade = 2
+        self.assertNotEqual(cached_pdf_name(diploma), name)
+        get_diploma_pdf(diploma)
+        # The earlier version is removed
+        self.assertFalse(default_storage.exists(name))
+
+    def test_render_design_diplomas(self):
+        from .batch import render_design_diplomas # pylint: disable=import-outside-toplevel
+        progress = []
+        name = render_design_diplomas(self.design, 'zip', progress=lambda *args: progress.append(args))
+        self.assertEqual(progress, [(0, 1), (1, 1)])
+        with default_storage.open(name, 'rb') as f:
+            with zipfile.ZipFile(f) as archive:
+                self.assertEqual(len(archive.namelist()), 1)
+
+        name2 = render_design_diplomas(self.design, 'pdf')
+        self.assertTrue(name2.endswith('.pdf'))
+        # Only the latest file of the design is kept
+        self.assertFalse(default_storage.exists(name))
+
+    def start_batch(self, state, enqueued_at):
+        cache.set(batch_cache_key(self.design), ('old', enqueued_at))
+        self.client.login(username='testTeacher', password='testPassword')
+        with mock.patch('diploma.views.render_diplomas') as task:
+            task.AsyncResult.return_value.state = state
+            task.delay.return_value.id = 'new'
+            response = self.client.post(
+                reverse('diploma-batch', kwargs={'coursediploma_id': self.design.id}),
+                {'format': 'zip'},
+            )
+        self.assertEqual(response.status_code, 302)
+        return task.delay.called
+
+    def test_batch_is_not_started_twice(self):
+        self.assertFalse(self.start_batch('PENDING', time.time()))
+        self.assertFalse(self.start_batch('PROGRESS', time.time() - BATCH_START_TIMEOUT - 1))
+        self.assertTrue(self.start_batch('SUCCESS', time.time()))
+        self.assertEqual(cache.get(batch_cache_key(self.design))[0], 'new')
+
+    def test_lost_batch_is_started_again(self):
+        # Celery reports the jobs that the worker has lost as pending forever
+        self.assertTrue(self.start_batch('PENDING', time.time() - BATCH_START_TIMEOUT - 1))
@@ -11,6 +11,12 @@ urlpatterns = [
     path('create/<int:coursediploma_id>/<int:userprofile_id>/',
         views.DiplomaCreateView.as_view(),
         name="diploma-create"),
+    path('batch/<int:coursediploma_id>/',
+        views.DiplomaBatchView.as_view(),
+        name="diploma-batch"),
+    path('batch/<int:coursediploma_id>/download/',
+        views.DiplomaBatchDownloadView.as_view(),
+        name="diploma-batch-download"),
     re_path(r'(?P<diploma_hash>[a-f0-9]{32})/$',
         views.DiplomaPdfView.as_view(),
         name="diploma-view"),
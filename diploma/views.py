@@ -1,20 +1,61 @@
-from typing import Any
+import time
+from typing import Any, Optional
 
+from django.contrib import messages
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse, HttpRequest
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpRequest
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.text import format_lazy
+from django.utils.translation import gettext_lazy as _
 from django.views.generic.base import View
 
 from authorization.permissions import ACCESS
 from course.viewbase import CourseInstanceMixin
+from exercise.cache.grades import CourseGrades
 from exercise.cache.points import CachedPoints
 from lib.helpers import settings_text
-from lib.viewbase import BaseTemplateView, BaseRedirectView
+from lib.viewbase import BaseTemplateView, BaseRedirectView, BaseView
 from userprofile.models import UserProfile
 
-from .grade import calculate_grade, assign_grade
+from .grade import assign_grade
 from .models import CourseDiplomaDesign, StudentDiploma
-from .pdf import render_diploma
+from .tasks import BATCH_FORMATS, render_diplomas
+
+
+# The results of the Celery tasks are forgotten after a day by default, so the
+# id of the task is not kept longer either
+BATCH_RESULT_TIMEOUT = 24 * 60 * 60
+# Seconds that a job may wait for a worker before it is considered lost. The
+# job reports its progress as soon as it starts.
+BATCH_START_TIMEOUT = 10 * 60
+
+
+def batch_cache_key(design: CourseDiplomaDesign) -> str:
+    return "diplomabatch:{:d}".format(design.id)
+
+
+def get_batch_result(design: CourseDiplomaDesign) -> Optional[Any]:
+    """
+    Returns the result of the latest diploma batch job of the design.
+
+    Celery reports the tasks it does not know as PENDING, so a job that is
+    still pending BATCH_START_TIMEOUT after it was enqueued has been lost by
+    the worker or the result backend, and None is returned for it.
+    """
+    job = cache.get(batch_cache_key(design))
+    if job is None:
+        return None
+    if isinstance(job, str):
+        # Stored before the enqueue time was stored with the task id
+        job = (job, 0)
+    task_id, enqueued_at = job
+    result = render_diplomas.AsyncResult(task_id)
+    if result.state == 'PENDING' and time.time() - enqueued_at > BATCH_START_TIMEOUT:
+        return None
+    return result
 
 
 class DiplomaMixin(CourseInstanceMixin):
@@ -42,27 +83,44 @@ class DiplomaListView(DiplomaMixin, BaseTemplateView):
     def get_common_objects(self) -> None:
         super().get_common_objects()
 
-        students = self.instance.students.all()
+        students = self.instance.students.select_related('user')
         group = self.request.GET.get("group")
         if group == "internal":
             students = [s for s in students if not s.is_external]
         elif group == "external":
             students = [s for s in students if s.is_external]
 
-        point_limits = self.design.point_limits
-        pad_points = self.design.pad_points
-        student_grades = []
-        for profile in students:
-            points = CachedPoints(self.instance, profile.user, self.is_course_staff)
-            student_grades.append((
-                profile,
-                calculate_grade(points.total(), point_limits, pad_points),
-            ))
-        self.student_grades = student_grades
+        grades = CourseGrades.get(self.instance).students
+        self.student_grades = [
+            (profile, grades[profile.id].diploma_grade)
+            for profile in students
+            if profile.id in grades
+        ]
         self.group = group
         self.internal_user_label = settings_text('INTERNAL_USER_LABEL')
         self.external_user_label = settings_text('EXTERNAL_USER_LABEL')
-        self.note('student_grades', 'group', 'internal_user_label', 'external_user_label')
+
+        self.allow_batch = self.instance.is_teacher(self.request.user)
+        self.batch_running = False
+        self.batch_info = ""
+        self.batch_ready = False
+        result = get_batch_result(self.design) if self.allow_batch else None
+        if result is not None:
+            if result.state == 'PROGRESS':
+                self.batch_running = True
+                self.batch_info = format_lazy(_('DIPLOMA_BATCH_PROGRESS -- {current}, {total}'),
+                    current=result.info.get('current'), total=result.info.get('total'))
+            elif result.state == 'PENDING':
+                self.batch_running = True
+                self.batch_info = _('DIPLOMA_BATCH_STARTING')
+            elif result.state == 'SUCCESS':
+                self.batch_ready = bool(result.result)
+            elif result.state == 'FAILURE':
+                self.batch_info = _('DIPLOMA_BATCH_FAILED')
+        self.note(
+            'student_grades', 'group', 'internal_user_label', 'external_user_label',
+            'design', 'allow_batch', 'batch_running', 'batch_info', 'batch_ready',
+        )
 
 
 class DiplomaCreateView(DiplomaMixin, BaseRedirectView):
@@ -91,10 +149,52 @@ class DiplomaCreateView(DiplomaMixin, BaseRedirectView):
         return self.redirect(diploma.get_absolute_url())
 
 
+class DiplomaBatchView(DiplomaMixin, BaseRedirectView):
+    """Starts the background job that renders the diplomas of the design"""
+    access_mode = ACCESS.TEACHER
+
+    def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        list_url = reverse('diploma-list', kwargs={self.diploma_kw: self.design.id})
+        output_format = request.POST.get('format')
+        if output_format not in BATCH_FORMATS:
+            return self.redirect(list_url)
+
+        # If a job is already running, let it finish instead of starting again
+        result = get_batch_result(self.design)
+        if result is not None and result.state in ('PENDING', 'PROGRESS'):
+            messages.warning(request, _('DIPLOMA_BATCH_ALREADY_RUNNING'))
+        else:
+            result = render_diplomas.delay(self.design.id, output_format)
+            cache.set(batch_cache_key(self.design), (result.id, time.time()), BATCH_RESULT_TIMEOUT)
+            messages.info(request, _('DIPLOMA_BATCH_STARTED'))
+        return self.redirect(list_url)
+
+
+class DiplomaBatchDownloadView(DiplomaMixin, BaseView):
+    access_mode = ACCESS.TEACHER
+
+    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        result = get_batch_result(self.design)
+        if result is None or result.state != 'SUCCESS' or not result.result:
+            raise Http404()
+        name = result.result
+        if not default_storage.exists(name):
+            raise Http404()
+        return FileResponse(
+            default_storage.open(name, 'rb'),
+            as_attachment=True,
+            filename="diplomas_{}.{}".format(self.instance.url, name.rsplit('.', 1)[-1]),
+        )
+
+
 class DiplomaPdfView(View):
 
     def get(self, request, *args, **kwargs):
-        diploma = get_object_or_404(StudentDiploma, hashkey=kwargs['diploma_hash'])
-        response = HttpResponse(content_type='application/pdf')
-        render_diploma(request, response, diploma)
-        return response
+        diploma = get_object_or_404(
+            StudentDiploma.objects.select_related('design'),
+            hashkey=kwargs['diploma_hash'],
+        )
+        # reportlab is imported only when a diploma is rendered, because it is
+        # slow to import at startup
+        from .pdf import get_diploma_pdf # pylint: disable=import-outside-toplevel
+        return HttpResponse(get_diploma_pdf(diploma), content_type='application/pdf')
@@ -18,7 +18,7 @@ from exercise.models import CourseChapter
 from lib.validators import generate_url_key_validator
 from lib.fields import UsersSearchSelectField
 from lib.widgets import DateTimeLocalInput
-from notification.cache import CachedNotifications
+from notification.cache import CachedNotifications, invalidate_unread_counts
 from userprofile.models import UserProfile
 
 
@@ -205,9 +205,10 @@ class CourseInstanceForm(forms.ModelForm):
         self.instance.set_assistants(self.cleaned_data['assistants'])
         self.instance.set_teachers(self.cleaned_data['teachers'])
 
-        if not self.instance.visible_to_students:
-            for userprofile in self.instance.all_students:
-                CachedNotifications.invalidate(userprofile.user)
+        if 'visible_to_students' in self.changed_data:
+            user_ids = list(self.instance.all_students.values_list('user_id', flat=True))
+            CachedNotifications.invalidate_many([(user_id,) for user_id in user_ids])
+            invalidate_unread_counts(user_ids)
 
         return super().save(*args, **kwargs)
 
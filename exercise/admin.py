@@ -1,8 +1,13 @@
 from typing import Optional, Sequence, Tuple
 
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.db.models.query import QuerySet
 from django.http.request import HttpRequest
+from django.http.response import HttpResponse
+from django.template.response import TemplateResponse
+from django.utils.text import format_lazy
 from django.utils.translation import gettext_lazy as _
 
 from exercise.models import (
@@ -23,6 +28,7 @@ from exercise.models import (
 )
 from exercise.exercisecollection_models import ExerciseCollection
 from lib.admin_helpers import make_column_link, RecentCourseInstanceListFilter
+from userprofile.models import UserProfile
 
 
 def real_class(obj):
@@ -159,6 +165,23 @@ class BaseExerciseAdmin(admin.ModelAdmin):
     )
 
 
+class ReassignSubmittersForm(forms.Form):
+    old_submitter = forms.CharField(label=_('LABEL_OLD_SUBMITTER'), help_text=_('USERNAME'))
+    new_submitter = forms.CharField(label=_('LABEL_NEW_SUBMITTER'), help_text=_('USERNAME'))
+
+    def clean_profile(self, field: str) -> UserProfile:
+        profile = UserProfile.objects.filter(user__username=self.cleaned_data[field]).first()
+        if profile is None:
+            raise forms.ValidationError(_('ERROR_USER_NOT_FOUND'))
+        return profile
+
+    def clean_old_submitter(self) -> UserProfile:
+        return self.clean_profile('old_submitter')
+
+    def clean_new_submitter(self) -> UserProfile:
+        return self.clean_profile('new_submitter')
+
+
 @admin.register(Submission)
 class SubmissionAdmin(admin.ModelAdmin):
     list_display_links = ('id',)
@@ -195,10 +218,38 @@ class SubmissionAdmin(admin.ModelAdmin):
         'exercise',
     )
     readonly_fields = ('submission_time',)
+    actions = ['reassign_submitters']
 
     def get_queryset(self, request):
         return super().get_queryset(request).prefetch_related('submitters')
 
+    @admin.action(description=_('REASSIGN_SUBMITTERS'))
+    def reassign_submitters(self, request: HttpRequest, queryset: QuerySet) -> Optional[HttpResponse]:
+        """Replaces a submitter with another one in the selected submissions"""
+        form = ReassignSubmittersForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            submission_ids = Submission.objects.reassign_submitters(
+                queryset,
+                form.cleaned_data['old_submitter'],
+                form.cleaned_data['new_submitter'],
+            )
+            self.message_user(
+                request,
+                format_lazy(_('SUBMITTERS_REASSIGNED -- {count}'), count=len(submission_ids)),
+                messages.SUCCESS,
+            )
+            return None
+        return TemplateResponse(request, 'admin/exercise/submission/reassign_submitters.html', {
+            **self.admin_site.each_context(request),
+            'title': _('REASSIGN_SUBMITTERS'),
+            'opts': self.model._meta,
+            'form': form,
+            'count': queryset.count(),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
 
 @admin.register(SubmissionDraft)
 class SubmissionDraftAdmin(admin.ModelAdmin):
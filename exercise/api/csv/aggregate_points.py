@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from typing import List
+from typing import Any, Dict, Iterator, List, Tuple
 
 from django.conf import settings
 
@@ -13,7 +13,12 @@ from exercise.cache.content import LearningObjectContent
 # For convenience, we also return the total submission count and points for student
 
 # pylint: disable-next=too-many-locals
-def aggregate_points(profiles, taggings, exercises: List[LearningObjectContent], aggregate):
+def aggregate_points(
+        profiles,
+        taggings,
+        exercises: List[LearningObjectContent],
+        aggregate,
+        ) -> Tuple[Iterator[Dict[str, Any]], List[str]]:
     DEFAULT_FIELDS = [
         'UserID', 'StudentID', 'Email', 'Name', 'Tags', 'Organization', 'Count', 'Total',
     ]
@@ -39,53 +44,48 @@ def aggregate_points(profiles, taggings, exercises: List[LearningObjectContent],
 
     # Prefetch all tag_id - user_id pairs at once from DB to avoid multiple queries
     # TODO: Ideally this should probably be done in api.csv.views
-    all_tags = list(taggings.all().values('user_id','tag_id'))
+    all_tags = {}
+    for item in taggings.all().values('user_id','tag_id'):
+        all_tags.setdefault(item['user_id'], []).append(str(item['tag_id']))
 
-    sheet = []
+    def rows():
+        for profile in profiles:
+            uid = profile.user.id
+            user_row = agg.get(uid, {})
+            user_tags = [
+                settings.EXTERNAL_USER_LABEL.lower() if profile.is_external else settings.INTERNAL_USER_LABEL.lower()
+            ]
+            # Instead of filtering the Django resultset (which causes a new DB query),
+            # we find the users' tags from the prefetched dict
+            user_tags.extend(all_tags.get(profile.id, []))
+            row = OrderedDict([
+                ('UserID', uid),
+                ('Email', profile.user.email),
+                ('StudentID', profile.student_id),
+                ('Name', profile.user.first_name + ' ' + profile.user.last_name),
+                ('Tags', '|'.join(user_tags)),
+                ('Organization', profile.organization),
+            ])
 
-    for profile in profiles:
-        uid = profile.user.id
-        user_row = agg.get(uid, {})
-        user_tags = [
-            settings.EXTERNAL_USER_LABEL.lower() if profile.is_external else settings.INTERNAL_USER_LABEL.lower()
-        ]
-        # Instead of filtering the Django resultset (which causes a new DB query),
-        # we find the users' tags manually from the prefetched array of dicts
-        other_tags = list(item for item in all_tags if item["user_id"] == profile.id)
-        #other_tags = all_tags.all().filter(user_id=profile.id)
-        for tag in other_tags:
-            user_tags.append(str(tag['tag_id']))
-        #user_tags.extend(tags.get(uid, []))
-        row = OrderedDict([
-            ('UserID', uid),
-            ('Email', profile.user.email),
-            ('StudentID', profile.student_id),
-            ('Name', profile.user.first_name + ' ' + profile.user.last_name),
-            ('Tags', '|'.join(user_tags)),
-            ('Organization', profile.organization),
-        ])
+            # Add submitted exercise count and points of the user as labeled dictionary items
+            # so for example if agg[uid] is {14: [1,10]}, it is turned into:
+            # "14 Count": 1
+            # "14 Total": 10
+            #
+            if uid in agg:
+                student_totalsubs = 0
+                student_totalscore = 0
+                for e, values in user_row.items():
+                    row[str(e) + ' Count'] = values[0]
+                    student_totalsubs += values[0]
+                    row[str(e) + ' Total'] = values[1]
+                    student_totalscore += values[1]
 
-        # Add submitted exercise count and points of the user as labeled dictionary items
-        # so for example if agg[uid] is {14: [1,10]}, it is turned into:
-        # "14 Count": 1
-        # "14 Total": 10
-        #
-        if uid in agg:
-            student_totalsubs = 0
-            student_totalscore = 0
-            try:
-                for e in agg[uid]:
-                    row[str(e) + ' Count'] = agg[uid][e][0]
-                    student_totalsubs += agg[uid][e][0]
-                    row[str(e) + ' Total'] = agg[uid][e][1]
-                    student_totalscore += agg[uid][e][1]
-            except KeyError:
-                pass
+                # Add totals per student
+                row['Count'] = student_totalsubs
+                row['Total'] = student_totalscore
 
-            # Add totals per student
-            row['Count'] = student_totalsubs
-            row['Total'] = student_totalscore
+            yield row
 
-        sheet.append(row)
-
-    return sheet, DEFAULT_FIELDS + exercise_fields
+    # The rows are generated lazily so that they can be streamed.
+    return rows(), DEFAULT_FIELDS + exercise_fields
@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from typing import List, Union
+from typing import Any, Dict, Iterator, List, Tuple, Union
 
 from exercise.cache.content import ModuleContent, LearningObjectContent
 
@@ -11,7 +11,7 @@ def aggregate_sheet(
         exercises: List[Union[ModuleContent, LearningObjectContent]],
         aggregate,
         number,
-        ):
+        ) -> Tuple[Iterator[Dict[str, Any]], List[str]]:
     DEFAULT_FIELDS = [
       'UserID', 'StudentID', 'Email', 'Tags',
     ]
@@ -77,27 +77,28 @@ def aggregate_sheet(
         else:
             tags[t.user_id] = [str(t.tag_id)]
 
-    sheet = []
-    for profile in profiles:
-        uid = profile.user.id
-        user_row = agg.get(uid, {})
-        user_tags = ['mooc' if profile.is_external else 'aalto']
-        user_tags.extend(tags.get(uid, []))
-        row = OrderedDict([
-            ('UserID', uid),
-            ('StudentID', profile.student_id),
-            ('Email', profile.user.email),
-            ('Tags', '|'.join(user_tags)),
-        ])
-        for i,num in enumerate(exercise_nums):
-            values = user_row.get(num, [0,0])
-            maxp = exercise_max[num]
-            for j in [0,1]:
-                row[exercise_fields[3 * i + j]] = values[j]
-            row[exercise_fields[3 * i + 2]] = (
-                values[1] / maxp if maxp > 0 else
-                1 if values[0] > 0 else 0
-            )
-        sheet.append(row)
+    def rows():
+        for profile in profiles:
+            uid = profile.user.id
+            user_row = agg.get(uid, {})
+            user_tags = ['mooc' if profile.is_external else 'aalto']
+            user_tags.extend(tags.get(uid, []))
+            row = OrderedDict([
+                ('UserID', uid),
+                ('StudentID', profile.student_id),
+                ('Email', profile.user.email),
+                ('Tags', '|'.join(user_tags)),
+            ])
+            for i,num in enumerate(exercise_nums):
+                values = user_row.get(num, [0,0])
+                maxp = exercise_max[num]
+                for j in [0,1]:
+                    row[exercise_fields[3 * i + j]] = values[j]
+                row[exercise_fields[3 * i + 2]] = (
+                    values[1] / maxp if maxp > 0 else
+                    1 if values[0] > 0 else 0
+                )
+            yield row
 
-    return sheet, DEFAULT_FIELDS + exercise_fields
+    # The rows are generated lazily so that they can be streamed.
+    return rows(), DEFAULT_FIELDS + exercise_fields
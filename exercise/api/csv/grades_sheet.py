@@ -0,0 +1,37 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from userprofile.models import UserProfile
+from ...cache.grades import CourseGrades
+
+
+def grades_sheet(
+        profiles: Iterable[UserProfile],
+        grades: CourseGrades,
+        ) -> Tuple[Iterator[Dict[str, Any]], List[str]]:
+    DEFAULT_FIELDS = [
+      'UserID', 'StudentID', 'Email', 'Points',
+    ]
+    difficulty_fields = ['Points {}'.format(d) for d in grades.difficulties]
+    threshold_fields = list(grades.thresholds.values())
+
+    def rows():
+        for profile in profiles:
+            student = grades.students.get(profile.id)
+            if student is None:
+                continue
+            row = OrderedDict([
+                ('UserID', profile.user.id),
+                ('StudentID', profile.student_id),
+                ('Email', profile.user.email),
+                ('Points', student.points),
+            ])
+            for difficulty, name in zip(grades.difficulties, difficulty_fields):
+                row[name] = student.points_by_difficulty.get(difficulty, 0)
+            for threshold_id, name in zip(grades.thresholds, threshold_fields):
+                row[name] = 1 if student.thresholds[threshold_id] else 0
+            row['Grade'] = student.diploma_grade
+            yield row
+
+    # The rows are generated lazily so that they can be streamed.
+    return rows(), DEFAULT_FIELDS + difficulty_fields + threshold_fields + ['Grade']
@@ -1,10 +1,13 @@
 from collections import OrderedDict
-from typing import Any, Dict, Iterable, List, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
 
+from django.db.models import Prefetch
+from django.db.models.query import QuerySet
 from rest_framework.request import Request
 from rest_framework.reverse import reverse
 
-from ...models import BaseExercise, Submission
+from userprofile.models import UserProfile
+from ...models import BaseExercise, Submission, SubmissionTagging
 
 
 def filter_best_submissions(
@@ -42,19 +45,87 @@ def filter_best_submissions(
             filtered.append(submissions[i])
     return filtered
 
-def submissions_sheet( # pylint: disable=too-many-locals too-many-branches # noqa: MC0001
+def prefetch_sheet_data(queryset: QuerySet[Submission]) -> QuerySet[Submission]:
+    """
+    Fetches the related objects used by submissions_sheet in bulk, so that
+    building the rows does not run queries per submission.
+    """
+    return queryset.select_related(
+        'grader__user',
+    ).prefetch_related(
+        Prefetch(
+            'exercise',
+            queryset=BaseExercise.objects.select_related(
+                'category',
+                'course_module__course_instance',
+            ),
+        ),
+        Prefetch(
+            'submitters',
+            queryset=UserProfile.objects.select_related('user'),
+        ),
+        Prefetch(
+            'submission_taggings',
+            queryset=SubmissionTagging.objects.select_related('tag'),
+        ),
+        'notifications',
+        'files',
+    )
+
+
+class _ExerciseColumns:
+    """The exercise specific values of the sheet, computed once per exercise."""
+    def __init__(self, exercise: BaseExercise) -> None:
+        self.id = exercise.id
+        self.category = exercise.category.name
+        self.name = str(exercise)
+        self.fields = []
+        self.files = []
+        if exercise.exercise_info:
+            for e in exercise.exercise_info.get('form_spec', []):
+                t = e['type']
+                if t == 'file':
+                    self.files.append(e['key'])
+                elif t != 'static':
+                    self.fields.append(e['key'])
+
+
+def submissions_sheet( # pylint: disable=too-many-locals
         request: Request,
-        submissions: Iterable[Submission],
+        submissions: Sequence[Submission],
         revealed_ids: Set[int],
-        ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        ) -> Tuple[Iterator[Dict[str, Any]], List[str]]:
+    """
+    Returns the rows of the submissions as a generator and the field names.
+
+    The submissions are iterated twice: first to find the field names,
+    which are needed for the header, and then lazily to build the rows.
+    The submissions should be fetched with prefetch_sheet_data.
+    """
     DEFAULT_FIELDS = [
         'ExerciseID', 'Category', 'Exercise', 'SubmissionID', 'Time',
         'UserID', 'StudentID', 'Email', 'Status',
         'Grade', 'Penalty', 'Graded', 'Tags', 'GraderEmail', 'Notified', 'NSeen',
     ]
-    sheet = []
-    fields = []
-    files = []
+    # Dicts are used as ordered sets.
+    fields: Dict[str, None] = {}
+    files: Dict[str, None] = {}
+    columns: Dict[int, _ExerciseColumns] = {}
+
+    for s in submissions:
+        exercise_columns = columns.get(s.exercise_id)
+        if exercise_columns is None:
+            exercise_columns = columns[s.exercise_id] = _ExerciseColumns(s.exercise)
+            for k in exercise_columns.files:
+                files.setdefault(k)
+            for k in exercise_columns.fields:
+                fields.setdefault(k)
+        if s.submission_data:
+            for k,v in s.submission_data:
+                if v or k not in files:
+                    fields.setdefault(k)
+        for f in s.files.all():
+            files.setdefault(f.param_name)
 
     def url(submission, obj):
         return reverse(
@@ -66,70 +137,55 @@ def submissions_sheet( # pylint: disable=too-many-locals too-many-branches # noq
             request=request
         )
 
-    exercise = None
-    for s in submissions: # pylint: disable=too-many-nested-blocks
-        if s.exercise != exercise:
-            exercise = s.exercise
-            if exercise.exercise_info:
-                for e in exercise.exercise_info.get('form_spec', []):
-                    t = e['type']
-                    k = e['key']
-                    if t == 'file':
-                        if k not in files:
-                            files.append(k)
-                    elif t != 'static':
-                        if k not in fields:
-                            fields.append(k)
-
-        grader = s.grader.user.email if s.grader else None
-
-        # Find reviewer email from rubyric feedback.
-        t = s.feedback
-        if not grader and t and t.startswith("\n<p>\nReviewer:"):
-            grader = t[t.find("<a href=\"mailto:")+16:t.find("\">")]
-
-        tags = [st.tag.slug for st in s.submission_taggings.all()]
-
-        n = s.notifications.first()
-        row = OrderedDict([
-            ('ExerciseID', exercise.id),
-            ('Category', exercise.category.name),
-            ('Exercise', str(exercise)),
-            ('SubmissionID', s.id),
-            ('Time', str(s.submission_time)),
-            ('UserID', None),
-            ('StudentID', None),
-            ('Email', None),
-            ('Status', s.status),
-            ('Grade', s.grade if exercise.id in revealed_ids else 0),
-            ('Penalty', s.late_penalty_applied),
-            ('Graded', str(s.grading_time)),
-            ('Tags', '|'.join(tags)),
-            ('GraderEmail', grader),
-            ('Notified', n is not None),
-            ('NSeen', n.seen if n else False),
-        ])
-
-        if s.submission_data:
-            for k,v in s.submission_data:
-                if v or k not in files:
-                    if k not in fields:
-                        fields.append(k)
-                    if k in row:
-                        row[k] += "|" + str(v)
-                    else:
-                        row[k] = str(v)
-
-        for f in s.files.all():
-            if f.param_name not in files:
-                files.append(f.param_name)
-            row[f.param_name] = url(s,f)
-
-        for i,profile in enumerate(s.submitters.all()):
-            r = row.copy() if i > 0 else row
-            r['UserID'] = profile.user.id
-            r['StudentID'] = profile.student_id
-            r['Email'] = profile.user.email
-            sheet.append(r)
-
-    return sheet, DEFAULT_FIELDS + fields + files
+    def rows():
+        for s in submissions:
+            exercise_columns = columns[s.exercise_id]
+            grader = s.grader.user.email if s.grader else None
+
+            # Find reviewer email from rubyric feedback.
+            t = s.feedback
+            if not grader and t and t.startswith("\n<p>\nReviewer:"):
+                grader = t[t.find("<a href=\"mailto:")+16:t.find("\">")]
+
+            tags = [st.tag.slug for st in s.submission_taggings.all()]
+
+            notifications = s.notifications.all()
+            n = notifications[0] if notifications else None
+            row = OrderedDict([
+                ('ExerciseID', exercise_columns.id),
+                ('Category', exercise_columns.category),
+                ('Exercise', exercise_columns.name),
+                ('SubmissionID', s.id),
+                ('Time', str(s.submission_time)),
+                ('UserID', None),
+                ('StudentID', None),
+                ('Email', None),
+                ('Status', s.status),
+                ('Grade', s.grade if exercise_columns.id in revealed_ids else 0),
+                ('Penalty', s.late_penalty_applied),
+                ('Graded', str(s.grading_time)),
+                ('Tags', '|'.join(tags)),
+                ('GraderEmail', grader),
+                ('Notified', n is not None),
+                ('NSeen', n.seen if n else False),
+            ])
+
+            if s.submission_data:
+                for k,v in s.submission_data:
+                    if v or k not in files:
+                        if k in row:
+                            row[k] += "|" + str(v)
+                        else:
+                            row[k] = str(v)
+
+            for f in s.files.all():
+                row[f.param_name] = url(s,f)
+
+            for i,profile in enumerate(s.submitters.all()):
+                r = row.copy() if i > 0 else row
+                r['UserID'] = profile.user.id
+                r['StudentID'] = profile.student_id
+                r['Email'] = profile.user.email
+                yield r
+
+    return rows(), DEFAULT_FIELDS + list(fields) + list(files)
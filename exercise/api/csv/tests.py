@@ -8,6 +8,7 @@ from course.models import Course, CourseInstance, CourseModule
 from exercise.models import BaseExercise, CourseChapter, LearningObjectCategory
 from exercise.submission_models import Submission
 
+from .submission_sheet import prefetch_sheet_data, submissions_sheet
 from .views import CourseResultsDataViewSet
 
 class CourseResultsDataViewSetTest(TestCase):
@@ -199,4 +200,34 @@ class CourseResultsDataViewSetTest(TestCase):
         create_submission(self.student_profile2, exercise=self.c1_mandatory_learning_object1, grade=2)
 
         self.assertEqual(query(True), all_submissions())
-        self.assertEqual(query(False), confirmed_submissions())
\ No newline at end of file
+        self.assertEqual(query(False), confirmed_submissions())
+
+    def test_submissions_sheet_uses_prefetched_data(self):
+        for profile in (self.student_profile, self.student_profile2):
+            for value in ('a', 'b'):
+                sub = Submission.objects.create(
+                    exercise=self.learning_object1,
+                    grader=self.student_profile2,
+                    submission_data=[['field_1', value], ['field_0', value]],
+                )
+                sub.submitters.add(profile)
+        sub = Submission.objects.create(
+            exercise=self.c1_learning_object1,
+            submission_data=[['field_2', 'c']],
+        )
+        sub.submitters.add(self.student_profile)
+
+        submissions = list(prefetch_sheet_data(
+            Submission.objects.filter(exercise__course_module=self.module1),
+        ).order_by('exercise_id', 'id'))
+        with self.assertNumQueries(0):
+            data, fields = submissions_sheet(None, submissions, {self.learning_object1.id})
+            rows = list(data)
+
+        self.assertEqual(fields[-3:], ['field_1', 'field_0', 'field_2'])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['UserID'], self.student.id)
+        self.assertEqual(rows[0]['GraderEmail'], self.student2.email)
+        self.assertEqual(rows[0]['Category'], self.learning_object_category1.name)
+        self.assertEqual(rows[-1]['field_2'], 'c')
+        self.assertEqual(rows[-1]['Grade'], 0)
@@ -10,28 +10,30 @@ from django.db.models import (
 )
 from django.db.models.aggregates import Count
 from django.db.models.query import QuerySet
+from django.http.response import HttpResponseBase
 from rest_framework import viewsets
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from rest_framework_csv.renderers import CSVRenderer
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
-from lib.api.renderers import CSVExcelRenderer
+from lib.api.renderers import CSVExcelRenderer, NDJSONRenderer, StreamingCSVRenderer, streaming_response
 from lib.api.core import APlusJSONRenderer
 from lib.api.mixins import MeUserMixin
 from lib.api.constants import REGEX_INT_ME
 from course.api.mixins import CourseResourceMixin
-from course.permissions import IsCourseAdminOrUserObjIsSelf
+from course.permissions import IsCourseAdminOrUserObjIsSelf, OnlyCourseTeacherPermission
 from exercise.exercise_models import BaseExercise
 from exercise.submission_models import SubmissionQuerySet
 from userprofile.models import UserProfile
 
+from ...cache.grades import CourseGrades
 from ...cache.points import CachedPoints, ExercisePoints
 from ...models import Submission
-from .submission_sheet import filter_best_submissions, submissions_sheet
+from .submission_sheet import filter_best_submissions, prefetch_sheet_data, submissions_sheet
 from .aggregate_sheet import aggregate_sheet
 from .aggregate_points import aggregate_points
+from .grades_sheet import grades_sheet
 
 
 class CourseSubmissionDataViewSet(NestedViewSetMixin,
@@ -71,8 +73,9 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
         IsCourseAdminOrUserObjIsSelf,
     )
     renderer_classes = [
-        CSVRenderer,
+        StreamingCSVRenderer,
         CSVExcelRenderer,
+        NDJSONRenderer,
     ] + api_settings.DEFAULT_RENDERER_CLASSES
     lookup_field = 'user_id'
     lookup_url_kwarg = 'user_id'
@@ -99,7 +102,7 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
             request: Request,
             version: Optional[Union[int, str]] = None, # pylint: disable=unused-argument
             course_id: Optional[Union[int, str]] = None, # pylint: disable=unused-argument
-            ) -> Response:
+            ) -> HttpResponseBase:
         profiles = self.filter_queryset(self.get_queryset())
         search_args = self.get_search_args(request)
         # Here, CachedPoints is only used to find the exercises whose feedback
@@ -109,10 +112,10 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
         points = CachedPoints(self.instance, request.user, self.is_course_staff)
         ids = [e.id for e in self.content.search_exercises(**search_args)]
         revealed_ids = get_revealed_exercise_ids(search_args, points)
-        queryset = Submission.objects.filter(
+        queryset = prefetch_sheet_data(Submission.objects.filter(
             exercise_id__in=ids,
             submitters__in=profiles
-        ).prefetch_related('exercise', 'notifications', 'files').distinct()
+        ).distinct())
         return self.serialize_submissions(request, queryset, revealed_ids, best=search_args['best'])
 
     def retrieve( # pylint: disable=arguments-differ
@@ -121,15 +124,15 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
             version: Optional[Union[int, str]] = None, # pylint: disable=unused-argument
             course_id: Optional[Union[int, str]] = None, # pylint: disable=unused-argument
             user_id: Optional[Union[int, str]] = None, # pylint: disable=unused-argument
-            ) -> Response:
+            ) -> HttpResponseBase:
         profile = self.get_object()
         search_args = self.get_search_args(request)
         points = CachedPoints(self.instance, profile.user, self.is_course_staff)
         ids = points.submission_ids(**search_args)
         revealed_ids = get_revealed_exercise_ids(search_args, points)
-        queryset = Submission.objects.filter(
+        queryset = prefetch_sheet_data(Submission.objects.filter(
             id__in=ids
-        ).prefetch_related('exercise', 'notifications', 'files')
+        ))
         return self.serialize_submissions(request, queryset, revealed_ids)
 
     def serialize_submissions(
@@ -138,7 +141,7 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
             queryset: QuerySet[Submission],
             revealed_ids: Set[int],
             best: bool = False
-            ) -> Response:
+            ) -> HttpResponseBase:
         submissions = list(queryset.order_by('exercise_id', 'id'))
         if best:
             submissions = filter_best_submissions(submissions, revealed_ids)
@@ -154,19 +157,25 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
             vals = [submitted_field(s, field) for s in submissions]
             return Response([v for v in vals if v != ""])
         data,fields = submissions_sheet(request, submissions, revealed_ids)
-        self.renderer_fields = fields
-        response = Response(data)
-        if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
-            response['Content-Disposition'] = 'attachment; filename="submissions.csv"'
-        elif isinstance(getattr(request, 'accepted_renderer'), APlusJSONRenderer):
-            response['Content-Disposition'] = 'attachment; filename="submissions.json"'
-        return response
+        return self.sheet_response(request, data, fields, 'submissions')
 
     def get_renderer_context(self):
         context = super().get_renderer_context()
         context['header'] = getattr(self, 'renderer_fields', None)
         return context
 
+    def sheet_response(
+            self,
+            request: Request,
+            rows: Iterable[Dict[str, Any]],
+            fields: List[str],
+            name: str,
+            ) -> HttpResponseBase:
+        response = streaming_response(self, request, rows, fields, name)
+        if isinstance(getattr(request, 'accepted_renderer'), APlusJSONRenderer):
+            response['Content-Disposition'] = f'attachment; filename="{name}.json"'
+        return response
+
 
 class CoursePendingSubmissionDataViewSet(CourseSubmissionDataViewSet):
     """
@@ -182,7 +191,7 @@ class CoursePendingSubmissionDataViewSet(CourseSubmissionDataViewSet):
             queryset: QuerySet[Submission],
             revealed_ids: Set[int],
             best: bool = False
-            ) -> Response:
+            ) -> HttpResponseBase:
         submissions = list(queryset.order_by('exercise_id', 'id'))
         if best:
             submissions = filter_best_submissions(submissions, revealed_ids, self.include_all_submissions)
@@ -198,13 +207,7 @@ class CoursePendingSubmissionDataViewSet(CourseSubmissionDataViewSet):
             vals = [submitted_field(s, field) for s in submissions]
             return Response([v for v in vals if v != ""])
         data,fields = submissions_sheet(request, submissions, revealed_ids)
-        self.renderer_fields = fields
-        response = Response(data)
-        if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
-            response['Content-Disposition'] = 'attachment; filename="submissions.csv"'
-        elif isinstance(getattr(request, 'accepted_renderer'), APlusJSONRenderer):
-            response['Content-Disposition'] = 'attachment; filename="submissions.json"'
-        return response
+        return self.sheet_response(request, data, fields, 'submissions')
 
 
 class CourseAggregateDataViewSet(NestedViewSetMixin,
@@ -243,7 +246,9 @@ class CourseAggregateDataViewSet(NestedViewSetMixin,
         IsCourseAdminOrUserObjIsSelf,
     )
     renderer_classes = [
-        CSVRenderer,
+        StreamingCSVRenderer,
+        CSVExcelRenderer,
+        NDJSONRenderer,
     ] + api_settings.DEFAULT_RENDERER_CLASSES
     lookup_field = 'user_id'
     lookup_url_kwarg = 'user_id'
@@ -271,7 +276,7 @@ class CourseAggregateDataViewSet(NestedViewSetMixin,
     def retrieve(self, request, version=None, course_id=None, user_id=None):
         return self.serialize_profiles(request, [self.get_object()])
 
-    def serialize_profiles(self, request: Request, profiles: QuerySet[UserProfile]) -> Response:
+    def serialize_profiles(self, request: Request, profiles: QuerySet[UserProfile]) -> HttpResponseBase:
         search_args = self.get_search_args(request)
         entry, exercises = self.content.search_entries(**search_args)
         ids = [e.id for e in exercises if e.type == 'exercise']
@@ -295,11 +300,7 @@ class CourseAggregateDataViewSet(NestedViewSetMixin,
             aggr,
             entry.number if entry else "",
         )
-        self.renderer_fields = fields
-        response = Response(data)
-        if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
-            response['Content-Disposition'] = 'attachment; filename="aggregate.csv"'
-        return response
+        return streaming_response(self, request, data, fields, 'aggregate')
 
     def get_renderer_context(self):
         context = super().get_renderer_context()
@@ -340,7 +341,9 @@ class CourseResultsDataViewSet(NestedViewSetMixin,
         IsCourseAdminOrUserObjIsSelf,
     )
     renderer_classes = [
-        CSVRenderer,
+        StreamingCSVRenderer,
+        CSVExcelRenderer,
+        NDJSONRenderer,
     ] + api_settings.DEFAULT_RENDERER_CLASSES
     lookup_field = 'user_id'
     lookup_url_kwarg = 'user_id'
@@ -448,7 +451,7 @@ class CourseResultsDataViewSet(NestedViewSetMixin,
 
         return query.order_by()
 
-    def serialize_profiles(self, request: Request, profiles: QuerySet[UserProfile]) -> Response:
+    def serialize_profiles(self, request: Request, profiles: QuerySet[UserProfile]) -> HttpResponseBase:
         search_args = self.get_search_args(request)
         exercises = self.content.search_exercises(**search_args)
         ids = [e.id for e in exercises]
@@ -466,11 +469,7 @@ class CourseResultsDataViewSet(NestedViewSetMixin,
             exercises,
             aggr,
         )
-        self.renderer_fields = fields
-        response = Response(data)
-        if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
-            response['Content-Disposition'] = 'attachment; filename="aggregate.csv"'
-        return response
+        return streaming_response(self, request, data, fields, 'aggregate')
 
     def get_renderer_context(self):
         context = super().get_renderer_context()
@@ -492,6 +491,45 @@ class CourseBestResultsDataViewSet(CourseResultsDataViewSet):
     point_annotator = "annotate_best_submitter_points"
 
 
+class CourseGradesDataViewSet(NestedViewSetMixin,
+                              CourseResourceMixin,
+                              viewsets.GenericViewSet):
+    """
+    The `gradesdata` endpoint returns the total points, the passed thresholds
+    and the diploma grades of the students in the course in CSV format.
+
+    Operations
+    ----------
+
+    `GET /courses/<course_id>/gradesdata/`:
+        returns the grades of all students as CSV. The points are counted
+        with the unrevealed results, and the threshold columns are 1 if the
+        student has passed the threshold and 0 otherwise. The grade is empty
+        if the course has no diploma.
+    """
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES + [
+        OnlyCourseTeacherPermission,
+    ]
+    renderer_classes = [
+        StreamingCSVRenderer,
+        CSVExcelRenderer,
+        NDJSONRenderer,
+    ] + api_settings.DEFAULT_RENDERER_CLASSES
+
+    def get_queryset(self):
+        return self.instance.students.select_related('user').order_by('id')
+    # pylint: disable-next=arguments-differ unused-argument
+    def list(self, request, version=None, course_id=None):
+        grades = CourseGrades.get(self.instance)
+        data,fields = grades_sheet(self.get_queryset(), grades)
+        return streaming_response(self, request, data, fields, 'grades')
+
+    def get_renderer_context(self):
+        context = super().get_renderer_context()
+        context['header'] = getattr(self, 'renderer_fields', None)
+        return context
+
+
 def int_or_none(value):
     if value is not None:
         try:
@@ -1,9 +1,12 @@
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
 from lib.api.fields import NestedHyperlinkedIdentityField
 from lib.api.serializers import AplusModelSerializer
 from userprofile.api.serializers import UserBriefSerializer
+from userprofile.models import UserProfile
 from ..models import Submission, SubmittedFile, BaseExercise
 
 
@@ -12,6 +15,7 @@ __all__ = [
     'SubmissionBriefSerializer',
     'SubmittedFileBriefSerializer',
     'SubmitterStatsBriefSerializer',
+    'SubmitterReassignSerializer',
 ]
 
 
@@ -89,3 +93,56 @@ class SubmitterStatsBriefSerializer(UserBriefSerializer):
         fields = UserBriefSerializer.Meta.fields + (
             'stats',
         )
+
+
+class SubmitterReassignSerializer(serializers.Serializer):
+    """
+    The input of replacing a submitter with another one in many submissions
+    of a course instance. The submitters are given as user ids.
+    """
+    # The submission ids are not validated one by one, because there may be
+    # thousands of them. The ids outside the course instance are ignored.
+    submissions = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+    )
+    exercises = serializers.PrimaryKeyRelatedField(
+        many=True,
+        required=False,
+        queryset=BaseExercise.objects.none(),
+    )
+    old_submitter = serializers.SlugRelatedField(
+        slug_field='user_id',
+        queryset=UserProfile.objects.all(),
+    )
+    new_submitter = serializers.SlugRelatedField(
+        slug_field='user_id',
+        queryset=UserProfile.objects.none(),
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        course_instance = self.context['course_instance']
+        self.fields['exercises'].child_relation.queryset = BaseExercise.objects.filter(
+            course_module__course_instance=course_instance,
+        )
+        self.fields['new_submitter'].queryset = course_instance.get_student_profiles()
+
+    def validate(self, attrs):
+        if not attrs.get('submissions') and not attrs.get('exercises'):
+            raise serializers.ValidationError(_("SUBMISSIONS_AND_EXERCISES_MISSING"))
+        return attrs
+
+    def get_submissions(self):
+        """Returns the selected submissions of the old submitter as a queryset"""
+        data = self.validated_data
+        condition = Q()
+        if data.get('submissions'):
+            condition |= Q(id__in=data['submissions'])
+        if data.get('exercises'):
+            condition |= Q(exercise__in=data['exercises'])
+        return Submission.objects.filter(
+            condition,
+            exercise__course_module__course_instance=self.context['course_instance'],
+            submitters=data['old_submitter'],
+        )
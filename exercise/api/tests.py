@@ -4,6 +4,7 @@ from rest_framework.exceptions import ErrorDetail
 from django.contrib.auth.models import User
 from course.models import Course, CourseInstance
 from exercise.models import LearningObjectCategory
+from lib.testdata import CourseTestCase
 from django.utils import timezone
 from datetime import timedelta
 
@@ -86,3 +87,68 @@ class ExerciceSubmissionAPITest(TestCase):
         client.force_authenticate(user=self.student)
         response = client.get('/api/v2/submissions/1/')
         self.assertEqual(response.data, {'detail': ErrorDetail(string='Submission not found', code='not_found')})
+
+
+class SubmitterReassignAPITest(CourseTestCase):
+    def setUp(self):
+        self.instance.enroll_student(self.user)
+        self.client = APIClient()
+        self.url = f'/api/v2/courses/{self.instance.id}/reassignsubmitters/'
+
+    def test_reassign(self):
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.post(
+            self.url,
+            {
+                'old_submitter': self.student.id,
+                'new_submitter': self.user.id,
+                'exercises': [self.exercise.id],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(set(response.data['submissions']), {self.submission.id, self.submission2.id})
+        self.assertEqual(list(self.submission.submitters.all()), [self.user.userprofile])
+        # The submissions of the other exercises are not changed
+        self.assertEqual(
+            set(self.submission3.submitters.all()),
+            {self.student.userprofile, self.user.userprofile},
+        )
+
+    def test_invalid_input(self):
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.post(
+            self.url,
+            {'old_submitter': self.student.id, 'new_submitter': self.user.id},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # The new submitter must be a student of the course
+        response = self.client.post(
+            self.url,
+            {
+                'old_submitter': self.student.id,
+                'new_submitter': self.teacher.id,
+                'submissions': [self.submission.id],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('new_submitter', response.data)
+        self.assertEqual(list(self.submission.submitters.all()), [self.student.userprofile])
+
+    def test_students_are_forbidden(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.post(
+            self.url,
+            {
+                'old_submitter': self.student.id,
+                'new_submitter': self.user.id,
+                'submissions': [self.submission.id],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(list(self.submission.submitters.all()), [self.student.userprofile])
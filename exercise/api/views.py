@@ -28,6 +28,7 @@ from course.permissions import (
     JWTSubmissionCreatePermission,
     JWTSubmissionWritePermission,
     OnlyCourseStaffPermission,
+    OnlyCourseTeacherPermission,
 )
 from course.api.mixins import CourseResourceMixin
 from course.models import SubmissionTag
@@ -54,7 +55,7 @@ from .mixins import (
 from ..forms import (
     SubmissionCreateAndReviewForm,
 )
-from .serializers import SubmissionBriefSerializer, SubmitterStatsBriefSerializer
+from .serializers import SubmissionBriefSerializer, SubmitterReassignSerializer, SubmitterStatsBriefSerializer
 from .full_serializers import (
     ExerciseSerializer,
     ExerciseGraderSerializer,
@@ -759,6 +760,52 @@ class CoursePointsViewSet(ListSerializerMixin,
         return super().retrieve(request, *args, **kwargs)
 
 
+class CourseSubmitterReassignViewSet(NestedViewSetMixin,
+                                     CourseResourceMixin,
+                                     viewsets.GenericViewSet):
+    """
+    The `reassignsubmitters` endpoint replaces a submitter with another one
+    in many submissions at once, e.g. when students have submitted in wrong
+    groups.
+
+    Operations
+    ----------
+
+    `POST /courses/<course_id>/reassignsubmitters/`:
+        replaces the old submitter with the new submitter in the selected
+        submissions of the old submitter. Returns the ids of the changed
+        submissions.
+
+    - Body data:
+        - `old_submitter`: user id
+        - `new_submitter`: user id of a student of the course
+        - `submissions`: submission ids
+        - `exercises`: exercise ids, whose submissions are included
+    """
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES + [
+        OnlyCourseTeacherPermission,
+    ]
+    serializer_class = SubmitterReassignSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update({ 'course_instance': self.instance })
+        return context
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        submission_ids = Submission.objects.reassign_submitters(
+            serializer.get_submissions(),
+            serializer.validated_data['old_submitter'],
+            serializer.validated_data['new_submitter'],
+        )
+        return Response({
+            'count': len(submission_ids),
+            'submissions': submission_ids,
+        })
+
+
 class ExerciseStatisticsView(BaseStatisticsView):
     """
     Returns submission statistics for an exercise, over a given time window.
@@ -790,6 +837,9 @@ class ExerciseStatisticsView(BaseStatisticsView):
             exercise=exercise_id,
         )
 
+    def get_rollup_scope(self):
+        return { 'exercise_id': int(self.kwargs['exercise_id']) }
+
     def get_object(self):
         obj = super().get_object()
         obj.update({ 'exercise_id': self.kwargs['exercise_id'] })
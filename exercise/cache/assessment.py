@@ -0,0 +1,344 @@
+"""
+The manual assessment queue of an exercise.
+
+The queue is a snapshot of the submitters of the exercise whose submissions
+have not been assessed yet, ordered by their earliest submission, together
+with the submission that is opened for each of them. It is built with two
+queries and kept in the cache until the submissions of the exercise change
+in a way that can add submitters to the queue.
+
+Assistants claim submitters from the queue with cache.add(), so that two
+assistants are not given the same submitter at the same time. The
+submitters that an assistant skips are recorded in the cache in the same
+way, so they are not given to the assistant again until the assistant has
+gone through the rest of the queue. Assessed
+submitters are marked done and counted with cache.add() and cache.incr(),
+so the progress is updated without counting the submitters again.
+"""
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from userprofile.models import UserProfile
+from .points import FinalSubmissionChooser
+from ..models import BaseExercise, Submission
+
+
+# Number of queued submitters whose claims are fetched with one cache call
+CLAIM_BATCH_SIZE = 50
+# Seconds that the submitters skipped by an assistant are remembered
+SKIP_TIMEOUT = 24 * 60 * 60
+
+QueueEntry = Tuple[int, int]
+
+
+def best_submission_ids(exercise: BaseExercise, profile_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Returns the id of the best submission of each submitter in the exercise,
+    or the last submission if none of them is graded, using one query.
+
+    The submission is chosen with FinalSubmissionChooser like in CachedPoints.
+    """
+    profile_ids = list(profile_ids)
+    if not profile_ids:
+        return {}
+    submissions: Dict[int, List[Submission]] = defaultdict(list)
+    rows = (
+        Submission.submitters.through.objects
+        .filter(submission__exercise=exercise, userprofile_id__in=profile_ids)
+        .order_by('-submission__submission_time')
+        .values_list(
+            'userprofile_id',
+            'submission_id',
+            'submission__status',
+            'submission__grade',
+            'submission__submission_time',
+            'submission__force_exercise_points',
+        )
+    )
+    for profile_id, submission_id, status, grade, submission_time, force_exercise_points in rows:
+        submissions[profile_id].append(Submission(
+            id=submission_id,
+            status=status,
+            grade=grade,
+            submission_time=submission_time,
+            force_exercise_points=force_exercise_points,
+        ))
+
+    result = {}
+    for profile_id, user_submissions in submissions.items():
+        chooser = FinalSubmissionChooser(exercise.grading_mode)
+        for submission in user_submissions:
+            chooser.consider(submission)
+        # The last submission if none of them can be chosen
+        result[profile_id] = (chooser.best or user_submissions[0]).id
+    return result
+
+
+class AssessmentQueue:
+    """
+    The manual assessment queue of an exercise.
+
+    The snapshot of the queue is regenerated when it has been invalidated or
+    it is older than ASSESSMENT_QUEUE_TIMEOUT. Claims outlive the snapshots,
+    so regenerating it does not give a claimed submitter to another assistant.
+    """
+    KEY_PREFIX = 'assessmentqueue'
+
+    def __init__(self, exercise: BaseExercise) -> None:
+        self.exercise = exercise
+        self._snapshot: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def _key(cls, exercise_id: int, *parts: Any) -> str:
+        return ':'.join(str(part) for part in (cls.KEY_PREFIX, exercise_id) + parts)
+
+    @classmethod
+    def invalidate(cls, exercise_id: int) -> None:
+        cache.delete(cls._key(exercise_id))
+
+    @classmethod
+    def invalidate_many(cls, exercise_ids: Iterable[int]) -> None:
+        cache.delete_many([cls._key(exercise_id) for exercise_id in exercise_ids])
+
+    def _claim_key(self, profile_id: int) -> str:
+        return self._key(self.exercise.id, 'claim', profile_id)
+
+    def _assistant_key(self, user_id: int) -> str:
+        return self._key(self.exercise.id, 'assistant', user_id)
+
+    def _done_key(self, profile_id: int) -> str:
+        return self._key(self.exercise.id, self.snapshot['version'], 'done', profile_id)
+
+    def _assessed_key(self) -> str:
+        return self._key(self.exercise.id, self.snapshot['version'], 'assessed')
+
+    def _skip_round_key(self, user_id: int) -> str:
+        return self._key(self.exercise.id, 'skipround', user_id)
+
+    def _skip_key(self, user_id: int, skip_round: int, profile_id: int) -> str:
+        return self._key(self.exercise.id, 'skip', user_id, skip_round, profile_id)
+
+    def _skip_count_key(self, user_id: int, skip_round: int) -> str:
+        return self._key(self.exercise.id, 'skipcount', user_id, skip_round)
+
+    def _skip_round(self, user_id: int) -> int:
+        return cache.get(self._skip_round_key(user_id)) or 0
+
+    def _generate(self) -> Dict[str, Any]:
+        submitters = (
+            UserProfile.objects
+            .filter(submissions__exercise=self.exercise)
+            .annotate(
+                count_assessed=Count('submissions__id', filter=Q(submissions__grader__isnull=False)),
+                earliest_submission=Min('submissions__submission_time'),
+            )
+            .order_by('earliest_submission', 'id')
+            .values_list('id', 'count_assessed')
+        )
+        pending = []
+        total = 0
+        for profile_id, count_assessed in submitters:
+            total += 1
+            if not count_assessed:
+                pending.append(profile_id)
+        submission_ids = best_submission_ids(self.exercise, pending)
+        return {
+            'version': uuid.uuid4().hex,
+            'queue': [(profile_id, submission_ids[profile_id]) for profile_id in pending],
+            'total': total,
+            'assessed': total - len(pending),
+        }
+
+    @property
+    def snapshot(self) -> Dict[str, Any]:
+        if self._snapshot is None:
+            key = self._key(self.exercise.id)
+            snapshot = cache.get(key)
+            if snapshot is None:
+                snapshot = self._generate()
+                timeout = settings.ASSESSMENT_QUEUE_TIMEOUT
+                cache.set(key, snapshot, timeout)
+                cache.set(self._key(self.exercise.id, snapshot['version'], 'assessed'), snapshot['assessed'], timeout)
+            self._snapshot = snapshot
+        return self._snapshot
+
+    def is_queued(self, profile_id: int) -> bool:
+        if not any(queued_id == profile_id for queued_id, _ in self.snapshot['queue']):
+            return False
+        return cache.get(self._done_key(profile_id)) is None
+
+    def progress(self) -> Tuple[int, int]:
+        """Returns the number of assessed submitters and the total number of submitters"""
+        assessed = cache.get(self._assessed_key())
+        if assessed is None:
+            assessed = self.snapshot['assessed']
+        return assessed, self.snapshot['total']
+
+    def mark_assessed(self, profile_ids: Iterable[int]) -> None:
+        """Removes the submitters from the queue and releases their claims"""
+        queued = {profile_id for profile_id, _ in self.snapshot['queue']}
+        timeout = settings.ASSESSMENT_QUEUE_TIMEOUT
+        for profile_id in profile_ids:
+            if profile_id not in queued:
+                continue
+            cache.delete(self._claim_key(profile_id))
+            if cache.add(self._done_key(profile_id), True, timeout):
+                try:
+                    cache.incr(self._assessed_key())
+                except ValueError:
+                    # The counter has expired from the cache, so the snapshot is stale
+                    self.invalidate(self.exercise.id)
+
+    def _claim(self, profile_id: int, user_id: int, owner: Optional[int]) -> bool:
+        key = self._claim_key(profile_id)
+        timeout = settings.ASSESSMENT_CLAIM_TIMEOUT
+        if owner == user_id:
+            cache.set(key, user_id, timeout)
+        elif owner is not None or not cache.add(key, user_id, timeout):
+            return False
+        previous = cache.get(self._assistant_key(user_id))
+        if previous is not None and previous != profile_id:
+            self.release(previous, user_id)
+        cache.set(self._assistant_key(user_id), profile_id, timeout)
+        return True
+
+    def release(self, profile_id: int, user_id: int) -> None:
+        """Releases the claim of the assistant on the submitter"""
+        key = self._claim_key(profile_id)
+        if cache.get(key) == user_id:
+            cache.delete(key)
+
+    def skip(self, profile_id: int, user_id: int) -> None:
+        """
+        Releases the claim of the assistant on the submitter and skips the
+        submitter in the next claims of the assistant until reset_skipped().
+        """
+        self.release(profile_id, user_id)
+        timeout = SKIP_TIMEOUT
+        skip_round = self._skip_round(user_id)
+        if cache.add(self._skip_key(user_id, skip_round, profile_id), True, timeout):
+            count_key = self._skip_count_key(user_id, skip_round)
+            cache.add(count_key, 0, timeout)
+            try:
+                cache.incr(count_key)
+            except ValueError:
+                # The counter expired between the calls
+                cache.add(count_key, 1, timeout)
+
+    def skipped_count(self, user_id: int) -> int:
+        """Returns the number of submitters that the assistant has skipped"""
+        return cache.get(self._skip_count_key(user_id, self._skip_round(user_id))) or 0
+
+    def reset_skipped(self, user_id: int) -> None:
+        """Starts a new round in which no submitters are skipped by the assistant"""
+        key = self._skip_round_key(user_id)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+    def _is_assessed(self, profile_id: int) -> bool:
+        # The snapshot may be older than the assessment, e.g. if it was
+        # done in another process, so the claimed submitter is checked.
+        return (
+            Submission.objects
+            .filter(exercise=self.exercise, submitters=profile_id, grader__isnull=False)
+            .exists()
+        )
+
+    def claim_next(self, user_id: int) -> Optional[QueueEntry]:
+        """
+        Claims the first submitter in the queue that has not been skipped by
+        the assistant and is not claimed by another assistant. Returns the
+        user profile id of the submitter and the id of the submission to
+        assess, or None if there are no such submitters.
+        """
+        queue = self.snapshot['queue']
+        skip_round = self._skip_round(user_id)
+        for start in range(0, len(queue), CLAIM_BATCH_SIZE):
+            batch = queue[start:start + CLAIM_BATCH_SIZE]
+            keys = []
+            for profile_id, _ in batch:
+                keys.append(self._done_key(profile_id))
+                keys.append(self._claim_key(profile_id))
+                keys.append(self._skip_key(user_id, skip_round, profile_id))
+            values = cache.get_many(keys)
+            for profile_id, submission_id in batch:
+                if values.get(self._done_key(profile_id)):
+                    continue
+                if values.get(self._skip_key(user_id, skip_round, profile_id)):
+                    continue
+                if not self._claim(profile_id, user_id, values.get(self._claim_key(profile_id))):
+                    continue
+                if self._is_assessed(profile_id):
+                    self.mark_assessed([profile_id])
+                    continue
+                return profile_id, submission_id
+        return None
+
+    def has_claims(self, user_id: int) -> bool:
+        """Returns whether other assistants have claimed some of the remaining submitters"""
+        keys = [self._claim_key(profile_id) for profile_id, _ in self.snapshot['queue']]
+        return any(owner != user_id for owner in cache.get_many(keys).values())
+
+
+def _mark_assessed(exercise_id: int, submission_id: int) -> None:
+    snapshot = cache.get(AssessmentQueue._key(exercise_id)) # pylint: disable=protected-access
+    if snapshot is None:
+        # The queue is generated from the database when it is needed, so the
+        # submitters are not queried
+        return
+    profile_ids = list(
+        Submission.submitters.through.objects
+        .filter(submission_id=submission_id)
+        .values_list('userprofile_id', flat=True)
+    )
+    queue = AssessmentQueue(BaseExercise(id=exercise_id))
+    queue._snapshot = snapshot # pylint: disable=protected-access
+    queue.mark_assessed(profile_ids)
+
+
+# pylint: disable-next=unused-argument
+def update_queue(sender, instance: Submission, created: bool, update_fields=None, **kwargs):
+    if update_fields is not None and not Submission.QUEUE_FIELDS.intersection(update_fields):
+        return
+    if instance.grader_id is not None and not created:
+        # The submitters may have been assessed. Marking them assessed again
+        # does not change the queue.
+        exercise_id, submission_id = instance.exercise_id, instance.id
+        transaction.on_commit(lambda: _mark_assessed(exercise_id, submission_id))
+        return
+    # A new or an unassessed submission may add the submitters to the queue
+    # or change the submission that is opened for them
+    AssessmentQueue.invalidate(instance.exercise_id)
+
+
+def invalidate_submission(sender, instance: Submission, **kwargs): # pylint: disable=unused-argument
+    AssessmentQueue.invalidate(instance.exercise_id)
+
+
+# pylint: disable-next=unused-argument,too-many-arguments
+def invalidate_submitters(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        AssessmentQueue.invalidate(instance.exercise_id)
+    elif action == 'pre_clear':
+        for exercise_id in set(instance.submissions.values_list('exercise_id', flat=True)):
+            AssessmentQueue.invalidate(exercise_id)
+    elif pk_set:
+        for exercise_id in set(Submission.objects.filter(id__in=pk_set).values_list('exercise_id', flat=True)):
+            AssessmentQueue.invalidate(exercise_id)
+
+
+post_save.connect(update_queue, sender=Submission)
+post_delete.connect(invalidate_submission, sender=Submission)
+m2m_changed.connect(invalidate_submitters, sender=Submission.submitters.through)
@@ -90,13 +90,13 @@ class ContentDBData(DBDataManager):
                     CourseModuleRequirement.objects
                     .select_related("threshold")
                     .prefetch_related(
-                        "passed_modules"
-                        "passed_categories",
+                        "threshold__passed_modules",
+                        "threshold__passed_categories",
                         Prefetch(
-                            "passed_exercises",
+                            "threshold__passed_exercises",
                             queryset=BaseExercise.objects.select_related("parent"),
                         ),
-                        "points",
+                        "threshold__points",
                     )
                 )
             ),
@@ -0,0 +1,201 @@
+"""
+The grades of all of the students of a course instance.
+
+The points of the students are resolved from the per-student points caches
+with one proxy manager, so that the cached points are fetched with a few
+cache calls and the missing ones share the database fetches. The thresholds
+and the diploma design of the instance are loaded once with their relations
+prefetched, so evaluating them for each student does not make queries.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import ClassVar, Dict, Iterable, Iterator, List, Optional, Union
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from course.models import CourseInstance, CourseModule, Enrollment, LearningObjectCategory
+from deviations.models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
+from diploma.grade import grade_points
+from diploma.models import CourseDiplomaDesign
+from lib.cache.cached import CacheBase, DBDataManager, Dependencies, ProxyManager
+from threshold.models import Threshold, ThresholdPoints
+from userprofile.models import UserProfile
+from .basetypes import CachedDataBase
+from .hierarchy import ContentMixin
+from .points import CachedPointsData, CategoryPoints, EitherExerciseEntry, ModulePoints, Totals, none_min
+from ..models import LearningObject, Submission
+
+
+class StudentPoints(ContentMixin[ModulePoints, EitherExerciseEntry, CategoryPoints, Totals]):
+    """
+    The points of a student from resolved points data. This is used like
+    CachedPoints to evaluate the thresholds and the diploma requirements.
+    """
+    def __init__(self, data: CachedPointsData) -> None:
+        self.data = data
+
+
+@dataclass
+class StudentGrades:
+    profile_id: int
+    user_id: int
+    points: int
+    points_by_difficulty: Dict[str, int]
+    passed_modules: List[int]
+    passed_categories: List[int]
+    # Whether the student has passed each threshold, by threshold id
+    thresholds: Dict[int, bool]
+    # None if the instance has no diploma design
+    diploma_grade: Optional[int]
+
+
+def _m2m_submission_instances(
+        obj: Union[Submission, UserProfile],
+        action: str,
+        pk_set: Optional[Iterable[int]],
+        ) -> Iterator[int]:
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(obj, Submission):
+        yield obj.exercise.course_module.course_instance_id
+        return
+    submissions = obj.submissions.all() if action == 'pre_clear' else Submission.objects.filter(id__in=pk_set or ())
+    yield from set(submissions.values_list('exercise__course_module__course_instance_id', flat=True))
+
+
+def _m2m_course_instance(
+        obj: Union[Threshold, CourseDiplomaDesign, CourseModule, LearningObjectCategory, LearningObject],
+        action: str,
+        ) -> Iterator[int]:
+    # The related objects of the thresholds and the diploma designs are in
+    # the same course instance, so either side of the relation tells it
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(obj, CourseDiplomaDesign):
+        if obj.course_id is not None:
+            yield obj.course_id
+    elif isinstance(obj, LearningObject):
+        yield obj.course_module.course_instance_id
+    else:
+        yield obj.course_instance_id
+
+
+class CourseGrades(CacheBase):
+    """
+    The total points, the passed modules and categories, the passed
+    thresholds and the diploma grades of the students of a course instance.
+
+    The points are counted like in CachedPoints with show_unrevealed, so this
+    is meant for the course staff.
+    """
+    KEY_PREFIX: ClassVar[str] = 'coursegrades'
+    NUM_PARAMS: ClassVar[int] = 1
+    # The content of the instance is a dependency. The points of the students
+    # would be too many dependencies to check, so the changes to them
+    # invalidate the grades directly.
+    INVALIDATORS = [
+        (Submission, [post_delete, post_save], (["exercise", "course_module", "course_instance_id"],)),
+        (Submission.submitters.through, [m2m_changed], (_m2m_submission_instances, ["action", "pk_set"])),
+        (DeadlineRuleDeviation, [post_delete, post_save], (["exercise", "course_module", "course_instance_id"],)),
+        (
+            MaxSubmissionsRuleDeviation,
+            [post_delete, post_save],
+            (["exercise", "course_module", "course_instance_id"],),
+        ),
+        (Enrollment, [post_delete, post_save], ("course_instance_id",)),
+        (Threshold, [post_delete, post_save], ("course_instance_id",)),
+        (ThresholdPoints, [post_delete, post_save], (["threshold", "course_instance_id"],)),
+        (Threshold.passed_modules.through, [m2m_changed], (_m2m_course_instance, ["action"])),
+        (Threshold.passed_categories.through, [m2m_changed], (_m2m_course_instance, ["action"])),
+        (Threshold.passed_exercises.through, [m2m_changed], (_m2m_course_instance, ["action"])),
+        (CourseDiplomaDesign, [post_delete, post_save], ("course_id",)),
+        (CourseDiplomaDesign.modules_to_pass.through, [m2m_changed], (_m2m_course_instance, ["action"])),
+        (CourseDiplomaDesign.exercises_to_pass.through, [m2m_changed], (_m2m_course_instance, ["action"])),
+    ]
+    # The grades of the students by user profile id
+    students: Dict[int, StudentGrades]
+    # The names of the thresholds by id
+    thresholds: Dict[int, str]
+    # The difficulties of the exercises that the students have points in
+    difficulties: List[str]
+
+    @classmethod
+    def get( # pylint: disable=arguments-differ
+            cls,
+            instance: Union[CourseInstance, int],
+            ) -> CourseGrades:
+        return super()._get(params=cls.parameter_ids(instance))
+
+    def _generate_data( # pylint: disable=too-many-locals
+            self,
+            precreated: ProxyManager,
+            prefetched_data: Optional[DBDataManager] = None,
+            ) -> Optional[Dependencies]:
+        instance_id, = self._params
+        profiles = list(
+            UserProfile.objects
+            .filter(
+                enrollment__course_instance_id=instance_id,
+                enrollment__role=Enrollment.ENROLLMENT_ROLE.STUDENT,
+                enrollment__status=Enrollment.ENROLLMENT_STATUS.ACTIVE,
+            )
+            .order_by('id')
+            .values_list('id', 'user_id')
+        )
+        thresholds = list(
+            Threshold.objects
+            .filter(course_instance_id=instance_id)
+            .prefetch_related('passed_modules', 'passed_categories', 'passed_exercises', 'points')
+            .order_by('id')
+        )
+        design = (
+            CourseDiplomaDesign.objects
+            .filter(course_id=instance_id)
+            .prefetch_related('modules_to_pass', 'exercises_to_pass')
+            .first()
+        )
+        exercise_ids = {e.id for threshold in thresholds for e in threshold.passed_exercises.all()}
+        if design is not None:
+            exercise_ids.update(e.id for e in design.exercises_to_pass.all())
+
+        datas = [
+            precreated.get_or_create_proxy(CachedPointsData, instance_id, user_id, modifiers=(True,))
+            for _, user_id in profiles
+        ]
+        precreated.resolve(datas)
+        # The module entries and the required exercise entries of all of the
+        # students are resolved together
+        precreated.resolve([
+            entry
+            for data in datas
+            for entry in (
+                *data.modules,
+                *(data.exercise_index[i] for i in exercise_ids if i in data.exercise_index),
+            )
+        ])
+
+        self.students = {}
+        difficulties = set()
+        for (profile_id, user_id), data in zip(profiles, datas):
+            points = StudentPoints(data)
+            total = data.total
+            self._expires_on = none_min(self._expires_on, data._expires_on)
+            for module in data.modules:
+                self._expires_on = none_min(self._expires_on, module._expires_on)
+            difficulties.update(d for d in total.points_by_difficulty if d)
+            self.students[profile_id] = StudentGrades(
+                profile_id=profile_id,
+                user_id=user_id,
+                points=total.points,
+                points_by_difficulty=dict(total.points_by_difficulty),
+                passed_modules=[module.id for module in data.modules if module.passed],
+                passed_categories=[category.id for category in data.categories.values() if category.passed],
+                thresholds={threshold.id: threshold.is_passed(points) for threshold in thresholds},
+                diploma_grade=grade_points(points, design) if design is not None else None,
+            )
+        self.thresholds = {threshold.id: threshold.name for threshold in thresholds}
+        self.difficulties = sorted(difficulties)
+
+        return {
+            CachedDataBase: [(instance_id,)],
+        }
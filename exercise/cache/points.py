@@ -1,4 +1,5 @@
 from __future__ import annotations
+from collections import defaultdict
 from dataclasses import dataclass, field, Field, fields, InitVar, MISSING
 import datetime
 from itertools import groupby
@@ -25,10 +26,11 @@ from django.db.models.signals import post_save, post_delete, pre_delete, m2m_cha
 from django.utils import timezone
 
 from course.models import CourseInstance, CourseModule, StudentGroup, StudentModuleGoal
-from deviations.models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
+from deviations.models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation, SubmissionRuleDeviation
 from lib.cache.cached import DBDataManager, Dependencies, ProxyManager, resolve_proxies
 from lib.helpers import format_points
 from notification.models import Notification
+from userprofile.models import UserProfile
 from .basetypes import (
     add_by_difficulty,
     CachedDataBase,
@@ -40,6 +42,7 @@ from .basetypes import (
 )
 from .hierarchy import ContentMixin
 from .invalidate_util import (
+    exercise_siblings_confirms_the_level,
     m2m_submission_userprofile,
     model_exercise_as_iterable,
     model_exercise_siblings_confirms_the_level,
@@ -156,6 +159,71 @@ def is_newer(submission: Submission, current_best_submission: Optional[Submissio
     )
 
 
+class FinalSubmissionChooser:
+    """
+    Chooses the submission that gives the points of a submitter in an
+    exercise. The submissions are given to consider() in descending order of
+    submission time.
+
+    The chosen submission is the one with forced exercise points if there is
+    one. Otherwise it is the best ready submission depending on the grading
+    mode, or, if there are no ready submissions, the best unofficial one.
+    """
+    best: Optional[Submission]
+    graded: bool
+    unofficial: bool
+    forced: bool
+
+    def __init__(self, grading_mode: int) -> None:
+        if grading_mode == BaseExercise.GRADING_MODE.LAST:
+            self.is_better_than = is_newer
+        else:
+            self.is_better_than = has_more_points
+        self.best = None
+        self.graded = False
+        self.unofficial = False
+        self.forced = False
+
+    def consider(self, submission: Submission) -> bool:
+        """Returns whether the submission became the chosen one"""
+        if submission.force_exercise_points:
+            # This submission is chosen as the final submission and no
+            # further submissions are considered.
+            self.best = submission
+            self.graded = True
+            self.unofficial = False
+            self.forced = True
+            return True
+        if self.forced:
+            return False
+        ready = submission.status == Submission.STATUS.READY
+        unofficial = submission.status == Submission.STATUS.UNOFFICIAL
+        # The submission is chosen if one of these is true:
+        # 1) it is ready (thus is not unofficial) AND
+        #    a) the current choice is unofficial OR
+        #    b) it is better depending on grading mode
+        # 2) All of:
+        #    - it is unofficial AND
+        #    - the current choice is unofficial
+        #    - it is better depending on grading mode
+        if ( # pylint: disable=too-many-boolean-expressions
+            ready and (
+                self.unofficial or
+                self.is_better_than(submission, self.best)
+            )
+        ) or (
+            unofficial and
+            not self.graded and # NOTE: == self.unofficial,
+            # but before any submissions self.unofficial is False
+            self.is_better_than(submission, self.best)
+        ):
+            self.best = submission
+            self.graded = ready # != unofficial
+            self.unofficial = unofficial
+            return True
+        return False
+
+
 class PointsDBData(DBDataManager):
     exercises: Dict[int, Set[int]]
     modules: Set[int]
@@ -199,31 +267,41 @@ class PointsDBData(DBDataManager):
         )
         self.modules.clear()
 
+        profiles = {
+            profile.user_id: profile
+            for profile in UserProfile.objects.filter(user_id__in=self.exercises.keys())
+        }
+        # The deviations of all of the users are fetched at once
+        all_exercise_ids = set().union(*self.exercises.values())
+        all_deadline_deviations = (
+            DeadlineRuleDeviation.objects
+            .get_max_deviations_many(profiles.values(), all_exercise_ids)
+        )
+        all_submission_deviations = (
+            MaxSubmissionsRuleDeviation.objects
+            .get_max_deviations_many(profiles.values(), all_exercise_ids)
+        )
+
         for user_id, exercise_ids in self.exercises.items():
             self.fetched.update((user_id, exercise_id) for exercise_id in exercise_ids)
 
-            user = User.objects.get(id=user_id)
+            profile = profiles[user_id]
             submissions = (
                 Submission.objects
-                .filter(submitters=user.userprofile, exercise_id__in=exercise_ids)
+                .filter(submitters=profile, exercise_id__in=exercise_ids)
                 .prefetch_related("exercise", "notifications", "submitters")
                 .order_by('exercise_id', '-submission_time')
             )
             for exercise_id, exercise_submissions in groupby(submissions, key=lambda s: s.exercise_id):
                 self.submissions[(user_id, exercise_id)] = list(exercise_submissions)
 
-            deadline_deviations = (
-                DeadlineRuleDeviation.objects
-                .get_max_deviations(user.userprofile, exercise_ids)
-            )
-            for exercise_id, exercise_deviations in groupby(deadline_deviations, key=lambda s: s.exercise_id):
-                self.deadline_deviations[(user_id, exercise_id)] = list(exercise_deviations)
-            submission_deviations = (
-                MaxSubmissionsRuleDeviation.objects
-                .get_max_deviations(user.userprofile, exercise_ids)
-            )
-            for exercise_id, exercise_deviations in groupby(submission_deviations, key=lambda s: s.exercise_id):
-                self.submission_deviations[(user_id, exercise_id)] = list(exercise_deviations)
+            for exercise_id in exercise_ids:
+                deadline_deviation = all_deadline_deviations.get((profile.id, exercise_id))
+                if deadline_deviation is not None:
+                    self.deadline_deviations[(user_id, exercise_id)] = [deadline_deviation]
+                submission_deviation = all_submission_deviations.get((profile.id, exercise_id))
+                if submission_deviation is not None:
+                    self.submission_deviations[(user_id, exercise_id)] = [submission_deviation]
 
             exercises = (
                 BaseExercise.bare_objects
@@ -239,7 +317,7 @@ class PointsDBData(DBDataManager):
 
             instance_ids = {e.course_module.course_instance_id for e in exercises}
             group_qs = StudentGroup.objects.filter(
-                course_instance__in=instance_ids, members=user.userprofile
+                course_instance__in=instance_ids, members=profile
             ).prefetch_related("members").order_by('course_instance_id')
             instance_groups = {
                 instance_id: list(groups)
@@ -704,16 +782,9 @@ class ExercisePoints(LearningObjectPoints):
         self.show_zero_points_immediately = False
 
         # Augment submission data.
-        final_submission = None
+        chooser = FinalSubmissionChooser(self.grading_mode)
         last_submission = None
 
-        if self.grading_mode == BaseExercise.GRADING_MODE.BEST:
-            is_better_than = has_more_points
-        elif self.grading_mode == BaseExercise.GRADING_MODE.LAST:
-            is_better_than = is_newer
-        else:
-            is_better_than = has_more_points
-
         for submission in submissions:
             ready = submission.status == Submission.STATUS.READY
             unofficial = submission.status == Submission.STATUS.UNOFFICIAL
@@ -760,45 +831,13 @@ class ExercisePoints(LearningObjectPoints):
                 group_id = group_id,
             )
             self.submissions.append(submission_entry)
-            # Update best submission if exercise points are not forced, and
-            # one of these is true:
-            # 1) current submission in ready (thus is not unofficial) AND
-            #    a) current best is an unofficial OR
-            #    b) current submission is better depending on grading mode
-            # 2) All of:
-            #    - current submission is unofficial AND
-            #    - current best is unofficial
-            #    - current submission is better depending on grading mode
-            if submission.force_exercise_points:
-                # This submission is chosen as the final submission and no
-                # further submissions are considered.
+            if chooser.consider(submission):
                 self._true_best_submission = submission_entry
                 self._true_passed = ready and submission.grade >= self.points_to_pass
                 self._true_points = submission.grade
-                self.graded = True
-                self.unofficial = False
-                self.forced_points = True
-
-                final_submission = submission
-            if not self.forced_points:
-                if ( # pylint: disable=too-many-boolean-expressions
-                    ready and (
-                        self.unofficial or
-                        is_better_than(submission, final_submission)
-                    )
-                ) or (
-                    unofficial and
-                    not self.graded and # NOTE: == entry.unofficial,
-                    # but before any submissions entry.unofficial is False
-                    is_better_than(submission, final_submission)
-                ):
-                    self._true_best_submission = submission_entry
-                    self._true_passed = ready and submission.grade >= self.points_to_pass
-                    self._true_points = submission.grade
-                    self.graded = ready # != unofficial
-                    self.unofficial = unofficial
-
-                    final_submission = submission
+                self.graded = chooser.graded
+                self.unofficial = chooser.unofficial
+                self.forced_points = chooser.forced
             # Update last_submission to be the last submission, or the last
             # official submission if there are any official submissions.
             # Note that the submissions are ordered by descendng time.
@@ -1164,6 +1203,115 @@ class CachedPoints(ContentMixin[ModulePoints, EitherExerciseEntry, CategoryPoint
                 LearningObjectEntryBase.invalidate(exercise, user)
 
 
+def invalidate_deviations(deviations: Iterable[SubmissionRuleDeviation]) -> None:
+    """
+    Invalidates the points that the deviations affect, like the post_save and
+    post_delete invalidators of the deviation models do for one deviation.
+
+    This is used when deviations are created or updated in bulk, which does
+    not send the signals. The affected users and the sibling exercises are
+    resolved with a few queries for all of the deviations, and each cache key
+    is invalidated once.
+    """
+    pairs = {(deviation.exercise_id, deviation.submitter_id) for deviation in deviations}
+    if not pairs:
+        return
+    exercise_ids = {exercise_id for exercise_id, _ in pairs}
+    profile_ids = {profile_id for _, profile_id in pairs}
+
+    # The submitter and the users who have submitted the exercise with them,
+    # as in model_user_ids()
+    user_ids: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+    profile_user_ids = dict(UserProfile.objects.filter(id__in=profile_ids).values_list('id', 'user_id'))
+    for exercise_id, profile_id in pairs:
+        user_ids[(exercise_id, profile_id)].add(profile_user_ids[profile_id])
+    rows = (
+        Submission.submitters.through.objects
+        .filter(submission__in=Submission.objects.filter(
+            exercise_id__in=exercise_ids,
+            submitters__in=profile_ids,
+        ).values('id'))
+        .values_list('submission_id', 'submission__exercise_id', 'userprofile_id', 'userprofile__user_id')
+    )
+    submission_members: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+    for submission_id, exercise_id, profile_id, user_id in rows:
+        submission_members[submission_id].append((exercise_id, profile_id, user_id))
+    for members in submission_members.values():
+        member_user_ids = {user_id for _, _, user_id in members}
+        for exercise_id, profile_id, _ in members:
+            if (exercise_id, profile_id) in pairs:
+                user_ids[(exercise_id, profile_id)].update(member_user_ids)
+
+    exercise_user_ids: Dict[int, Set[int]] = defaultdict(set)
+    for (exercise_id, _), users in user_ids.items():
+        exercise_user_ids[exercise_id].update(users)
+    _invalidate_exercise_points(exercise_user_ids)
+
+
+def invalidate_notifications_sent(notifications: Iterable[Notification]) -> None:
+    """
+    Invalidates the points of the recipients of the notifications in the
+    exercises of the notified submissions, like the post_save invalidators of
+    Notification do for one notification.
+
+    This is used when notifications are created in bulk, which does not send
+    the signals.
+    """
+    exercise_user_ids: Dict[int, Set[int]] = defaultdict(set)
+    for notification in notifications:
+        if notification.submission is not None:
+            exercise_user_ids[notification.submission.exercise_id].add(notification.recipient.user_id)
+    if exercise_user_ids:
+        _invalidate_exercise_points(exercise_user_ids)
+
+
+def invalidate_submitters_changed(submission_ids: Iterable[int], user_ids: Iterable[int] = ()) -> None:
+    """
+    Invalidates the points of the submitters of the submissions in the
+    exercises of the submissions, like the m2m_changed invalidators of
+    Submission.submitters do for one submission. `user_ids` are the users
+    that were removed from the submitters.
+
+    This is used when the submitters are changed in bulk, which does not send
+    the signals.
+    """
+    removed_user_ids = set(user_ids)
+    exercise_user_ids: Dict[int, Set[int]] = defaultdict(set)
+    exercise_ids = set()
+    rows = (
+        Submission.objects
+        .filter(id__in=submission_ids)
+        .values_list('exercise_id', 'submitters__user_id')
+    )
+    for exercise_id, user_id in rows:
+        exercise_ids.add(exercise_id)
+        if user_id is not None:
+            exercise_user_ids[exercise_id].add(user_id)
+    for exercise_id in exercise_ids:
+        exercise_user_ids[exercise_id].update(removed_user_ids)
+    _invalidate_exercise_points(exercise_user_ids)
+
+
+def _invalidate_exercise_points(user_ids: Dict[int, Set[int]]) -> None:
+    """Invalidates the points of the users in the exercises, and in the
+    sibling exercises that have confirm_the_level, by exercise id"""
+    # The exercises with confirm_the_level among the siblings of each
+    # exercise, as in model_exercise_siblings_confirms_the_level()
+    siblings: Dict[Tuple[Optional[int], int], List[int]] = {}
+    affected_ids: Dict[int, Set[int]] = {}
+    for lobj in LearningObject.bare_objects.filter(id__in=user_ids).only('id', 'parent', 'course_module'):
+        group = (lobj.parent_id, lobj.course_module_id)
+        if group not in siblings:
+            siblings[group] = list(exercise_siblings_confirms_the_level(lobj))
+        affected_ids[lobj.id] = {lobj.id, *siblings[group]}
+
+    params = set()
+    for exercise_id, users in user_ids.items():
+        for lobj_id in affected_ids.get(exercise_id, (exercise_id,)):
+            params.update((lobj_id, user_id) for user_id in users)
+    LearningObjectPoints.invalidate_many(list(params))
+
+
 # Required so that Submission post_delete receivers can access submitters
 # pylint: disable-next=unused-argument
 def prefetch_submitters(sender: Type[Submission], instance: Submission, **kwargs: Any) -> None:
@@ -0,0 +1,168 @@
+from __future__ import annotations
+from typing import Any, ClassVar, Dict, Iterable, Iterator, Optional, Union
+
+from django.db.models import Count, Max, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from course.models import CourseInstance, Enrollment
+from lib.cache import CachedAbstract
+from lib.cache.cached import CacheBase, DBDataManager, Dependencies, ProxyManager
+from userprofile.models import UserProfile
+from ..models import BaseExercise, LearningObject, Submission, SubmittedFile
+
+
+class CachedSubmitterCounts(CachedAbstract[Dict[str, Any]]):
+    """
+    The number of active students in a course instance and the number of
+    students who have submitted to each exercise in it.
+    """
+    KEY_PREFIX = "submittercounts"
+
+    def __init__(self, course_instance: CourseInstance) -> None:
+        super().__init__(course_instance)
+
+    # pylint: disable-next=arguments-differ
+    def _generate_data(self, course_instance: CourseInstance, *, data=None) -> Dict[str, Any]:
+        if isinstance(course_instance, int):
+            course_instance = CourseInstance.objects.get(id=course_instance)
+        students = course_instance.students
+        counts = (students
+            .filter(submissions__exercise__course_module__course_instance=course_instance)
+            .values('submissions__exercise_id')
+            .annotate(count=Count('id', distinct=True))
+            .order_by()
+        )
+        return {
+            'student_count': students.count(),
+            'exercise_submitter_counts': {
+                row['submissions__exercise_id']: row['count']
+                for row in counts
+            },
+        }
+
+    @property
+    def student_count(self) -> int:
+        return self.data['student_count']
+
+    @property
+    def exercise_submitter_counts(self) -> Dict[int, int]:
+        return self.data['exercise_submitter_counts']
+
+
+def _m2m_submission_exercises(
+        obj: Union[Submission, UserProfile],
+        action: str,
+        pk_set: Optional[Iterable[int]],
+        ) -> Iterator[int]:
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(obj, Submission):
+        yield obj.exercise_id
+        return
+    submissions = obj.submissions.all() if action == 'pre_clear' else Submission.objects.filter(id__in=pk_set or ())
+    yield from set(submissions.values_list('exercise_id', flat=True))
+
+
+class ExerciseSubmitterStats(CacheBase):
+    """
+    The number of submissions in an exercise, whether any of them have files,
+    and the submission counts and points of each submitter, for the staff
+    lists of submissions and submitters.
+    """
+    KEY_PREFIX: ClassVar[str] = 'exercisesubmitterstats'
+    NUM_PARAMS: ClassVar[int] = 1
+    INVALIDATORS = [
+        (Submission, [post_delete, post_save], ("exercise_id",)),
+        (SubmittedFile, [post_delete, post_save], (["submission", "exercise_id"],)),
+        (Submission.submitters.through, [m2m_changed], (_m2m_submission_exercises, ["action", "pk_set"])),
+        # The points depend on the grading mode of the exercise
+        (LearningObject, [post_save], ("id",)),
+    ]
+    submission_count: int
+    has_files: bool
+    # Submitter summaries by user profile id: count_submissions, count_assessed,
+    # last_submission_time and final_points
+    submitters: Dict[int, Dict[str, Any]]
+
+    @classmethod
+    def get( # pylint: disable=arguments-differ
+            cls,
+            exercise: Union[BaseExercise, int],
+            ) -> ExerciseSubmitterStats:
+        return super()._get(params=cls.parameter_ids(exercise))
+
+    def _generate_data(
+            self,
+            precreated: ProxyManager,
+            prefetched_data: Optional[DBDataManager] = None,
+            ) -> Optional[Dependencies]:
+        exercise_id, = self._params
+        submissions = Submission.objects.filter(exercise_id=exercise_id)
+        summaries = (
+            submissions
+            .values('submitters__id')
+            .annotate(
+                count_submissions=Count('id'),
+                count_assessed=Count('id', filter=Q(grader__isnull=False)),
+                last_submission_time=Max('submission_time'),
+            )
+            .annotate_submitter_points('final_points')
+            .order_by()
+        )
+        self.submitters = {}
+        for summary in summaries:
+            submitter_id = summary.pop('submitters__id')
+            # Skip the submissions that have no submitters
+            if submitter_id is not None:
+                self.submitters[submitter_id] = summary
+        totals = submissions.aggregate(
+            submission_count=Count('id', distinct=True),
+            file_count=Count('files'),
+        )
+        self.submission_count = totals['submission_count']
+        self.has_files = totals['file_count'] > 0
+        return None
+
+    @property
+    def submitter_count(self) -> int:
+        return len(self.submitters)
+
+    @property
+    def assessed_submitter_count(self) -> int:
+        return sum(1 for summary in self.submitters.values() if summary['count_assessed'] > 0)
+
+
+def _invalidate_for_submissions(submissions: Iterable[Submission]) -> None:
+    instance_ids = set(
+        Submission.objects
+        .filter(id__in=[s.id for s in submissions])
+        .values_list('exercise__course_module__course_instance_id', flat=True)
+    )
+    for instance_id in instance_ids:
+        CachedSubmitterCounts.invalidate(instance_id)
+
+
+def invalidate_submission(sender, instance: Submission, **kwargs): # pylint: disable=unused-argument
+    CachedSubmitterCounts.invalidate(instance.exercise.course_module.course_instance_id)
+
+
+# pylint: disable-next=unused-argument,too-many-arguments
+def invalidate_submitters(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_submission(sender, instance)
+    elif action == 'pre_clear':
+        _invalidate_for_submissions(instance.submissions.all())
+    elif pk_set:
+        _invalidate_for_submissions(Submission(id=pk) for pk in pk_set)
+
+
+def invalidate_enrollment(sender, instance: Enrollment, **kwargs): # pylint: disable=unused-argument
+    CachedSubmitterCounts.invalidate(instance.course_instance_id)
+
+
+post_delete.connect(invalidate_submission, sender=Submission)
+m2m_changed.connect(invalidate_submitters, sender=Submission.submitters.through)
+post_save.connect(invalidate_enrollment, sender=Enrollment)
+post_delete.connect(invalidate_enrollment, sender=Enrollment)
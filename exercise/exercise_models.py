@@ -847,7 +847,7 @@ class BaseExercise(LearningObject):
         }
 
         if len(students) == 1 and self.status in (self.STATUS.ENROLLMENT, self.STATUS.ENROLLMENT_EXTERNAL):
-            enrollment = self.course_instance.get_enrollment_for(students[0].user)
+            enrollment = self.course_instance.get_cached_enrollment_for(students[0].user)
             if not enrollment or enrollment.status != Enrollment.ENROLLMENT_STATUS.ACTIVE:
                 return True, alerts
         submission_count = 0
@@ -876,7 +876,7 @@ class BaseExercise(LearningObject):
 
     def no_submissions_left(self, students):
         if len(students) == 1 and self.status in (self.STATUS.ENROLLMENT, self.STATUS.ENROLLMENT_EXTERNAL):
-            enrollment = self.course_instance.get_enrollment_for(students[0].user)
+            enrollment = self.course_instance.get_cached_enrollment_for(students[0].user)
             if not enrollment or enrollment.status != Enrollment.ENROLLMENT_STATUS.ACTIVE:
                 return False
         if self.max_submissions == 0:
@@ -924,7 +924,7 @@ class BaseExercise(LearningObject):
         #    return False, alerts, students
 
         # Check enrollment requirements.
-        enrollment = self.course_instance.get_enrollment_for(profile.user)
+        enrollment = self.course_instance.get_cached_enrollment_for(profile.user)
         if self.status in (
             LearningObject.STATUS.ENROLLMENT,
             LearningObject.STATUS.ENROLLMENT_EXTERNAL,
@@ -0,0 +1,103 @@
+import time
+from typing import Any, Callable, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from course.models import CourseInstance
+from exercise.models import BaseExercise, Submission
+from lib.querystats import RequestStats, record_stats
+
+
+def measure(func: Callable[[], Any]) -> Tuple[Any, float, RequestStats]:
+    """Runs the function once and returns the result, the time in milliseconds
+    and the queries and the cache calls of the run."""
+    with record_stats() as stats:
+        start = time.perf_counter()
+        result = func()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    return result, elapsed_ms, stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare reassigning the submitter of many submissions one submission '
+        'at a time (submitters.remove and submitters.add) and all at once '
+        '(Submission.objects.reassign_submitters). The submissions are created '
+        'for the benchmark and all changes are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'course_instance_id',
+            help='ID of the CourseInstance whose first two students and first exercise are used',
+        )
+        parser.add_argument(
+            '-n', '--submissions', type=int, default=10000,
+            help='Number of submissions. Default: 10000',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            instance = CourseInstance.objects.get(id=options['course_instance_id'])
+        except CourseInstance.DoesNotExist as exc:
+            raise CommandError(f"CourseInstance id={options['course_instance_id']} does not exist!") from exc
+
+        students = list(instance.get_student_profiles()[:2])
+        if len(students) < 2:
+            raise CommandError("The course instance must have at least two students.")
+        exercise = (
+            BaseExercise.objects
+            .filter(course_module__course_instance=instance)
+            .order_by('id')
+            .first()
+        )
+        if exercise is None:
+            raise CommandError("The course instance has no exercises.")
+        old_submitter, new_submitter = students
+        count = max(1, options['submissions'])
+
+        with transaction.atomic():
+            submissions = Submission.objects.bulk_create(
+                [
+                    Submission(exercise=exercise, status=Submission.STATUS.READY)
+                    for _ in range(count)
+                ],
+                batch_size=1000,
+            )
+            Submission.submitters.through.objects.bulk_create(
+                [
+                    Submission.submitters.through(submission_id=s.id, userprofile_id=old_submitter.id)
+                    for s in submissions
+                ],
+                batch_size=1000,
+            )
+            self.stdout.write(
+                f"{len(submissions)} submissions of {exercise} in {instance}"
+            )
+
+            def per_submission():
+                for submission in submissions:
+                    submission.submitters.remove(old_submitter)
+                    submission.submitters.add(new_submitter)
+                return len(submissions)
+
+            def many():
+                # Back to the old submitter, so that both runs move every submission
+                return len(Submission.objects.reassign_submitters(submissions, new_submitter, old_submitter))
+
+            per_submission_count, per_submission_ms, per_submission_stats = measure(per_submission)
+            many_count, many_ms, many_stats = measure(many)
+
+            self.stdout.write(
+                f"  per submission:      {per_submission_ms:>10.1f} ms "
+                f"{per_submission_stats.queries:>8} queries {per_submission_stats.cache_calls:>8} cache calls"
+            )
+            self.stdout.write(
+                f"  reassign_submitters: {many_ms:>10.1f} ms "
+                f"{many_stats.queries:>8} queries {many_stats.cache_calls:>8} cache calls"
+            )
+            if per_submission_count != many_count:
+                raise CommandError("The two methods changed a different number of submissions")
+
+            transaction.set_rollback(True)
@@ -1,7 +1,15 @@
 import csv
+import gzip
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
 import sys
+import time
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.db.models import Count, Max, Min, Prefetch, Q
 
 from course.models import CourseModule
@@ -9,6 +17,100 @@ from deviations.models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
 from ...models import BaseExercise, Submission
 from userprofile.models import UserProfile
 
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+COMPRESSIONS = ('none', 'gzip', 'lz4')
+PARTITION_KINDS = ('exercise', 'instance')
+
+# Shared state for the worker processes. The workers are forked from the main
+# process after this has been filled, so the (possibly large) deviation maps
+# are not pickled for every task.
+_partition_context = {}
+
+
+def guess_compression(path):
+    if path.endswith('.gz'):
+        return 'gzip'
+    if path.endswith('.lz4'):
+        return 'lz4'
+    return 'none'
+
+
+def open_output(path, compression):
+    """Opens a text file for writing CSV rows, compressed if requested.
+
+    Both gzip members and lz4 frames can be concatenated byte-wise into
+    a valid stream, which is how the part files are merged in the end.
+    """
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    if compression == 'lz4':
+        return lz4.frame.open(path, 'wt', newline='', encoding='utf-8')
+    return open(path, 'w', newline='', encoding='utf-8') # pylint: disable=consider-using-with
+
+
+def iterate_keyset(queryset, chunk_size):
+    """Iterates a queryset in primary key order, one chunk per query.
+
+    Each chunk continues from the last seen primary key instead of using
+    an OFFSET, so the cost of a query does not grow towards the end of
+    the table. Prefetches are applied per chunk.
+    """
+    last_pk = None
+    queryset = queryset.order_by('pk')
+    while True:
+        chunk_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1].pk
+        if len(chunk) < chunk_size:
+            return
+
+
+def _export_partition(task):
+    """Writes the submissions of one partition into its part file.
+
+    Runs either in the main process or in a worker process. Returns the
+    partition index and the number of written rows.
+    """
+    index, exercise_ids, part_path = task
+    context = _partition_context
+    tmp_path = part_path + '.tmp'
+    submissions = context['command'].build_submission_queryset(
+        exercise_ids,
+        context['options'],
+        context['include_user_ids'],
+    )
+    with open_output(tmp_path, context['compression']) as f:
+        if context['options']['submission_results_format']:
+            rows = context['command'].write_results_rows(
+                f,
+                submissions.iterator(chunk_size=context['chunk_size']),
+                context['options']['include_student_ids'],
+                not context['options']['exclude_user_ids'],
+                write_header=False,
+            )
+        else:
+            rows = context['command'].write_submission_rows(
+                f,
+                iterate_keyset(submissions, context['chunk_size']),
+                context['all_deadline_deviations'],
+                context['all_max_submissions_deviations'],
+                context['options']['include_deadline_deviations'],
+                context['options']['include_max_submission_deviations'],
+                context['options']['include_student_ids'],
+                not context['options']['exclude_user_ids'],
+                write_header=False,
+            )
+    os.replace(tmp_path, part_path)
+    return index, rows
+
 
 class Command(BaseCommand):
     help = 'Exports submission and exercise data from given course instances into CSV files'
@@ -53,7 +155,8 @@ class Command(BaseCommand):
             type=int,
             help='Limit the number of submissions that are written to the CSV file. '
                  'This is the start index of the submissions. '
-                 'By default, all submissions starting from index zero are included.',
+                 'By default, all submissions starting from index zero are included. '
+                 'May not be used with "--workers" or "--resume".',
         )
         parser.add_argument(
             '-l',
@@ -61,7 +164,8 @@ class Command(BaseCommand):
             type=int,
             help='Limit the number of submissions that are written to the CSV file. '
                  'This is the end index of the submissions. '
-                 'By default, all submissions up to the last index are included.',
+                 'By default, all submissions up to the last index are included. '
+                 'May not be used with "--workers" or "--resume".',
         )
         parser.add_argument(
             '-d',
@@ -102,6 +206,43 @@ class Command(BaseCommand):
             help="Include submissions only from these users whose User ids "
                  "are listed in the given file (comma separated).",
         )
+        parser.add_argument(
+            '-w',
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes that export the submissions in parallel. '
+                 'The work is partitioned according to "--partition-by". Default: 1.',
+        )
+        parser.add_argument(
+            '-p',
+            '--partition-by',
+            choices=PARTITION_KINDS,
+            default='exercise',
+            help='Unit of work for the submission export: one exercise or one course instance. '
+                 'Each finished partition is recorded in the checkpoint file. Default: exercise.',
+        )
+        parser.add_argument(
+            '-c',
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of submissions fetched from the database per query. Default: 2000.',
+        )
+        parser.add_argument(
+            '-z',
+            '--compression',
+            choices=COMPRESSIONS,
+            help='Compression of the output files. By default, it is deduced from the file name '
+                 'extension: ".gz" for gzip, ".lz4" for lz4 and no compression otherwise.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted submission export. The partitions that were finished '
+                 'according to the checkpoint file are not exported again. '
+                 'The other options must be the same as in the interrupted run.',
+        )
 
     def parse_comma_list_file(self, file_path):
         try:
@@ -110,6 +251,10 @@ class Command(BaseCommand):
         except OSError as e:
             raise CommandError(f'Error in reading the file "{file_path}".') from e
 
+    def log_progress(self, message):
+        self.stderr.write(message)
+        self.stderr.flush()
+
     # pylint: disable-next=too-many-locals too-many-branches too-many-statements
     def handle(self, *args, **options): # noqa: MC0001
         course_instance_ids = options['course_instance_id']
@@ -132,7 +277,20 @@ class Command(BaseCommand):
         if limit_submissions_end is not None and limit_submissions_end < 0:
             self.stderr.write("--limit-submissions-end must be a non-negative integer.")
             sys.exit(2)
-        submissions_slice = slice(limit_submissions_start, limit_submissions_end)
+        use_slice = limit_submissions_start is not None or limit_submissions_end is not None
+        if options['workers'] < 1:
+            raise CommandError('"--workers" must be a positive integer.')
+        if options['chunk_size'] < 1:
+            raise CommandError('"--chunk-size" must be a positive integer.')
+        if use_slice and (options['workers'] > 1 or options['resume']):
+            raise CommandError(
+                'The options "--limit-submissions-start" and "--limit-submissions-end" '
+                'may not be used with "--workers" or "--resume".'
+            )
+        if options['resume'] and not submission_file_path:
+            raise CommandError('"--resume" requires the option "--submission-output-file".')
+        if options['compression'] == 'lz4' and lz4 is None:
+            raise CommandError('The lz4 compression requires the Python package "lz4".')
 
         exercise_filters = {}
         if course_instance_ids:
@@ -189,219 +347,405 @@ class Command(BaseCommand):
             'id',
         )
 
-        # Fetch all submissions for the exercises.
+        # Create the CSV output files.
+        # One CSV file for all exercises.
+        if exercise_file_path:
+            compression = options['compression'] or guess_compression(exercise_file_path)
+            if compression == 'lz4' and lz4 is None:
+                raise CommandError('The lz4 compression requires the Python package "lz4".')
+            with open_output(exercise_file_path, compression) as f:
+                self.write_exercise_csv(f, exercises)
+            self.stdout.write("Created the exercise file: " + exercise_file_path)
+
+        # One CSV file for all submissions.
         if submission_file_path:
-            include_user_ids = None
-            if options['include_users_file']:
-                include_user_ids = self.parse_comma_list_file(options['include_users_file'])
+            self.export_submissions(submission_file_path, exercises, options, use_slice)
+            self.stdout.write("Created the submission file: " + submission_file_path)
 
-            submission_filters = {
-                'exercise__in': exercises,
-            }
-            if include_user_ids:
-                submission_filters['submitters__user_id__in'] = include_user_ids
+    def build_submission_queryset(self, exercise_ids, options, include_user_ids):
+        """Returns the submissions of the given exercises for the export."""
+        submissions = Submission.objects.filter(exercise_id__in=exercise_ids)
+        if include_user_ids:
+            submissions = submissions.filter(submitters__user_id__in=include_user_ids)
+
+        user_fields = ['user__id']
+        if options['include_student_ids'] or options['submission_results_format']:
+            user_fields.append('student_id')
+
+        if not options['exclude_user_ids'] or options['include_student_ids'] or include_user_ids:
+            submissions = submissions.prefetch_related(
+                Prefetch(
+                    'submitters',
+                    queryset=UserProfile.objects.select_related('user').only(*user_fields),
+                    to_attr='submitter_userprofiles',
+                ),
+            )
+        if options['submission_results_format']:
+            # Aggregate exercise results.
+            return submissions.exclude(status__in=(
+                Submission.STATUS.UNOFFICIAL,
+                Submission.STATUS.ERROR,
+                Submission.STATUS.REJECTED,
+            )).values(
+                'submitters__user_id',
+                'exercise_id',
+                'submitters__student_id',
+            ).annotate(
+                count=Count('id'),
+                first_timestamp=Min('submission_time'),
+                last_timestamp=Max('submission_time'),
+            ).annotate_submitter_points(
+                'total',
+            ).order_by(
+                'exercise_id',
+                'submitters__user_id',
+            )
+        return submissions.defer(
+            'hash',
+            'grader',
+            'feedback',
+            'assistant_feedback',
+            'submission_data',
+            'grading_data',
+            'meta_data',
+        )
+
+    def get_partitions(self, exercises, partition_by):
+        """Splits the exported exercises into lists of exercise ids."""
+        rows = exercises.order_by().values_list('id', 'course_module__course_instance_id').order_by('id')
+        if partition_by == 'exercise':
+            return [[exercise_id] for exercise_id, _instance_id in rows]
+        partitions = {}
+        for exercise_id, instance_id in rows:
+            partitions.setdefault(instance_id, []).append(exercise_id)
+        return [partitions[instance_id] for instance_id in sorted(partitions)]
+
+    def read_checkpoint(self, checkpoint_path, signature):
+        try:
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except OSError as e:
+            raise CommandError(f'Unable to read the checkpoint file "{checkpoint_path}".') from e
+        except ValueError as e:
+            raise CommandError(f'The checkpoint file "{checkpoint_path}" is corrupted.') from e
+        if checkpoint.get('signature') != signature:
+            raise CommandError(
+                'The options differ from the interrupted run that wrote '
+                f'the checkpoint file "{checkpoint_path}".'
+            )
+        return checkpoint
 
-            user_fields = ['user__id']
-            if options['include_student_ids'] or options['submission_results_format']:
-                user_fields.append('student_id')
+    def write_checkpoint(self, checkpoint_path, checkpoint):
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, checkpoint_path)
 
-            submissions = Submission.objects.filter(
-                **submission_filters,
+    # pylint: disable-next=too-many-locals too-many-branches too-many-statements
+    def export_submissions(self, submission_file_path, exercises, options, use_slice): # noqa: MC0001
+        compression = options['compression'] or guess_compression(submission_file_path)
+        if compression == 'lz4' and lz4 is None:
+            raise CommandError('The lz4 compression requires the Python package "lz4".')
+
+        include_user_ids = None
+        if options['include_users_file']:
+            include_user_ids = self.parse_comma_list_file(options['include_users_file'])
+
+        if use_slice:
+            # The index range is defined over all submissions, so they are
+            # exported in one pass in the main process.
+            submissions = self.build_submission_queryset(
+                exercises.values('id'),
+                options,
+                include_user_ids,
             )
-            if not options['exclude_user_ids'] or options['include_student_ids'] or include_user_ids:
-                submissions = submissions.prefetch_related(
-                    Prefetch(
-                        'submitters',
-                        queryset=UserProfile.objects.select_related('user').only(*user_fields),
-                        to_attr='submitter_userprofiles',
-                    ),
-                )
             if options['submission_results_format']:
-                # Aggregate exercise results.
-                submissions = submissions.exclude(status__in=(
-                    Submission.STATUS.UNOFFICIAL,
-                    Submission.STATUS.ERROR,
-                    Submission.STATUS.REJECTED,
-                )).values(
-                    'submitters__user_id',
-                    'exercise_id',
-                    'submitters__student_id',
-                ).annotate(
-                    count=Count('id'),
-                    first_timestamp=Min('submission_time'),
-                    last_timestamp=Max('submission_time'),
-                ).annotate_submitter_points('total')
+                rows = submissions.iterator(chunk_size=options['chunk_size'])
             else:
-                submissions = submissions.defer(
-                    'hash',
-                    'grader',
-                    'feedback',
-                    'assistant_feedback',
-                    'submission_data',
-                    'grading_data',
-                    'meta_data',
-                )
-            submissions = submissions.order_by()[submissions_slice]
-
-            all_deadline_deviations = {}
-            if options['include_deadline_deviations']:
-                # Fetch all deadline deviations in the course instances.
-                # TODO: this does not use the "include_exercises_file" or "exclude_exercises_file" options at all.
-                all_deadline_deviations_queryset = DeadlineRuleDeviation.objects.filter(
-                    exercise__course_module__course_instance__id__in=course_instance_ids,
-                ).prefetch_related(
-                    Prefetch(
-                        'exercise',
-                        queryset=BaseExercise.objects.select_related(
-                            'course_module',
-                        ).only(
-                            'id',
-                            'course_module__id',
-                            'course_module__closing_time',
-                            'course_module__course_instance__id',
-                            'course_module__course_instance__course__id',
-                        ),
-                    ),
-                    Prefetch(
-                        'submitter',
-                        queryset=UserProfile.objects.select_related('user').only('user__id'),
-                    ),
-                ).only(
-                    'exercise__id',
-                    'exercise__course_module__closing_time',
-                    'exercise__course_module__course_instance__id',
-                    'submitter__user__id',
-                    'extra_seconds',
-                )
-
-                for dl_dev in all_deadline_deviations_queryset:
-                    all_deadline_deviations.setdefault(
-                        dl_dev.exercise.id,
-                        {}
-                    )[dl_dev.submitter.user.id] = dl_dev.get_new_deadline()
-
-            all_max_submissions_deviations = {}
-            if options['include_max_submission_deviations']:
-                # Fetch all max submissions deviations in the course instances.
-                # TODO: this does not use the "include_exercises_file" or "exclude_exercises_file" options at all.
-                all_max_submissions_deviations_queryset = MaxSubmissionsRuleDeviation.objects.filter(
-                    exercise__course_module__course_instance__id__in=course_instance_ids,
-                ).select_related(
-                    'exercise',
-                ).prefetch_related(
-                    Prefetch(
-                        'submitter',
-                        queryset=UserProfile.objects.select_related('user').only('user__id'),
-                    ),
-                ).only(
-                    'exercise__id',
-                    'exercise__max_submissions',
-                    'submitter__user__id',
-                    'extra_submissions',
-                )
-
-                for sbms_dev in all_max_submissions_deviations_queryset:
-                    all_max_submissions_deviations.setdefault(
-                        sbms_dev.exercise.id,
-                        {},
-                    )[sbms_dev.submitter.user.id] = sbms_dev.exercise.max_submissions + sbms_dev.extra_submissions
+                rows = iterate_keyset(submissions, options['chunk_size'])
+            rows = itertools.islice(rows, options['limit_submissions_start'], options['limit_submissions_end'])
+            deviations = self.get_deviations(options)
+            with open_output(submission_file_path, compression) as f:
+                if options['submission_results_format']:
+                    self.write_results_rows(
+                        f,
+                        rows,
+                        options['include_student_ids'],
+                        not options['exclude_user_ids'],
+                    )
+                else:
+                    self.write_submission_rows(
+                        f,
+                        rows,
+                        *deviations,
+                        options['include_deadline_deviations'],
+                        options['include_max_submission_deviations'],
+                        options['include_student_ids'],
+                        not options['exclude_user_ids'],
+                    )
+            return
+
+        checkpoint_path = submission_file_path + '.checkpoint'
+        part_path_format = submission_file_path + '.part-{:06d}'
+        signature = {
+            key: options[key] for key in (
+                'course_instance_id',
+                'include_exercises_file',
+                'exclude_exercises_file',
+                'include_users_file',
+                'submission_results_format',
+                'include_deadline_deviations',
+                'include_max_submission_deviations',
+                'include_student_ids',
+                'exclude_user_ids',
+                'partition_by',
+            )
+        }
+        signature['compression'] = compression
+        if options['resume'] and os.path.exists(checkpoint_path):
+            checkpoint = self.read_checkpoint(checkpoint_path, signature)
+            done = set(checkpoint['done'])
+            for index in done:
+                if not os.path.exists(part_path_format.format(index)):
+                    raise CommandError(
+                        f'The part file "{part_path_format.format(index)}" listed in the checkpoint is missing.'
+                    )
+            self.log_progress(
+                f'Resuming the export: {len(done)}/{len(checkpoint["partitions"])} partitions already done.'
+            )
+        else:
+            checkpoint = {
+                'signature': signature,
+                'partitions': self.get_partitions(exercises, options['partition_by']),
+                'done': [],
+            }
+            done = set()
+            self.write_checkpoint(checkpoint_path, checkpoint)
+
+        partitions = checkpoint['partitions']
+        tasks = [
+            (index, exercise_ids, part_path_format.format(index))
+            for index, exercise_ids in enumerate(partitions)
+            if index not in done
+        ]
 
-        # Create the CSV output files.
-        # One CSV file for all exercises.
-        if exercise_file_path:
-            self.write_exercise_csv(exercise_file_path, exercises)
-            self.stdout.write("Created the exercise file: " + exercise_file_path)
+        all_deadline_deviations, all_max_submissions_deviations = self.get_deviations(options)
+        _partition_context.update({
+            'command': self,
+            'options': options,
+            'compression': compression,
+            'chunk_size': options['chunk_size'],
+            'include_user_ids': include_user_ids,
+            'all_deadline_deviations': all_deadline_deviations,
+            'all_max_submissions_deviations': all_max_submissions_deviations,
+        })
+
+        total_rows = 0
+        start_time = time.monotonic()
+
+        def partition_done(index, rows):
+            nonlocal total_rows
+            done.add(index)
+            checkpoint['done'] = sorted(done)
+            self.write_checkpoint(checkpoint_path, checkpoint)
+            total_rows += rows
+            elapsed = time.monotonic() - start_time
+            self.log_progress(
+                f'[{len(done)}/{len(partitions)} partitions] '
+                f'{total_rows} rows written, {total_rows / elapsed if elapsed else 0:.0f} rows/s'
+            )
 
-        # One CSV file for all submissions.
-        if submission_file_path:
+        try:
+            if options['workers'] == 1 or len(tasks) <= 1:
+                for task in tasks:
+                    partition_done(*_export_partition(task))
+            else:
+                # The forked workers must not share the database connections
+                # of the main process.
+                connections.close_all()
+                ctx = multiprocessing.get_context('fork')
+                with ctx.Pool(processes=options['workers']) as pool:
+                    for index, rows in pool.imap_unordered(_export_partition, tasks):
+                        partition_done(index, rows)
+        finally:
+            _partition_context.clear()
+
+        # Merge the header and the part files into the output file.
+        header_path = submission_file_path + '.part-header'
+        with open_output(header_path, compression) as f:
             if options['submission_results_format']:
-                self.write_results_csv(
-                    submission_file_path,
-                    submissions,
+                self.write_results_rows(
+                    f,
+                    [],
                     options['include_student_ids'],
                     not options['exclude_user_ids'],
                 )
             else:
-                self.write_submission_csv(
-                    submission_file_path,
-                    submissions,
-                    all_deadline_deviations,
-                    all_max_submissions_deviations,
+                self.write_submission_rows(
+                    f,
+                    [],
+                    {},
+                    {},
                     options['include_deadline_deviations'],
                     options['include_max_submission_deviations'],
                     options['include_student_ids'],
                     not options['exclude_user_ids'],
                 )
-            self.stdout.write("Created the submission file: " + submission_file_path)
+        part_paths = [header_path] + [part_path_format.format(index) for index in range(len(partitions))]
+        with open(submission_file_path, 'wb') as output:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, output)
+        for part_path in part_paths:
+            os.remove(part_path)
+        os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - start_time
+        self.log_progress(f'Exported {total_rows} rows in {elapsed:.1f} s.')
+
+    def get_deviations(self, options):
+        """Returns the deadline and max submissions deviations by exercise and user id."""
+        course_instance_ids = options['course_instance_id']
+
+        all_deadline_deviations = {}
+        if options['include_deadline_deviations']:
+            # Fetch all deadline deviations in the course instances.
+            # TODO: this does not use the "include_exercises_file" or "exclude_exercises_file" options at all.
+            all_deadline_deviations_queryset = DeadlineRuleDeviation.objects.filter(
+                exercise__course_module__course_instance__id__in=course_instance_ids,
+            ).prefetch_related(
+                Prefetch(
+                    'exercise',
+                    queryset=BaseExercise.objects.select_related(
+                        'course_module',
+                    ).only(
+                        'id',
+                        'course_module__id',
+                        'course_module__closing_time',
+                        'course_module__course_instance__id',
+                        'course_module__course_instance__course__id',
+                    ),
+                ),
+                Prefetch(
+                    'submitter',
+                    queryset=UserProfile.objects.select_related('user').only('user__id'),
+                ),
+            ).only(
+                'exercise__id',
+                'exercise__course_module__closing_time',
+                'exercise__course_module__course_instance__id',
+                'submitter__user__id',
+                'extra_seconds',
+            )
 
+            for dl_dev in all_deadline_deviations_queryset:
+                all_deadline_deviations.setdefault(
+                    dl_dev.exercise.id,
+                    {}
+                )[dl_dev.submitter.user.id] = dl_dev.get_new_deadline()
+
+        all_max_submissions_deviations = {}
+        if options['include_max_submission_deviations']:
+            # Fetch all max submissions deviations in the course instances.
+            # TODO: this does not use the "include_exercises_file" or "exclude_exercises_file" options at all.
+            all_max_submissions_deviations_queryset = MaxSubmissionsRuleDeviation.objects.filter(
+                exercise__course_module__course_instance__id__in=course_instance_ids,
+            ).select_related(
+                'exercise',
+            ).prefetch_related(
+                Prefetch(
+                    'submitter',
+                    queryset=UserProfile.objects.select_related('user').only('user__id'),
+                ),
+            ).only(
+                'exercise__id',
+                'exercise__max_submissions',
+                'submitter__user__id',
+                'extra_submissions',
+            )
+
+            for sbms_dev in all_max_submissions_deviations_queryset:
+                all_max_submissions_deviations.setdefault(
+                    sbms_dev.exercise.id,
+                    {},
+                )[sbms_dev.submitter.user.id] = sbms_dev.exercise.max_submissions + sbms_dev.extra_submissions
+
+        return all_deadline_deviations, all_max_submissions_deviations
 
-    def write_results_csv(self, csv_file_path, submissions, include_student_ids=True, include_user_ids=True):
+    def write_results_rows(
+            self,
+            f,
+            submissions,
+            include_student_ids=True,
+            include_user_ids=True,
+            write_header=True,
+    ):
         # submissions is an iterable of dictionaries, one dict per exercise per submitter.
-        with open(csv_file_path, 'w', newline='', encoding="utf-8") as f:
-            fieldnames = [
-                'exercise_id',
-                'num_submissions',
-                'final_points',
-                'first_timestamp',
-                'last_timestamp',
-            ]
-            if include_student_ids:
-                fieldnames.insert(1, 'student_id')
-            if include_user_ids:
-                fieldnames.insert(1, 'user_id')
-            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
-            writer.writeheader()
-            for submission in submissions:
-                writer.writerow({
-                    'exercise_id': submission['exercise_id'],
-                    'user_id': submission['submitters__user_id'],
-                    'student_id': submission['submitters__student_id'],
-                    'num_submissions': submission['count'],
-                    'final_points': submission['total'],
-                    'first_timestamp': submission['first_timestamp'],
-                    'last_timestamp': submission['last_timestamp'],
-                })
-
-
-    def write_exercise_csv(self, exercise_file_path, exercises):
-        with open(exercise_file_path, 'w', newline='', encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=(
-                'id',
-                'name',
-                'course_instance',
-                'deadline',
-                'late_submissions_allowed',
-                'late_submission_deadline',
-                'late_submission_penalty',
-                'max_points',
-                'max_submissions',
-                'category', # the name of the category
-                'difficulty',
-                'points_to_pass',
-                'status',
-            ))
+        fieldnames = [
+            'exercise_id',
+            'num_submissions',
+            'final_points',
+            'first_timestamp',
+            'last_timestamp',
+        ]
+        if include_student_ids:
+            fieldnames.insert(1, 'student_id')
+        if include_user_ids:
+            fieldnames.insert(1, 'user_id')
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        if write_header:
             writer.writeheader()
-            for exercise in exercises:
-                writer.writerow({
-                    'id': exercise.pk,
-                    'name': exercise.name, # NB: this does not include any hierarchical numbering 1.2.3
-                    'course_instance': exercise.course_module.course_instance.instance_name,
-                    'deadline': exercise.course_module.closing_time,
-                    'late_submissions_allowed': exercise.course_module.late_submissions_allowed,
-                    'late_submission_deadline': exercise.course_module.late_submission_deadline,
-                    'late_submission_penalty': exercise.course_module.late_submission_penalty,
-                    'max_points': exercise.max_points,
-                    'max_submissions': exercise.max_submissions,
-                    'category': exercise.category.name,
-                    'difficulty': exercise.difficulty,
-                    'points_to_pass': exercise.points_to_pass,
-                    'status': exercise.status,
-                })
-
-
-    def write_submission_csv( # pylint: disable=too-many-locals too-many-arguments
+        rows = 0
+        for submission in submissions:
+            writer.writerow({
+                'exercise_id': submission['exercise_id'],
+                'user_id': submission['submitters__user_id'],
+                'student_id': submission['submitters__student_id'],
+                'num_submissions': submission['count'],
+                'final_points': submission['total'],
+                'first_timestamp': submission['first_timestamp'],
+                'last_timestamp': submission['last_timestamp'],
+            })
+            rows += 1
+        return rows
+
+    def write_exercise_csv(self, f, exercises):
+        writer = csv.DictWriter(f, fieldnames=(
+            'id',
+            'name',
+            'course_instance',
+            'deadline',
+            'late_submissions_allowed',
+            'late_submission_deadline',
+            'late_submission_penalty',
+            'max_points',
+            'max_submissions',
+            'category', # the name of the category
+            'difficulty',
+            'points_to_pass',
+            'status',
+        ))
+        writer.writeheader()
+        for exercise in exercises:
+            writer.writerow({
+                'id': exercise.pk,
+                'name': exercise.name, # NB: this does not include any hierarchical numbering 1.2.3
+                'course_instance': exercise.course_module.course_instance.instance_name,
+                'deadline': exercise.course_module.closing_time,
+                'late_submissions_allowed': exercise.course_module.late_submissions_allowed,
+                'late_submission_deadline': exercise.course_module.late_submission_deadline,
+                'late_submission_penalty': exercise.course_module.late_submission_penalty,
+                'max_points': exercise.max_points,
+                'max_submissions': exercise.max_submissions,
+                'category': exercise.category.name,
+                'difficulty': exercise.difficulty,
+                'points_to_pass': exercise.points_to_pass,
+                'status': exercise.status,
+            })
+
+    def write_submission_rows( # pylint: disable=too-many-locals too-many-arguments
             self,
-            submission_file_path,
+            f,
             submissions,
             all_deadline_deviations,
             all_max_submissions_deviations,
@@ -409,6 +753,7 @@ class Command(BaseCommand):
             include_max_submission_deviations=False,
             include_student_ids=False,
             include_user_ids=True,
+            write_header=True,
     ):
         fieldnames = [
             'submission_id',
@@ -431,55 +776,58 @@ class Command(BaseCommand):
         if include_deadline_deviations:
             fieldnames.append('personal_deadline')
 
-        with open(submission_file_path, 'w', newline='', encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        if write_header:
             writer.writeheader()
-            for submission in submissions:
-                d = {
-                    'submission_id': submission.pk,
-                    'exercise_id': submission.exercise.pk,
-                    'submission_time': submission.submission_time,
-                    'grade': submission.grade,
-                    'service_points': submission.service_points,
-                    'service_max_points': submission.service_max_points,
-                    'status': submission.status,
-                    'late_penalty_applied': submission.late_penalty_applied,
-                    'grading_time': submission.grading_time,
-                    'marked_as_final': submission.force_exercise_points,
-                }
-                if include_user_ids:
-                    d['submitter_user_ids'] = '-'.join(
-                        [str(profile.user.id) for profile in submission.submitter_userprofiles]
-                    )
-                if include_student_ids:
-                    d['student_ids'] = '-'.join(
-                        [str(profile.student_id) for profile in submission.submitter_userprofiles]
-                    )
+        rows = 0
+        for submission in submissions:
+            d = {
+                'submission_id': submission.pk,
+                'exercise_id': submission.exercise_id,
+                'submission_time': submission.submission_time,
+                'grade': submission.grade,
+                'service_points': submission.service_points,
+                'service_max_points': submission.service_max_points,
+                'status': submission.status,
+                'late_penalty_applied': submission.late_penalty_applied,
+                'grading_time': submission.grading_time,
+                'marked_as_final': submission.force_exercise_points,
+            }
+            if include_user_ids:
+                d['submitter_user_ids'] = '-'.join(
+                    [str(profile.user.id) for profile in submission.submitter_userprofiles]
+                )
+            if include_student_ids:
+                d['student_ids'] = '-'.join(
+                    [str(profile.student_id) for profile in submission.submitter_userprofiles]
+                )
 
-                if include_deadline_deviations:
-                    dl_deviations = all_deadline_deviations.get(submission.exercise.pk, {})
-                    personal_deadline = None
-                    for profile in submission.submitter_userprofiles:
-                        dl = dl_deviations.get(profile.user.id, None)
-                        if dl is not None and (
-                                personal_deadline is None
-                                or dl > personal_deadline
-                        ):
-                            personal_deadline = dl
-
-                    d['personal_deadline'] = personal_deadline
-
-                if include_max_submission_deviations:
-                    max_submissions_deviations = all_max_submissions_deviations.get(submission.exercise.pk, {})
-                    personal_max_submissions = None
-                    for profile in submission.submitter_userprofiles:
-                        max_sbms = max_submissions_deviations.get(profile.user.id, None)
-                        if max_sbms is not None and (
-                                personal_max_submissions is None
-                                or max_sbms > personal_max_submissions
-                        ):
-                            personal_max_submissions = max_sbms
-
-                    d['personal_max_submissions'] = personal_max_submissions
-
-                writer.writerow(d)
+            if include_deadline_deviations:
+                dl_deviations = all_deadline_deviations.get(submission.exercise_id, {})
+                personal_deadline = None
+                for profile in submission.submitter_userprofiles:
+                    dl = dl_deviations.get(profile.user.id, None)
+                    if dl is not None and (
+                            personal_deadline is None
+                            or dl > personal_deadline
+                    ):
+                        personal_deadline = dl
+
+                d['personal_deadline'] = personal_deadline
+
+            if include_max_submission_deviations:
+                max_submissions_deviations = all_max_submissions_deviations.get(submission.exercise_id, {})
+                personal_max_submissions = None
+                for profile in submission.submitter_userprofiles:
+                    max_sbms = max_submissions_deviations.get(profile.user.id, None)
+                    if max_sbms is not None and (
+                            personal_max_submissions is None
+                            or max_sbms > personal_max_submissions
+                    ):
+                        personal_max_submissions = max_sbms
+
+                d['personal_max_submissions'] = personal_max_submissions
+
+            writer.writerow(d)
+            rows += 1
+        return rows
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.14 on 2026-10-19 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("course", "0064_courseinstance_view_current_teachers_permission"),
+        ("exercise", "0051_revealrule_show_zero_points_immediately"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubmissionStatistics",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "hour",
+                    models.DateTimeField(verbose_name="LABEL_SUBMISSION_TIME"),
+                ),
+                (
+                    "submission_count",
+                    models.PositiveIntegerField(default=0),
+                ),
+                (
+                    "submitters",
+                    models.JSONField(default=list),
+                ),
+                (
+                    "course_instance",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="course.courseinstance",
+                        verbose_name="LABEL_COURSE_INSTANCE",
+                    ),
+                ),
+                (
+                    "exercise",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="exercise.baseexercise",
+                        verbose_name="LABEL_EXERCISE",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["course_instance", "exercise", "hour"],
+                        name="exercise_submstats_scope_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,7 +1,9 @@
-from typing import Dict, List, Optional, cast
+from __future__ import annotations
+from typing import Dict, List, Optional, TYPE_CHECKING, cast
 
-from bs4 import BeautifulSoup
-from bs4.element import NavigableString, Tag
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+    from bs4.element import Tag
 
 class ExercisePage:
     """
@@ -51,6 +53,8 @@ class ExercisePage:
         If `feedback_revealed` is False, file input fields in the form
         are marked as disabled and the submit button is removed.
         """
+        # bs4 is imported here, because it is slow to import at startup
+        from bs4 import BeautifulSoup # pylint: disable=import-outside-toplevel
         soup = BeautifulSoup(self.content, 'html5lib')
 
         exercise_element = self._find_exercise_element(soup)
@@ -77,6 +81,7 @@ class ExercisePage:
         Finds the element that contains the exercise content. Returns `None` if
         not found.
         """
+        from bs4.element import Tag # pylint: disable=import-outside-toplevel
         # The exercise content element may be identified by a number of
         # different ids or classes
         exercise_element = soup.find(id=['exercise', 'aplus', 'chapter'])
@@ -101,7 +106,7 @@ class ExercisePage:
         # Find all form elements on the exercise page and fill in the values
         field_elements = form_element.find_all(['input', 'select', 'textarea'])
         for field_element in field_elements:
-            field_element = cast(Tag, field_element)
+            field_element = cast('Tag', field_element)
             field_name = cast(str, field_element.get('name'))
             if field_name not in field_values:
                 disable_file_input_field = (
@@ -123,12 +128,13 @@ class ExercisePage:
                     field_element['value'] = field_values[field_name][0]
             elif field_element.name == 'select':
                 for option_element in field_element.find_all('option'):
-                    option_element = cast(Tag, option_element)
+                    option_element = cast('Tag', option_element)
                     if option_element.get('value') in field_values[field_name]:
                         option_element['selected'] = ''
                     else:
                         del option_element['selected']
             elif field_element.name == 'textarea':
+                from bs4.element import NavigableString # pylint: disable=import-outside-toplevel
                 string_content = NavigableString(field_values[field_name][0])
                 field_element.contents = [string_content]
 
@@ -148,4 +154,4 @@ class ExercisePage:
         Removes all submit buttons from the exercise element.
         """
         for submit_element in form_element.find_all(['input', 'button'], type='submit'):
-            cast(Tag, submit_element).decompose()
+            cast('Tag', submit_element).decompose()
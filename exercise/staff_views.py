@@ -5,7 +5,7 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.core.validators import URLValidator
-from django.db.models import Count, Max, Min, Prefetch, Q
+from django.db.models import Prefetch, Q
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse, JsonResponse, Http404
 from django.shortcuts import get_object_or_404
@@ -23,7 +23,9 @@ from course.models import (
     USERTAG_INTERNAL,
 )
 from deviations.models import MaxSubmissionsRuleDeviation
+from exercise.cache.assessment import AssessmentQueue
 from exercise.cache.points import CachedPoints
+from exercise.cache.stats import ExerciseSubmitterStats
 from lib.helpers import settings_text, extract_form_errors
 from lib.viewbase import BaseRedirectView, BaseFormView, BaseView
 from notification.models import Notification
@@ -35,6 +37,15 @@ from .forms import (
     SubmissionCreateAndReviewForm,
     EditSubmittersForm,
 )
+from .submission_table import (
+    SubmissionTablePageMixin,
+    filter_submissions,
+    get_cached_counts,
+    get_next_page_url,
+    get_sort_urls,
+    paginate_submissions,
+    parse_sort,
+)
 from .tasks import regrade_exercises
 from .viewbase import (
     ExerciseBaseView,
@@ -57,47 +68,59 @@ def format_submission(submission: Submission, pseudonymized: bool):
     return submission
 
 
-class ListSubmissionsView(ExerciseListBaseView):
+class ListSubmissionsView(SubmissionTablePageMixin, ExerciseListBaseView):
     access_mode = ACCESS.ASSISTANT
     template_name = "exercise/staff/list_submissions.html"
     ajax_template_name = "exercise/staff/_submissions_table.html"
+    rows_template_name = "exercise/staff/_submissions_table_rows.html"
     default_limit = 50
+    page_size = 500
 
     def get_common_objects(self) -> None:
         super().get_common_objects()
         if not self.exercise.is_submittable:
             raise Http404()
+        # The filters and the order are applied in SQL, so that they work
+        # on all of the submissions and not only on the loaded pages
+        qs, filter_values = filter_submissions(self.exercise.submissions.all(), self.request.GET)
         qs = (
-            self.exercise.submissions
+            qs
             .defer("feedback", "submission_data", "grading_data")
             .prefetch_related(None)
             .prefetch_related(
                 Prefetch('submitters', UserProfile.objects.prefetch_tags(self.instance)),
+                'submission_taggings__tag',
             )
         )
+        self.sort = parse_sort(self.request.GET.get('sort'))
 
-        submitters = (
-            UserProfile.objects
-            .filter(submissions__exercise=self.exercise)
-            .annotate(
-                count_assessed=Count(
-                    'submissions__id',
-                    filter=(Q(submissions__grader__isnull=False)),
-                ),
-            )
-        )
-
-        total_submitters = submitters.count()
-        graded_submitters = submitters.filter(count_assessed__gt=0).count()
+        stats = ExerciseSubmitterStats.get(self.exercise)
+        total_submitters = stats.submitter_count
+        graded_submitters = stats.assessed_submitter_count
 
-        for submission in qs:
-            format_submission(submission, self.pseudonymize)
-        self.has_files = any(len(submission.files.all()) > 0 for submission in qs)
         self.limited = self.request.GET.get('limited', False)
+        if self.limited:
+            page = paginate_submissions(qs, None, self.default_limit, self.sort)
+        else:
+            page = paginate_submissions(qs, self.request.GET.get('after'), self.page_size, self.sort)
+            self.next_page_url = get_next_page_url(self.request, page.next_cursor)
+        for submission in page.submissions:
+            format_submission(submission, self.pseudonymize)
+        self.has_files = stats.has_files
         self.not_all_url = self.exercise.get_submission_list_url() + "?limited=true"
         self.all_url = self.exercise.get_submission_list_url()
-        self.submissions = qs[:self.default_limit] if self.limited else qs
-        self.count = len(self.submissions)
+        self.submissions = page.submissions
+        self.has_filters = any(filter_values.values())
+        if self.has_filters:
+            self.count = get_cached_counts(
+                f"exercise{self.exercise.id}",
+                filter_values,
+                lambda: {'submissions': qs.count()},
+            )['submissions']
+        else:
+            self.count = stats.submission_count
+        self.filter_values = filter_values
+        self.sort_urls = get_sort_urls(self.request, self.sort)
         # Handle zero submitters, avoiding division by zero.
         percentage = int(graded_submitters / total_submitters * 100) if total_submitters else 0
         self.percentage_graded = (
@@ -109,9 +132,14 @@ class ListSubmissionsView(ExerciseListBaseView):
             "not_all_url",
             "all_url",
             "submissions",
+            "next_page_url",
             "default_limit",
             "count",
             "percentage_graded",
+            "has_filters",
+            "filter_values",
+            "sort",
+            "sort_urls",
         )
 
 
@@ -138,39 +166,25 @@ class ListSubmittersView(ExerciseListBaseView):
         # The points, submission counts and submission times are retrieved
         # using a QuerySet instead of CachedPoints,
         # because those are specific to a single student, and this page is
-        # supposed to list all students.
-        submitter_summaries = (
-            self.exercise.submissions
-            .values('submitters__id')
-            .annotate(
-                count_submissions=Count('id'),
-                count_assessed=Count('id', filter=Q(grader__isnull=False)),
-                last_submission_time=Max('submission_time'),
-            )
-            .annotate_submitter_points('final_points')
-            .order_by()
-        )
-
-        self.has_files = any(len(submission.files.all()) > 0 for submission in self.exercise.submissions.all())
+        # supposed to list all students. They are cached for the exercise.
+        stats = ExerciseSubmitterStats.get(self.exercise)
+        self.has_files = stats.has_files
 
         # Get a dict of submitters, accessed by their id.
         profiles = (
             UserProfile.objects
-            .filter(submissions__exercise=self.exercise)
             .prefetch_tags(self.instance)
-            .in_bulk()
+            .in_bulk(stats.submitters.keys())
         )
         if self.pseudonymize:
             for profile in profiles.values():
                 pseudo = True
                 format_user(profile.user, pseudo, profile)
-        # Add UserProfile instances to the dicts in submitter_summaries, so we can
+        # Add UserProfile instances to the submitter summaries, so we can
         # use the 'profiles' template tag.
-        for submitter_summary in submitter_summaries:
-            submitter_id = submitter_summary.get('submitters__id')
-            # Avoid crashing if there are submissions with no submitters.
-            if submitter_id is not None:
-                profile = profiles[submitter_id]
+        for submitter_id, submitter_summary in stats.submitters.items():
+            profile = profiles.get(submitter_id)
+            if profile is not None:
                 self.submitters.append({'profile': profile, **submitter_summary})
         self.note('submitters', 'has_files')
 
@@ -395,73 +409,45 @@ class NextUnassessedSubmitterView(ExerciseBaseView, BaseRedirectView):
     """
     access_mode = ACCESS.ASSISTANT
 
-    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse: # pylint: disable=too-many-locals
-        # Query submitters who have not been assessed yet
-        submitters = (UserProfile.objects
-            .filter(submissions__exercise=self.exercise)
-            .annotate(
-                count_assessed=Count(
-                    'submissions__id',
-                    filter=(Q(submissions__grader__isnull=False)),
-                ),
-                earliest_submission=Min('submissions__submission_time'),
-            )
-            .order_by('earliest_submission'))
-
-        total_submitters = submitters.count()
-
-        # Retrieve skipped submitters from the session
-        skipped_submitters = request.session.get('manual_assessment_skipped_submitters', [])
-
-        unskipped_and_unassessed_submitters = (
-            submitters.filter(count_assessed=0).exclude(id__in=skipped_submitters).order_by('earliest_submission')
-        )
-
-        # If no unassessed, unskipped submitters remain, reset skipped submitters list and retry
-        if not unskipped_and_unassessed_submitters.exists() and skipped_submitters:
-            request.session['manual_assessment_skipped_submitters'] = []
-            return self.get(request, *args, **kwargs)
-
-        submitter = unskipped_and_unassessed_submitters.first()
+    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        queue = AssessmentQueue(self.exercise)
 
-        if not submitter:
-            # There are no more unassessed submitters
-            messages.success(request, _('ALL_SUBMITTERS_HAVE_BEEN_ASSESSED'))
+        # If user moved on to the next submitter without assessing the previous submitter, skip the previous submitter
+        try:
+            previous_submitter_id = int(request.GET.get('prev', ''))
+        except ValueError:
+            previous_submitter_id = None
+        if previous_submitter_id is not None and queue.is_queued(previous_submitter_id):
+            queue.skip(previous_submitter_id, request.user.id)
+
+        entry = queue.claim_next(request.user.id)
+        skipped_count = queue.skipped_count(request.user.id)
+        if entry is None and skipped_count:
+            # Start again from the skipped submitters
+            queue.reset_skipped(request.user.id)
+            skipped_count = 0
+            entry = queue.claim_next(request.user.id)
+
+        if entry is None:
+            if queue.has_claims(request.user.id):
+                messages.info(request, _('ALL_UNASSESSED_SUBMITTERS_ARE_BEING_ASSESSED'))
+            else:
+                # There are no more unassessed submitters
+                messages.success(request, _('ALL_SUBMITTERS_HAVE_BEEN_ASSESSED'))
             return self.redirect(self.exercise.get_submission_list_url())
 
-        previous_submitter_id = request.GET.get('prev')
-        if previous_submitter_id:
-            try:
-                previous_submitter_id = int(request.GET.get('prev'))
-            except ValueError:
-                previous_submitter_id = None
-
-        # If user moved on to the next submitter without assessing the previous submitter, skip the current submitter
-        if previous_submitter_id == submitter.id:
-            skipped_submitters = request.session.get('manual_assessment_skipped_submitters', [])
-            if submitter.id not in skipped_submitters:
-                # Save the skipped submitter to the session
-                skipped_submitters.append(submitter.id)
-                request.session['manual_assessment_skipped_submitters'] = skipped_submitters
-            return self.redirect(self.exercise.get_url('submission-next-unassessed'))
-
-        # Find the submitter's best submission using the cache
-        cache = CachedPoints(self.instance, submitter.user, True)
-        ids = cache.submission_ids(exercise_id=self.exercise.id, best=True, fallback_to_last=True)
-        if not ids:
-            raise Http404()
-
-        assessed_submitters_count = total_submitters - unskipped_and_unassessed_submitters.count() + 1
-
+        _submitter_id, submission_id = entry
+        assessed_submitters_count, total_submitters = queue.progress()
+        assessed_submitters_count = min(assessed_submitters_count + 1, total_submitters)
         percentage = f"{int(assessed_submitters_count / total_submitters * 100)}%" if total_submitters else "0%"
         counter_str = f"{assessed_submitters_count} / {total_submitters} ({percentage})"
-        if len(skipped_submitters) > 0:
-            counter_str += " (" + _('SKIPPED') + f" {len(skipped_submitters)})"
+        if skipped_count > 0:
+            counter_str += " (" + _('SKIPPED') + f" {skipped_count})"
         self.request.session['manually_assessed_counter'] = counter_str
 
         url = reverse(
             'submission-inspect',
-            kwargs={'submission_id': ids[0], **kwargs},
+            kwargs={'submission_id': submission_id, **kwargs},
         )
 
         return self.redirect(url)
@@ -539,7 +525,7 @@ class UserResultsView(CourseInstanceBaseView):
 
     def get_common_objects(self):
         profile = self.student.userprofile
-        enrollment = self.instance.get_enrollment_for(profile.user)
+        enrollment = self.instance.get_cached_enrollment_for(profile.user)
         if not enrollment:
             messages.warning(self.request, _("USER_NOT_ENROLLED"))
         elif enrollment.status != Enrollment.ENROLLMENT_STATUS.ACTIVE:
@@ -0,0 +1,19 @@
+$(document).ready(function() {
+	$(document).on('click', 'button[data-next-page]', function() {
+		var button = $(this);
+		var table = $(button.data('table'));
+		button.prop('disabled', true);
+
+		$.getJSON(button.attr('data-next-page'), function(data) {
+			table.children('tbody').append(data.rows);
+			if (data.next) {
+				button.attr('data-next-page', data.next);
+				button.prop('disabled', false);
+			} else {
+				button.closest('p').remove();
+			}
+		}).fail(function() {
+			button.prop('disabled', false);
+		});
+	});
+});
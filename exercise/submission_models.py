@@ -1,20 +1,23 @@
+from collections import defaultdict
+import datetime
 import itertools
 import json
 import logging
 from mimetypes import guess_type
 import os
-from typing import IO, Dict, Iterable, List, Tuple, TYPE_CHECKING, Callable
+from typing import IO, Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING, Callable
 from urllib.parse import urlparse
 
 from django.conf import settings
-from django.db import models, DatabaseError
+from django.db import models, transaction, DatabaseError
 from django.db.models import F
-from django.db.models.signals import post_delete
+from django.db.models.functions import TruncHour
+from django.db.models.signals import m2m_changed, post_delete
 from django.http.request import HttpRequest
 from django.utils import timezone
 from django.utils.translation import get_language, gettext_lazy as _
 
-from course.models import SubmissionTag
+from course.models import CourseInstance, SubmissionTag
 from exercise.protocol.exercise_page import ExercisePage
 from authorization.models import JWTAccessible
 from authorization.object_permissions import register_jwt_accessible_class
@@ -290,6 +293,67 @@ class SubmissionManager(JWTAccessible["Submission"], models.Manager):
     def exclude_unofficial(self):
         return self.exclude(status=Submission.STATUS.UNOFFICIAL)
 
+    def reassign_submitters(
+            self,
+            submissions: Iterable["Submission"],
+            old_submitter: UserProfile,
+            new_submitter: UserProfile,
+            ) -> List[int]:
+        """
+        Replaces `old_submitter` with `new_submitter` in the submitters of the
+        submissions, e.g. when submissions were made in a wrong group.
+        Returns the ids of the submissions that were changed.
+
+        The submitters are changed with one bulk insert and one delete in a
+        transaction, so the m2m_changed signals are not sent. Instead, the
+        caches that the signals would invalidate are invalidated once for all
+        of the submissions at the end.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .cache.assessment import AssessmentQueue
+        from .cache.grades import CourseGrades
+        from .cache.points import invalidate_submitters_changed
+        from .cache.stats import CachedSubmitterCounts, ExerciseSubmitterStats
+
+        if old_submitter.id == new_submitter.id:
+            return []
+        through = Submission.submitters.through
+        with transaction.atomic():
+            rows = through.objects.filter(
+                submission__in=submissions,
+                userprofile=old_submitter,
+            )
+            submission_ids = list(rows.values_list('submission_id', flat=True))
+            if not submission_ids:
+                return []
+            # The new submitter may already be a submitter of some of the submissions
+            through.objects.bulk_create(
+                [through(submission_id=i, userprofile_id=new_submitter.id) for i in submission_ids],
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            through.objects.filter(
+                submission_id__in=submission_ids,
+                userprofile=old_submitter,
+            ).delete()
+
+            changed = list(
+                Submission.objects
+                .filter(id__in=submission_ids)
+                .prefetch_related(None)
+                .defer_text_fields()
+                .select_related('exercise__course_module__course_instance')
+            )
+            exercise_ids = {s.exercise_id for s in changed}
+            instance_ids = {s.exercise.course_module.course_instance_id for s in changed}
+            invalidate_submitters_changed(submission_ids, [old_submitter.user_id])
+            ExerciseSubmitterStats.invalidate_many([(i,) for i in exercise_ids])
+            CourseGrades.invalidate_many([(i,) for i in instance_ids])
+            AssessmentQueue.invalidate_many(exercise_ids)
+            CachedSubmitterCounts.invalidate_many([(i,) for i in instance_ids])
+            refresh_submissions_statistics(changed)
+        return submission_ids
+
     def get_combined_enrollment_submission_data(self, user):
         """Retrieve the user's submissions to enrollment exercises and combine
         their submission data into a single dictionary.
@@ -458,6 +522,10 @@ class Submission(SubmissionProto, models.Model):
 
     objects = SubmissionManager()
 
+    # The fields that affect the manual assessment queue of the exercise, as
+    # they may be given in save(update_fields=...)
+    QUEUE_FIELDS = frozenset(('status', 'grade', 'force_exercise_points', 'grader', 'grader_id'))
+
     if TYPE_CHECKING:
         id: int
         submitters: models.ManyToManyField[UserProfile, 'Submission']
@@ -777,7 +845,7 @@ class SubmissionDraft(models.Model):
         Loads the draft page, i.e. the exercise form with the user's
         incomplete answers filled in.
         """
-        enrollment = self.exercise.course_instance.get_enrollment_for(request.user)
+        enrollment = self.exercise.course_instance.get_cached_enrollment_for(request.user)
         if enrollment and enrollment.selected_group:
             students = list(enrollment.selected_group.members.all())
         else:
@@ -943,3 +1011,307 @@ class PendingSubmission(models.Model):
     class Meta:
         verbose_name = _('MODEL_NAME_PENDING_SUBMISSION')
         verbose_name_plural = _('MODEL_NAME_PENDING_SUBMISSION_PLURAL')
+
+
+ONE_HOUR = datetime.timedelta(hours=1)
+
+
+def floor_hour(value: datetime.datetime) -> datetime.datetime:
+    """Returns the start of the UTC hour that contains the given time."""
+    return value.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value: datetime.datetime) -> datetime.datetime:
+    """Returns the start of the first UTC hour that begins at or after the given time."""
+    start = floor_hour(value)
+    return start if start == value else start + ONE_HOUR
+
+
+class SubmissionStatisticsManager(models.Manager):
+
+    def watermark(self) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Returns the start and the end of the rolled up time range,
+        or None if nothing has been rolled up yet.
+        """
+        hours = self.filter(course_instance=None, exercise=None).aggregate(
+            first=models.Min('hour'),
+            last=models.Max('hour'),
+        )
+        if hours['first'] is None:
+            return None
+        return hours['first'], hours['last'] + ONE_HOUR
+
+    def rollup(
+            self,
+            start: datetime.datetime,
+            end: datetime.datetime,
+            course_instance_id: Optional[int] = None,
+            ) -> None:
+        """
+        Recomputes the statistics of the whole hours in [start, end).
+
+        If course_instance_id is given, only the rows of that course instance
+        (and the system rows, which include it) are recomputed.
+        """
+        start, end = floor_hour(start), floor_hour(end)
+        if start >= end:
+            return
+        submissions = Submission.objects.filter(
+            submission_time__gte=start,
+            submission_time__lt=end,
+        )
+        exercise_rows = self.filter(hour__gte=start, hour__lt=end).exclude(exercise=None)
+        instance_rows = self.filter(hour__gte=start, hour__lt=end, exercise=None).exclude(course_instance=None)
+        if course_instance_id is not None:
+            exercise_rows = exercise_rows.filter(course_instance_id=course_instance_id)
+            instance_rows = instance_rows.filter(course_instance_id=course_instance_id)
+            instance_submissions = submissions.filter(
+                exercise__course_module__course_instance_id=course_instance_id,
+            )
+        else:
+            instance_submissions = submissions
+        instance_submissions = instance_submissions.annotate(
+            hour=TruncHour('submission_time', tzinfo=datetime.timezone.utc),
+        ).values(
+            'hour',
+            'exercise_id',
+            'exercise__course_module__course_instance_id',
+        )
+
+        # key: (hour, course instance id, exercise id), None for the levels above.
+        counts: Dict[Tuple, int] = defaultdict(int)
+        submitters: Dict[Tuple, Set[Optional[int]]] = defaultdict(set)
+        for row in instance_submissions.annotate(count=models.Count('id')).order_by():
+            instance_id = row['exercise__course_module__course_instance_id']
+            for key in (
+                    (row['hour'], instance_id, row['exercise_id']),
+                    (row['hour'], instance_id, None),
+                    (row['hour'], None, None),
+                    ):
+                counts[key] += row['count']
+        for row in instance_submissions.values_list(
+                'hour',
+                'exercise__course_module__course_instance_id',
+                'exercise_id',
+                'submitters',
+                ).distinct().order_by():
+            hour, instance_id, exercise_id, submitter_id = row
+            submitters[(hour, instance_id, exercise_id)].add(submitter_id)
+            submitters[(hour, instance_id, None)].add(submitter_id)
+            submitters[(hour, None, None)].add(submitter_id)
+
+        if course_instance_id is not None:
+            # The system rows are recomputed from the other course instances
+            # without touching their submissions.
+            for row in self.filter(
+                    hour__gte=start,
+                    hour__lt=end,
+                    exercise=None,
+                    ).exclude(
+                    course_instance=None,
+                    ).exclude(
+                    course_instance_id=course_instance_id,
+                    ):
+                key = (row.hour, None, None)
+                counts[key] += row.submission_count
+                submitters[key].update(row.submitters)
+
+        hour = start
+        while hour < end:
+            # The system rows mark the rolled up hours, so they are always created.
+            counts[(hour, None, None)] += 0
+            hour += ONE_HOUR
+
+        with transaction.atomic():
+            exercise_rows.delete()
+            instance_rows.delete()
+            self.filter(hour__gte=start, hour__lt=end, course_instance=None, exercise=None).delete()
+            self.bulk_create(
+                [
+                    self.model(
+                        hour=hour,
+                        course_instance_id=instance_id,
+                        exercise_id=exercise_id,
+                        submission_count=count,
+                        submitters=sorted(submitters[(hour, instance_id, exercise_id)], key=lambda i: i or 0),
+                    )
+                    for (hour, instance_id, exercise_id), count in counts.items()
+                ],
+                batch_size=1000,
+            )
+
+    def rollup_new_hours(self, max_hours: int) -> None:
+        """
+        Rolls up the whole hours that have passed since the previous rollup,
+        at most max_hours at a time.
+        """
+        end = floor_hour(timezone.now())
+        watermark = self.watermark()
+        if watermark is not None:
+            start = watermark[1]
+        else:
+            first = Submission.objects.aggregate(first=models.Min('submission_time'))['first']
+            start = floor_hour(first) if first is not None else end - ONE_HOUR
+        while start < end:
+            chunk_end = min(start + datetime.timedelta(hours=max_hours), end)
+            self.rollup(start, chunk_end)
+            start = chunk_end
+
+    def get_statistics(
+            self,
+            submissions: SubmissionQuerySet,
+            starttime: datetime.datetime,
+            endtime: datetime.datetime,
+            course_instance_id: Optional[int] = None,
+            exercise_id: Optional[int] = None,
+            ) -> Tuple[int, int]:
+        """
+        Returns the number of submissions and distinct submitters between
+        starttime and endtime (inclusive).
+
+        The whole hours that have been rolled up are read from the rollup rows
+        and only the remaining edges of the time window are counted from the
+        given submissions, which must already be filtered to the same scope
+        and time window.
+        """
+        watermark = self.watermark()
+        if watermark is not None:
+            covered_start = max(ceil_hour(starttime), watermark[0])
+            covered_end = min(floor_hour(endtime), watermark[1])
+        if watermark is None or covered_start >= covered_end:
+            return (
+                submissions.count(),
+                submissions.values('submitters').distinct().count(),
+            )
+
+        rows = self.filter(hour__gte=covered_start, hour__lt=covered_end)
+        if exercise_id is not None:
+            rows = rows.filter(exercise_id=exercise_id)
+        else:
+            rows = rows.filter(course_instance_id=course_instance_id, exercise=None)
+        edges = submissions.filter(
+            models.Q(submission_time__lt=covered_start)
+            | models.Q(submission_time__gte=covered_end)
+        )
+        count = edges.count()
+        submitter_ids = set(edges.values_list('submitters', flat=True).distinct().order_by())
+        for row_count, row_submitters in rows.values_list('submission_count', 'submitters'):
+            count += row_count
+            submitter_ids.update(row_submitters)
+        return count, len(submitter_ids)
+
+
+class SubmissionStatistics(models.Model):
+    """
+    Hourly rollup of submissions for the statistics API.
+
+    A row without an exercise contains the statistics of the whole course
+    instance, and a row without a course instance the statistics of the whole
+    system. The system rows are created for every rolled up hour, even if
+    there were no submissions, so that they tell which hours are covered.
+    Submitters are stored as lists of user profile ids, which can be merged
+    across hours to count the distinct submitters exactly.
+    """
+    hour = models.DateTimeField(
+        verbose_name=_('LABEL_SUBMISSION_TIME'),
+    )
+    course_instance = models.ForeignKey(CourseInstance,
+        verbose_name=_('LABEL_COURSE_INSTANCE'),
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+    )
+    exercise = models.ForeignKey(exercise_models.BaseExercise,
+        verbose_name=_('LABEL_EXERCISE'),
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+    )
+    submission_count = models.PositiveIntegerField(default=0)
+    submitters = models.JSONField(default=list)
+    objects = SubmissionStatisticsManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course_instance', 'exercise', 'hour'], name='exercise_submstats_scope_idx'),
+        ]
+
+
+# The attribute of the database connection that holds the rollup hours to
+# recompute after the current transaction commits
+PENDING_STATISTICS_ATTR = 'aplus_pending_statistics_hours'
+
+
+def _refresh_pending_statistics() -> None:
+    """Recomputes the pending rollup hours of the connection and clears them.
+    It is registered with transaction.on_commit() for each change, and the
+    first call after the commit recomputes all of the hours. The hours of a
+    rolled back transaction are recomputed after the next commit, which does
+    not change the rollups."""
+    connection = transaction.get_connection()
+    hours = getattr(connection, PENDING_STATISTICS_ATTR, None)
+    if not hours:
+        return
+    setattr(connection, PENDING_STATISTICS_ATTR, set())
+    for hour, course_instance_id in sorted(hours):
+        SubmissionStatistics.objects.rollup(hour, hour + ONE_HOUR, course_instance_id)
+
+
+def refresh_submission_statistics(submission: Submission) -> None:
+    """
+    Schedules the rollup of the hour of the submission to be recomputed
+    after the transaction, if the hour has already been rolled up.
+
+    Submissions are normally created in the current hour, which has not been
+    rolled up yet, so this does not cost anything for them.
+    """
+    refresh_submissions_statistics([submission])
+
+
+def refresh_submissions_statistics(submissions: Iterable[Submission]) -> None:
+    """Like refresh_submission_statistics, but the watermark of the rollups
+    is read at most once for all of the submissions."""
+    current_hour = floor_hour(timezone.now())
+    watermark = None
+    watermark_read = False
+    hours = set()
+    for submission in submissions:
+        hour = floor_hour(submission.submission_time)
+        if hour >= current_hour:
+            continue
+        if not watermark_read:
+            watermark = SubmissionStatistics.objects.watermark()
+            watermark_read = True
+        if watermark is None or not watermark[0] <= hour < watermark[1]:
+            continue
+        hours.add((hour, submission.exercise.course_instance.id))
+    if not hours:
+        return
+    connection = transaction.get_connection()
+    pending = getattr(connection, PENDING_STATISTICS_ATTR, None)
+    if pending is None:
+        pending = set()
+        setattr(connection, PENDING_STATISTICS_ATTR, pending)
+    pending.update(hours)
+    # Outside of a transaction, the refresh is run immediately
+    transaction.on_commit(_refresh_pending_statistics)
+
+
+def _submission_deleted(sender, instance, **kwargs): # pylint: disable=unused-argument
+    refresh_submission_statistics(instance)
+
+
+# pylint: disable-next=unused-argument,too-many-arguments
+def _submitters_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        submissions = Submission.objects.filter(pk__in=pk_set) if pk_set else instance.submissions.all()
+        refresh_submissions_statistics(submissions.select_related('exercise__course_module'))
+    else:
+        refresh_submission_statistics(instance)
+
+
+post_delete.connect(_submission_deleted, Submission)
+m2m_changed.connect(_submitters_changed, Submission.submitters.through)
@@ -0,0 +1,269 @@
+"""
+Keyset pagination and SQL side filtering and sorting for the staff
+submission tables.
+
+The tables are ordered by one of SORT_FIELDS and then by id, so that the
+order is total. A page is fetched with a cursor pointing to the last row of
+the previous page, so fetching a page does not depend on how many rows
+there are before it. The cursor includes the sort order it was created
+with, and a cursor of another order is ignored.
+"""
+import datetime
+import hashlib
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest, HttpResponse, JsonResponse, QueryDict
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Submission
+
+
+# The sort keys of the sort GET parameter and the submission fields they
+# order by. A minus sign before the key reverses the order.
+SORT_FIELDS = {
+    'time': 'submission_time',
+    'grade': 'grade',
+    'status': 'status',
+}
+DEFAULT_SORT = '-time'
+
+
+class SubmissionPage(NamedTuple):
+    submissions: List[Submission]
+    next_cursor: Optional[str]
+
+
+def parse_sort(value: Optional[str]) -> str:
+    """Returns the sort parameter if it is valid, otherwise DEFAULT_SORT"""
+    if value and value.lstrip('-') in SORT_FIELDS:
+        return value
+    return DEFAULT_SORT
+
+
+def _sort_field(sort: str) -> Tuple[str, bool]:
+    """Returns the field and whether the order is descending"""
+    return SORT_FIELDS[sort.lstrip('-')], sort.startswith('-')
+
+
+def _encode_value(value: Any) -> str:
+    if isinstance(value, datetime.datetime):
+        return str(int(value.timestamp() * 1_000_000))
+    return str(value)
+
+
+def _decode_value(field: str, value: str) -> Any:
+    if field == 'submission_time':
+        return datetime.datetime.fromtimestamp(int(value) / 1_000_000, tz=datetime.timezone.utc)
+    if field == 'grade':
+        return int(value)
+    return value
+
+
+def encode_cursor(submission: Submission, sort: str = DEFAULT_SORT) -> str:
+    field, _descending = _sort_field(sort)
+    return f"{sort}.{_encode_value(getattr(submission, field))}.{submission.id}"
+
+
+def decode_cursor(cursor: Optional[str], sort: str = DEFAULT_SORT) -> Optional[Tuple[Any, int]]:
+    """Returns the (sort field value, id) of the cursor or None if it is not
+    valid or it was created for another sort order"""
+    if not cursor:
+        return None
+    try:
+        cursor_sort, value, submission_id = cursor.split('.')
+        if cursor_sort != sort:
+            return None
+        field, _descending = _sort_field(sort)
+        return _decode_value(field, value), int(submission_id)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def paginate_submissions(
+        queryset: QuerySet[Submission],
+        cursor: Optional[str],
+        limit: int,
+        sort: str = DEFAULT_SORT,
+        ) -> SubmissionPage:
+    """
+    Returns the page of at most `limit` submissions in the `sort` order that
+    follows the cursor. The first page is returned if the cursor is empty or
+    not valid.
+    """
+    sort = parse_sort(sort)
+    field, descending = _sort_field(sort)
+    if descending:
+        queryset = queryset.order_by(f'-{field}', '-id')
+    else:
+        queryset = queryset.order_by(field, 'id')
+
+    key = decode_cursor(cursor, sort)
+    if key is not None:
+        value, submission_id = key
+        lookup = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{lookup}': value})
+            | Q(**{field: value, f'id__{lookup}': submission_id})
+        )
+
+    # Fetch one extra row to know whether there is a next page
+    submissions = list(queryset[:limit + 1])
+    if len(submissions) > limit:
+        submissions = submissions[:limit]
+        return SubmissionPage(submissions, encode_cursor(submissions[-1], sort))
+    return SubmissionPage(submissions, None)
+
+
+def _parse_datetime(value: str) -> Optional[datetime.datetime]:
+    try:
+        dt = datetime.datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return None
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def _split_ids(value: str) -> List[str]:
+    # Ids are given as comma-separated strings (e.g., "45,44,40")
+    return [v.strip() for v in value.split(',') if v.strip().isdigit()]
+
+
+def filter_submissions( # pylint: disable=too-many-branches
+        queryset: QuerySet[Submission],
+        params: QueryDict,
+        ) -> Tuple[QuerySet[Submission], Dict[str, Any]]:
+    """
+    Applies the submission table filters given in the GET parameters to the
+    queryset. Returns the filtered queryset and the parsed filter values.
+    """
+    values = {
+        'student_id': params.get('student_id', '').strip(),
+        'status': params.get('status', '').strip(),
+        'exercise_ids': _split_ids(params.get('exercise_id', '')),
+        'submitter_name': params.get('submitter_name', '').strip(),
+        'start_time': params.get('start_time', '').strip(),
+        'end_time': params.get('end_time', '').strip(),
+        'tag_ids': _split_ids(params.get('tag_id', '')),
+        'late_penalty': params.get('late_penalty', '').strip(),
+        'assessed_manually': params.get('assessed_manually', '').strip(),
+    }
+
+    filters = Q()
+    # Filters over many-to-many relations may return the same submission many times
+    needs_distinct = False
+
+    if values['student_id'].isdigit():
+        filters &= Q(submitters__id=values['student_id'])
+        needs_distinct = True
+
+    status = values['status']
+    if status == 'not_ready':
+        filters &= ~Q(status=Submission.STATUS.READY)
+    elif status:
+        filters &= Q(status=status)
+
+    if values['exercise_ids']:
+        filters &= Q(exercise_id__in=values['exercise_ids'])
+
+    submitter_name = values['submitter_name']
+    if submitter_name:
+        filters &= (
+            Q(submitters__user__first_name__icontains=submitter_name)
+            | Q(submitters__user__last_name__icontains=submitter_name)
+            | Q(submitters__user__username__icontains=submitter_name)
+            | Q(submitters__student_id__icontains=submitter_name)
+        )
+        needs_distinct = True
+
+    if values['tag_ids']:
+        # Submissions that have ANY of the selected tags
+        filters &= Q(submission_taggings__tag_id__in=values['tag_ids'])
+        needs_distinct = True
+
+    if values['late_penalty'] == 'yes':
+        filters &= Q(late_penalty_applied__isnull=False)
+    elif values['late_penalty'] == 'no':
+        filters &= Q(late_penalty_applied__isnull=True)
+
+    if values['assessed_manually'] == 'yes':
+        filters &= Q(grader__isnull=False)
+    elif values['assessed_manually'] == 'no':
+        filters &= Q(grader__isnull=True)
+
+    start_time = _parse_datetime(values['start_time'])
+    if start_time is not None:
+        filters &= Q(submission_time__gte=start_time)
+
+    end_time = _parse_datetime(values['end_time'])
+    if end_time is not None:
+        filters &= Q(submission_time__lte=end_time)
+
+    queryset = queryset.filter(filters)
+    if needs_distinct:
+        queryset = queryset.distinct()
+    return queryset, values
+
+
+def get_cached_counts(
+        scope: str,
+        filter_values: Dict[str, Any],
+        count: Callable[[], Dict[str, int]],
+        ) -> Dict[str, int]:
+    """
+    Returns the counts shown with a submission table. The counts are cached
+    for SUBMISSION_TABLE_COUNT_CACHE_TIMEOUT seconds, so that they are not
+    recomputed when the table pages are loaded.
+    """
+    digest = hashlib.md5(repr(sorted(filter_values.items())).encode(), usedforsecurity=False).hexdigest()
+    return cache.get_or_set(
+        f"submissiontablecount:{scope}:{digest}",
+        count,
+        settings.SUBMISSION_TABLE_COUNT_CACHE_TIMEOUT,
+    )
+
+
+def get_next_page_url(request: HttpRequest, cursor: Optional[str]) -> Optional[str]:
+    """Returns the URL of the JSON page that follows the cursor"""
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['after'] = cursor
+    params['format'] = 'json'
+    return f"{request.path}?{params.urlencode()}"
+
+
+def get_sort_urls(request: HttpRequest, sort: str) -> Dict[str, str]:
+    """Returns the URL of the first page of the table sorted by each of
+    SORT_FIELDS. The URL of the current sort key reverses the order."""
+    urls = {}
+    for key in SORT_FIELDS:
+        params = request.GET.copy()
+        params.pop('after', None)
+        params.pop('format', None)
+        params['sort'] = key if sort == f'-{key}' else f'-{key}'
+        urls[key] = f"{request.path}?{params.urlencode()}"
+    return urls
+
+
+class SubmissionTablePageMixin:
+    """
+    Returns the rows of the table page as JSON when the request has
+    format=json. The view sets `next_page_url` for the page that follows.
+    The rows are rendered with `rows_template_name`.
+    """
+    rows_template_name: str
+    next_page_url: Optional[str] = None
+
+    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        if request.GET.get('format') == 'json':
+            context = self.get_context_data(**kwargs)
+            return JsonResponse({
+                'rows': render_to_string(self.rows_template_name, context, request),
+                'next': self.next_page_url,
+            })
+        return super().get(request, *args, **kwargs)
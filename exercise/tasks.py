@@ -1,9 +1,12 @@
 import logging
 from time import sleep
 
+from django.conf import settings
+from django.core.cache import cache
+
 from aplus.celery import app
 from .exercise_models import BaseExercise, ExerciseTask
-from .submission_models import Submission
+from .submission_models import Submission, SubmissionStatistics
 
 logger = logging.getLogger('aplus.exercise')
 
@@ -54,3 +57,19 @@ def regrade_exercises(self, exerciseid: int, regrade_type: str) -> None:
             exercise.id)
         return
     task.delete()
+
+
+@app.task
+def rollup_submission_statistics() -> None:
+    """
+    Rolls up the submission statistics of the whole hours that have passed
+    since the previous run.
+    """
+    # Overlapping runs would roll up the same hours twice.
+    if not cache.add('submissionstatistics:rollup_lock', True, 60 * 60):
+        logger.info("rollup_submission_statistics task: the previous run is still in progress")
+        return
+    try:
+        SubmissionStatistics.objects.rollup_new_hours(settings.SUBMISSION_STATISTICS_ROLLUP_MAX_HOURS)
+    finally:
+        cache.delete('submissionstatistics:rollup_lock')
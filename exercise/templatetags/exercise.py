@@ -1,11 +1,14 @@
+import hashlib
 import json
-from typing import Any, Dict, Iterable, Optional, Union
+from typing import Any, Callable, Dict, Iterable, Optional, Union
 
 from django import template
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.cache import cache
+from django.template.backends.utils import csrf_input
 from django.template.context import Context
-from django.utils import timezone
+from django.utils import timezone, translation
 from django.utils.formats import date_format
 from django.utils.safestring import mark_safe
 from django.utils.text import format_lazy
@@ -24,6 +27,7 @@ from ..cache.points import (
     SubmissionEntry,
     ExercisePoints,
 )
+from ..cache.stats import CachedSubmitterCounts
 from ..models import LearningObjectDisplay, LearningObject, Submission, BaseExercise
 
 
@@ -64,6 +68,70 @@ def _get_toc(context, student=None):
     return context
 
 
+# Times of the entries after which a fragment may render differently
+FRAGMENT_TIME_ATTRS = ('opening_time', 'reading_opening_time', 'closing_time', 'late_time', 'personal_deadline')
+
+
+def _fragment_timeout(context: Context, points: CachedPoints) -> float:
+    """
+    Returns the number of seconds a rendered fragment of the points can be
+    cached: until the next module or exercise opens or closes, or the points
+    expire, but at most FRAGMENT_CACHE_TIMEOUT.
+    """
+    now = _prepare_now(context)
+    timeout = settings.FRAGMENT_CACHE_TIMEOUT
+    expires_on = points.data._expires_on
+    if expires_on is not None:
+        timeout = min(timeout, expires_on - now.timestamp())
+    for entry in (*points.modules(), *points.exercises()):
+        for attr in FRAGMENT_TIME_ATTRS:
+            t = getattr(entry, attr, None)
+            if t is not None and t > now:
+                timeout = min(timeout, (t - now).total_seconds())
+    return timeout
+
+
+def _render_fragment( # pylint: disable=too-many-arguments
+        context: Context,
+        template_name: str,
+        points: CachedPoints,
+        get_values: Callable[[], Dict[str, Any]],
+        *key_parts: Any,
+        ) -> str:
+    """
+    Renders the template like an inclusion tag, and caches the rendered HTML.
+    The cache key contains the generation times of the content and the points,
+    so the fragment changes whenever they are regenerated. The fragment is
+    shared by all viewers with the same roles, so it must not contain
+    anything specific to the viewer's session, such as a CSRF token.
+    """
+    request = context.get('request')
+    key_parts = (
+        template_name,
+        context['instance'].id,
+        getattr(points.user, 'id', None),
+        getattr(getattr(request, 'user', None), 'is_authenticated', False),
+        points.created(),
+        context.get('is_course_staff', False),
+        context.get('is_teacher', False),
+        translation.get_language(),
+        timezone.get_current_timezone_name(),
+        *key_parts,
+    )
+    key = "fragment:" + hashlib.md5(repr(key_parts).encode(), usedforsecurity=False).hexdigest()
+    # The cache drops the fragment when it expires, so the expiry is only
+    # computed when the fragment is rendered
+    html = cache.get(key)
+    if html is not None:
+        return mark_safe(html)
+
+    html = context.template.engine.get_template(template_name).render(context.new(get_values()))
+    timeout = _fragment_timeout(context, points)
+    if timeout > 0:
+        cache.set(key, str(html), int(timeout) or 1)
+    return html
+
+
 def _is_accessible(context, entry, t):
     if t and t > _prepare_now(context):
         return False
@@ -96,53 +164,75 @@ def check_exercise_deadline_extensions(children, entry_name, is_module_specific=
     return mark_safe(output)
 
 
-@register.inclusion_tag("exercise/_user_results.html", takes_context=True)
-def user_results(context: Context, student: Optional[User] = None) -> Dict[str, Any]:
-    values = _get_toc(context, student)
-    values['total_json'] = json.dumps(values['total'])
-    if values['is_course_staff']:
-        instance = context['instance']
-        values['student_count'] = instance.students.count()
-        counts = (instance.students
-            .filter(submissions__exercise__course_module__course_instance=instance)
-            .values('submissions__exercise_id')
-            .annotate(count=models.Count('submissions__submitters', distinct=True))
-            .order_by()
-        )
-        values['exercise_submitter_counts'] = {row['submissions__exercise_id']: row['count'] for row in counts}
-    return values
+def _prepare_submitter_counts(context: Context) -> None:
+    if 'exercise_submitter_counts' not in context:
+        counts = CachedSubmitterCounts(context['instance'])
+        context['student_count'] = counts.student_count
+        context['exercise_submitter_counts'] = counts.exercise_submitter_counts
 
 
-@register.inclusion_tag("exercise/_user_toc.html", takes_context=True)
-def user_toc(context, student=None):
-    return _get_toc(context, student)
+@register.simple_tag(takes_context=True)
+def user_results(context: Context, student: Optional[User] = None) -> str:
+    points = _prepare_context(context, student)
+    counts = ()
+    if context.get('is_course_staff', False):
+        _prepare_submitter_counts(context)
+        counts = (context['student_count'], sorted(context['exercise_submitter_counts'].items()))
+
+    def get_values() -> Dict[str, Any]:
+        values = _get_toc(context, student)
+        values['total_json'] = json.dumps(values['total'])
+        if values['is_course_staff']:
+            values['student_count'] = context['student_count']
+            values['exercise_submitter_counts'] = context['exercise_submitter_counts']
+        return values
+
+    html = _render_fragment(context, "exercise/_user_results.html", points, get_values, counts)
+    # The CSRF token depends on the session, so it is rendered outside of
+    # the cached fragment
+    request = context.get('request')
+    if request is not None:
+        html = mark_safe(html + csrf_input(request))
+    return html
+
+
+@register.simple_tag(takes_context=True)
+def user_toc(context: Context, student: Optional[User] = None) -> str:
+    points = _prepare_context(context, student)
+    return _render_fragment(context, "exercise/_user_toc.html", points, lambda: _get_toc(context, student))
 
 
-@register.inclusion_tag("exercise/_user_last.html", takes_context=True)
-def user_last(context):
+@register.simple_tag(takes_context=True)
+def user_last(context: Context) -> str:
     user = context['request'].user
     points = _prepare_context(context)
+    last = None
     if user.is_authenticated:
         last = LearningObjectDisplay.objects.filter(
             profile=user.userprofile,
             learning_object__status=LearningObject.STATUS.READY,
             learning_object__course_module__course_instance=context['instance'],
-        ).select_related('learning_object').order_by('-timestamp').first()
+        ).order_by('-timestamp').first()
+
+    def get_values() -> Dict[str, Any]:
         if last:
-            entry = points.get_exercise(last.learning_object.id)
             return {
-                'last': entry,
+                'last': points.get_exercise(last.learning_object_id),
                 'last_time': last.timestamp,
             }
-    return {
-        'begin': points.begin(),
-        'instance': context['instance'],
-    }
+        return {
+            'begin': points.begin(),
+            'instance': context['instance'],
+        }
+
+    last_key = (last.learning_object_id, last.timestamp) if last else None
+    return _render_fragment(context, "exercise/_user_last.html", points, get_values, last_key)
 
 
-@register.inclusion_tag("exercise/_category_points.html", takes_context=True)
-def category_points(context, student=None):
-    return _get_toc(context, student)
+@register.simple_tag(takes_context=True)
+def category_points(context: Context, student: Optional[User] = None) -> str:
+    points = _prepare_context(context, student)
+    return _render_fragment(context, "exercise/_category_points.html", points, lambda: _get_toc(context, student))
 
 
 @register.inclusion_tag("exercise/_submission_list.html", takes_context=True)
@@ -370,19 +460,12 @@ def get_grading_errors(submission):
 def exercise_text_stats(context: Context, exercise: Union[int, BaseExercise]) -> Dict[str, Any]:
     if 'instance' not in context:
         raise TagUsageError()
-    instance = context['instance']
+    _prepare_submitter_counts(context)
 
-    if 'student_count' not in context:
-        context['student_count'] = instance.students.count()
     total = context['student_count']
-
-    if isinstance(exercise, int):
-        if 'exercise_submitter_counts' in context:
-            num = context['exercise_submitter_counts'].get(exercise, 0)
-        else:
-            num = instance.students.filter(submissions__exercise_id=exercise).distinct().count()
-    else:
-        num = exercise.number_of_submitters() if exercise else 0
+    if isinstance(exercise, BaseExercise):
+        exercise = exercise.id
+    num = context['exercise_submitter_counts'].get(exercise, 0) if exercise else 0
     return {
         "number": num,
         "percentage": int(100 * num / total) if total else 0,
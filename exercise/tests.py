@@ -4,11 +4,14 @@ from datetime import datetime, timedelta
 from io import BytesIO, StringIO
 
 from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth.models import User
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.test import TestCase
 from django.test.client import RequestFactory
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.datastructures import MultiValueDict
 
@@ -23,8 +26,14 @@ from exercise.models import BaseExercise, StaticExercise, \
     RevealRule, CourseChapter
 from exercise.protocol.exercise_page import ExercisePage
 from exercise.reveal_states import ExerciseRevealState, ModuleRevealState
-from exercise.submission_models import build_upload_dir as build_upload_dir_for_submission_model
+from exercise.submission_models import (
+    build_upload_dir as build_upload_dir_for_submission_model,
+    floor_hour,
+    SubmissionStatistics,
+)
+from exercise.submission_table import decode_cursor, paginate_submissions
 from lib.helpers import build_aplus_url
+from lib.testdata import CourseTestCase
 
 class ExerciseTestBase(TestCase):
     @classmethod
@@ -1609,3 +1618,184 @@ class ExerciseTest(ExerciseTestBase):
         user2_submission.grader = self.teacher.userprofile
         user2_submission.save()
         self.assertEqual(exercise.get_submission_list_url(), get_url_user_id())
+
+
+class SubmissionAdminTest(CourseTestCase):
+
+    def setUp(self):
+        User.objects.create_superuser(username='admin', password='adminPassword')
+        self.client.login(username='admin', password='adminPassword')
+        self.url = reverse('admin:exercise_submission_changelist')
+
+    def test_reassign_submitters_action(self):
+        data = {
+            'action': 'reassign_submitters',
+            ACTION_CHECKBOX_NAME: [self.submission.id, self.submission3.id],
+        }
+        # The form is shown first
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="old_submitter"')
+
+        response = self.client.post(self.url, {
+            **data,
+            'apply': '1',
+            'old_submitter': 'testStudent',
+            'new_submitter': 'nobody',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.submission.submitters.all()), [self.student.userprofile])
+
+        response = self.client.post(self.url, {
+            **data,
+            'apply': '1',
+            'old_submitter': 'testStudent',
+            'new_submitter': 'testTeacher',
+        })
+        self.assertRedirects(response, self.url)
+        self.assertEqual(list(self.submission.submitters.all()), [self.teacher.userprofile])
+        self.assertEqual(
+            set(self.submission3.submitters.all()),
+            {self.teacher.userprofile, self.user.userprofile},
+        )
+        # The submissions that were not selected are not changed
+        self.assertEqual(list(self.submission2.submitters.all()), [self.student.userprofile])
+
+
+class SubmissionStatisticsTest(CourseTestCase):
+
+    def setUp(self):
+        # Move the submissions a few hours back, so that their hours can be rolled up.
+        self.hour = floor_hour(timezone.now()) - timedelta(hours=3)
+        Submission.objects.filter(id=self.submission.id).update(submission_time=self.hour + timedelta(minutes=10))
+        Submission.objects.filter(id=self.submission2.id).update(submission_time=self.hour + timedelta(minutes=50))
+        Submission.objects.filter(id=self.submission3.id).update(submission_time=self.hour + timedelta(hours=1))
+
+    def get_statistics(self, starttime, endtime, **scope):
+        submissions = Submission.objects.filter(submission_time__range=[starttime, endtime])
+        if 'exercise_id' in scope:
+            submissions = submissions.filter(exercise=scope['exercise_id'])
+        elif 'course_instance_id' in scope:
+            submissions = submissions.filter(exercise__course_module__course_instance=scope['course_instance_id'])
+        return SubmissionStatistics.objects.get_statistics(submissions, starttime, endtime, **scope)
+
+    def test_rollup(self):
+        SubmissionStatistics.objects.rollup_new_hours(24)
+        watermark = SubmissionStatistics.objects.watermark()
+        self.assertEqual(watermark, (self.hour, floor_hour(timezone.now())))
+
+        system_row = SubmissionStatistics.objects.get(hour=self.hour, course_instance=None, exercise=None)
+        self.assertEqual(system_row.submission_count, 2)
+        self.assertEqual(system_row.submitters, [self.student.userprofile.id])
+        exercise_row = SubmissionStatistics.objects.get(hour=self.hour + timedelta(hours=1), exercise=self.exercise2)
+        self.assertEqual(exercise_row.submission_count, 1)
+        self.assertEqual(len(exercise_row.submitters), 2)
+
+    def test_statistics_match_raw_counts(self):
+        windows = [
+            (self.hour - timedelta(hours=1), timezone.now()),
+            (self.hour + timedelta(minutes=30), self.hour + timedelta(hours=2)),
+            (self.hour + timedelta(minutes=5), self.hour + timedelta(minutes=15)),
+        ]
+        scopes = [
+            {},
+            {'course_instance_id': self.instance.id},
+            {'exercise_id': self.exercise.id},
+        ]
+        expected = [
+            self.get_statistics(starttime, endtime, **scope)
+            for starttime, endtime in windows
+            for scope in scopes
+        ]
+        SubmissionStatistics.objects.rollup_new_hours(24)
+        actual = [
+            self.get_statistics(starttime, endtime, **scope)
+            for starttime, endtime in windows
+            for scope in scopes
+        ]
+        self.assertEqual(actual, expected)
+        self.assertEqual(expected[0], (3, 2))
+
+    def test_deleted_submission_refreshes_rollup(self):
+        SubmissionStatistics.objects.rollup_new_hours(24)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.submission2.delete()
+        system_row = SubmissionStatistics.objects.get(hour=self.hour, course_instance=None, exercise=None)
+        self.assertEqual(system_row.submission_count, 1)
+
+    def test_rolled_back_refresh_is_not_kept(self):
+        SubmissionStatistics.objects.rollup_new_hours(24)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.submission2.delete()
+                raise ValueError()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Submission.objects.get(id=self.submission2.id).delete()
+        self.assertEqual(len(callbacks), 1)
+        system_row = SubmissionStatistics.objects.get(hour=self.hour, course_instance=None, exercise=None)
+        self.assertEqual(system_row.submission_count, 1)
+
+
+class SubmissionTablePaginationTest(CourseTestCase):
+
+    def test_pages_follow_cursor(self):
+        queryset = Submission.objects.filter(exercise__course_module__course_instance=self.instance)
+        expected = list(queryset.order_by('-submission_time', '-id'))
+        pages = []
+        page = paginate_submissions(queryset, None, 2)
+        pages.extend(page.submissions)
+        while page.next_cursor is not None:
+            page = paginate_submissions(queryset, page.next_cursor, 2)
+            pages.extend(page.submissions)
+        self.assertEqual(pages, expected)
+
+    def test_invalid_cursor_returns_first_page(self):
+        queryset = Submission.objects.filter(exercise__course_module__course_instance=self.instance)
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+        first = paginate_submissions(queryset, None, 2)
+        self.assertEqual(paginate_submissions(queryset, "not-a-cursor", 2), first)
+
+    def test_json_page(self):
+        self.client.login(username='testTeacher', password='testPassword')
+        url = self.exercise.get_submission_list_url()
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn(f'submission-{self.submission.id}', data['rows'])
+        self.assertIsNone(data['next'])
+
+    def test_sorted_pages_follow_cursor(self):
+        queryset = Submission.objects.filter(exercise__course_module__course_instance=self.instance)
+        Submission.objects.filter(id=self.submission2.id).update(grade=5)
+        for sort, order in (('grade', ('grade', 'id')), ('-grade', ('-grade', '-id')), ('status', ('status', 'id'))):
+            expected = list(queryset.order_by(*order))
+            pages = []
+            page = paginate_submissions(queryset, None, 1, sort)
+            pages.extend(page.submissions)
+            while page.next_cursor is not None:
+                page = paginate_submissions(queryset, page.next_cursor, 1, sort)
+                pages.extend(page.submissions)
+            self.assertEqual(pages, expected, sort)
+
+    def test_cursor_of_another_order_is_ignored(self):
+        queryset = Submission.objects.filter(exercise__course_module__course_instance=self.instance)
+        cursor = paginate_submissions(queryset, None, 1, 'grade').next_cursor
+        self.assertIsNone(decode_cursor(cursor, '-time'))
+        self.assertEqual(paginate_submissions(queryset, cursor, 1), paginate_submissions(queryset, None, 1))
+
+    def test_filtered_and_sorted_view(self):
+        Submission.objects.filter(id=self.submission2.id).update(grade=5)
+        self.client.login(username='testTeacher', password='testPassword')
+        url = self.exercise.get_submission_list_url()
+        response = self.client.get(url, {'sort': 'grade', 'status': 'not_ready'})
+        self.assertEqual(response.status_code, 200)
+        submissions = response.context['submissions']
+        self.assertEqual(
+            [s.id for s in submissions],
+            list(
+                self.exercise.submissions
+                .exclude(status=Submission.STATUS.READY)
+                .order_by('grade', 'id')
+                .values_list('id', flat=True)
+            ),
+        )
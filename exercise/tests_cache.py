@@ -1,7 +1,16 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from lib.querystats import record_stats
 from lib.testdata import CourseTestCase
 from course.models import CourseInstance, CourseModule, LearningObjectCategory
 from deviations.models import MaxSubmissionsRuleDeviation
+from diploma.models import CourseDiplomaDesign
 from exercise.tests import ExerciseTestBase
+from .cache.assessment import AssessmentQueue, _mark_assessed, best_submission_ids
+from .cache.grades import CourseGrades
 from .cache.content import CachedContent, InstanceContent, LearningObjectContent, ModuleContent
 from .cache.hierarchy import previous_iterator
 from .cache.points import (
@@ -11,8 +20,19 @@ from .cache.points import (
     ModulePoints,
     ExercisePoints,
 )
-from .models import BaseExercise, CourseChapter, LearningObject, RevealRule, StaticExercise, Submission
+from .cache.stats import CachedSubmitterCounts, ExerciseSubmitterStats
+from .templatetags.exercise import _fragment_timeout, _get_toc
+from .models import (
+    BaseExercise,
+    CourseChapter,
+    LearningObject,
+    RevealRule,
+    StaticExercise,
+    Submission,
+    SubmittedFile,
+)
 from deviations.models import DeadlineRuleDeviation
+from threshold.models import Threshold
 
 
 class CachedExerciseContentTest(ExerciseTestBase):
@@ -492,6 +512,25 @@ class CachedPointsTest(CourseTestCase):
         self.assertEqual(c.created(), created[1])
         self.assertNotEqual(p.created(), created)
 
+    def test_reassign_submitters(self):
+        student = self.student.userprofile
+        user = self.user.userprofile
+        self.assertEqual(CachedPoints(self.instance, self.student).find(self.exercise)[0].submission_count, 2)
+        self.assertEqual(CachedPoints(self.instance, self.user).find(self.exercise)[0].submission_count, 0)
+        ExerciseSubmitterStats.get(self.exercise)
+
+        changed = Submission.objects.reassign_submitters(
+            [self.submission, self.submission2, self.submission3], student, user,
+        )
+        self.assertEqual(set(changed), {self.submission.id, self.submission2.id, self.submission3.id})
+        self.assertEqual(list(self.submission3.submitters.all()), [user])
+        self.assertEqual(CachedPoints(self.instance, self.student).find(self.exercise)[0].submission_count, 0)
+        self.assertEqual(CachedPoints(self.instance, self.user).find(self.exercise)[0].submission_count, 2)
+        self.assertEqual(list(ExerciseSubmitterStats.get(self.exercise).submitters), [user.id])
+
+        # Nothing changes when the old submitter is not a submitter
+        self.assertEqual(Submission.objects.reassign_submitters([self.submission], student, user), [])
+
     def test_accumulation(self):
         self.submission2.set_points(2,2)
         self.submission2.save()
@@ -624,6 +663,7 @@ class CachedPointsTest(CourseTestCase):
         self.assertTrue(entry2.is_revealed)
         self.assertFalse(chapter_entry.is_revealed)
 
+
 class ExercisePointsTest(ExerciseTestBase):
     def test_forced_points(self) -> None:
         self.submission.set_points(5, 10)
@@ -677,3 +717,289 @@ class ExercisePointsTest(ExerciseTestBase):
         entry = ExercisePoints.get(self.base_exercise, self.user)
         self.assertEqual(entry.official_points, 50)
         self.assertEqual(entry.points, 50)
+
+
+class CachedSubmitterCountsTest(CourseTestCase):
+    def test_counts(self):
+        c = CachedSubmitterCounts(self.instance)
+        self.assertEqual(c.student_count, 1)
+        self.assertEqual(c.exercise_submitter_counts, {self.exercise.id: 1, self.exercise2.id: 1})
+
+    def test_invalidation_enrollment(self):
+        CachedSubmitterCounts(self.instance)
+        self.instance.enroll_student(self.user)
+        c = CachedSubmitterCounts(self.instance)
+        self.assertEqual(c.student_count, 2)
+        self.assertEqual(c.exercise_submitter_counts[self.exercise2.id], 2)
+
+    def test_invalidation_submission(self):
+        CachedSubmitterCounts(self.instance)
+        submission = Submission.objects.create(exercise=self.exercise3)
+        submission.submitters.add(self.student.userprofile)
+        c = CachedSubmitterCounts(self.instance)
+        self.assertEqual(c.exercise_submitter_counts[self.exercise3.id], 1)
+        self.submission3.delete()
+        c = CachedSubmitterCounts(self.instance)
+        self.assertNotIn(self.exercise2.id, c.exercise_submitter_counts)
+
+
+class ExerciseSubmitterStatsTest(CourseTestCase):
+    def test_stats(self):
+        stats = ExerciseSubmitterStats.get(self.exercise)
+        self.assertEqual(stats.submission_count, 2)
+        self.assertEqual(stats.submitter_count, 1)
+        self.assertEqual(stats.assessed_submitter_count, 0)
+        self.assertFalse(stats.has_files)
+        summary = stats.submitters[self.student.userprofile.id]
+        self.assertEqual(summary['count_submissions'], 2)
+        self.assertEqual(summary['final_points'], self.submission.grade)
+
+        stats2 = ExerciseSubmitterStats.get(self.exercise3)
+        self.assertEqual(stats2.submission_count, 0)
+        self.assertEqual(stats2.submitters, {})
+
+    def test_invalidation(self):
+        stats = ExerciseSubmitterStats.get(self.exercise)
+        self.assertEqual(ExerciseSubmitterStats.get(self.exercise)._generated_on, stats._generated_on)
+
+        self.submission2.grader = self.teacher.userprofile
+        self.submission2.save()
+        self.assertEqual(ExerciseSubmitterStats.get(self.exercise).assessed_submitter_count, 1)
+
+        SubmittedFile.objects.create(submission=self.submission, param_name="file")
+        self.assertTrue(ExerciseSubmitterStats.get(self.exercise).has_files)
+
+        self.submission.submitters.add(self.user.userprofile)
+        stats = ExerciseSubmitterStats.get(self.exercise)
+        self.assertEqual(stats.submitter_count, 2)
+        self.assertEqual(stats.submitters[self.user.userprofile.id]['count_submissions'], 1)
+
+
+class CourseGradesTest(CourseTestCase):
+    def setUp(self):
+        self.threshold = Threshold.objects.create(course_instance=self.instance, name="Pass")
+        self.threshold.points.create(limit=50)
+        self.design = CourseDiplomaDesign.objects.create(
+            course=self.instance,
+            point_limits=[50, 100],
+            date="today",
+        )
+
+    def test_grades(self):
+        grades = CourseGrades.get(self.instance)
+        self.assertEqual(list(grades.students), [self.student.userprofile.id])
+        self.assertEqual(grades.thresholds, {self.threshold.id: "Pass"})
+        student = grades.students[self.student.userprofile.id]
+        points = CachedPoints(self.instance, self.student, True)
+        self.assertEqual(student.points, points.total().points)
+        self.assertEqual(student.passed_modules, [m.id for m in points.modules() if m.passed])
+        self.assertEqual(student.passed_categories, [self.category.id])
+        self.assertEqual(student.thresholds, {self.threshold.id: self.threshold.is_passed(points)})
+        self.assertEqual(student.diploma_grade, 1)
+
+        with self.assertNumQueries(0):
+            CourseGrades.get(self.instance)
+
+    def test_invalidation(self):
+        grades = CourseGrades.get(self.instance)
+        self.assertEqual(CourseGrades.get(self.instance)._generated_on, grades._generated_on)
+
+        self.submission3.set_points(2, 2)
+        self.submission3.set_ready()
+        self.submission3.save()
+        student = CourseGrades.get(self.instance).students[self.student.userprofile.id]
+        self.assertEqual(student.points, 150)
+        self.assertTrue(student.thresholds[self.threshold.id])
+        self.assertEqual(student.diploma_grade, 2)
+
+        self.design.modules_to_pass.add(self.module0)
+        student = CourseGrades.get(self.instance).students[self.student.userprofile.id]
+        self.assertEqual(student.diploma_grade, 0)
+
+        self.threshold.points.create(limit=1000)
+        student = CourseGrades.get(self.instance).students[self.student.userprofile.id]
+        self.assertFalse(student.thresholds[self.threshold.id])
+
+        self.instance.enroll_student(self.user)
+        grades = CourseGrades.get(self.instance)
+        self.assertEqual(grades.students[self.user.userprofile.id].points, 100)
+
+    def test_grades_csv(self):
+        url = reverse('api:course-gradesdata-list', kwargs={'version': 2, 'course_id': self.instance.id})
+        self.client.login(username='testStudent', password='testPassword')
+        self.assertEqual(self.client.get(url + '?format=csv').status_code, 403)
+        self.client.login(username='testTeacher', password='testPassword')
+        response = self.client.get(url + '?format=csv')
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'UserID,StudentID,Email,Points,Pass,Grade')
+        self.assertEqual(lines[1], f'{self.student.id},123TEST,,50,1,1')
+
+    def test_diploma_list(self):
+        self.client.login(username='testTeacher', password='testPassword')
+        url = reverse('diploma-list', kwargs={'coursediploma_id': self.design.id})
+        self.client.get(url)
+        with record_stats() as stats:
+            self.client.get(url)
+
+        self.setUpStudents(10)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['student_grades']), 11)
+        with self.assertQueryBudget(stats.queries):
+            self.client.get(url)
+
+
+class FragmentCacheTest(CourseTestCase):
+    def fragment_sets(self, cache_mock):
+        return [c for c in cache_mock.set.call_args_list if c.args[0].startswith('fragment:')]
+
+    def test_fragment_follows_points(self):
+        self.client.login(username='testStudent', password='testPassword')
+        url = self.instance.get_url('results')
+        with mock.patch('exercise.templatetags.exercise.cache', wraps=cache) as cache_mock:
+            response = self.client.get(url)
+            sets = len(self.fragment_sets(cache_mock))
+            self.assertGreater(sets, 0)
+
+            response2 = self.client.get(url)
+            self.assertEqual(len(self.fragment_sets(cache_mock)), sets)
+            self.assertEqual(response.content, response2.content)
+
+            self.submission2.set_points(2, 2)
+            self.submission2.set_ready()
+            self.submission2.save()
+            self.client.get(url)
+            self.assertGreater(len(self.fragment_sets(cache_mock)), sets)
+
+    def test_fragment_hit_is_not_rendered(self):
+        self.client.login(username='testStudent', password='testPassword')
+        url = self.instance.get_url('results')
+        cold = self.client.get(url)
+        with mock.patch(
+                    'exercise.templatetags.exercise._fragment_timeout',
+                    wraps=_fragment_timeout,
+                ) as timeout_mock, \
+                mock.patch(
+                    'exercise.templatetags.exercise._get_toc',
+                    wraps=_get_toc,
+                ) as toc_mock:
+            warm = self.client.get(url)
+        # Neither the values of the fragments nor their expiry are computed
+        self.assertEqual(toc_mock.call_count, 0)
+        self.assertEqual(timeout_mock.call_count, 0)
+        self.assertEqual(cold.content, warm.content)
+
+    def test_fragment_is_shared_between_sessions(self):
+        url = self.instance.get_url('results')
+        self.client.login(username='testStudent', password='testPassword')
+        self.client.get(url)
+        other_client = self.client_class(enforce_csrf_checks=True)
+        other_client.login(username='testStudent', password='testPassword')
+        with mock.patch('exercise.templatetags.exercise.cache', wraps=cache) as cache_mock:
+            response = other_client.get(url)
+        self.assertEqual(self.fragment_sets(cache_mock), [])
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+
+class AssessmentQueueTest(CourseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_submission = Submission.objects.create(exercise=self.exercise)
+        self.user_submission.submitters.add(self.user.userprofile)
+
+    def test_best_submission_ids(self):
+        ids = best_submission_ids(self.exercise, [self.student.userprofile.id, self.user.userprofile.id])
+        for user in (self.student, self.user):
+            points = CachedPoints(self.instance, user, True)
+            self.assertEqual(
+                [ids[user.userprofile.id]],
+                points.submission_ids(exercise_id=self.exercise.id, best=True, fallback_to_last=True),
+            )
+
+    def test_claims(self):
+        entry = AssessmentQueue(self.exercise).claim_next(self.teacher.id)
+        self.assertEqual(entry, (self.student.userprofile.id, self.submission.id))
+        # The same assistant keeps the submitter
+        self.assertEqual(AssessmentQueue(self.exercise).claim_next(self.teacher.id), entry)
+
+        entry2 = AssessmentQueue(self.exercise).claim_next(self.user.id)
+        self.assertEqual(entry2, (self.user.userprofile.id, self.user_submission.id))
+        queue = AssessmentQueue(self.exercise)
+        self.assertIsNone(queue.claim_next(self.student.id))
+        self.assertTrue(queue.has_claims(self.student.id))
+
+        # Skipping releases the claim
+        queue.release(self.student.userprofile.id, self.teacher.id)
+        self.assertEqual(AssessmentQueue(self.exercise).claim_next(self.student.id), entry)
+
+    def test_skip(self):
+        queue = AssessmentQueue(self.exercise)
+        entry = queue.claim_next(self.teacher.id)
+        self.assertEqual(entry[0], self.student.userprofile.id)
+        queue.skip(self.student.userprofile.id, self.teacher.id)
+        queue.skip(self.student.userprofile.id, self.teacher.id)
+        self.assertEqual(queue.skipped_count(self.teacher.id), 1)
+
+        # The skipped submitter is released to the other assistants
+        queue = AssessmentQueue(self.exercise)
+        self.assertEqual(queue.claim_next(self.teacher.id)[0], self.user.userprofile.id)
+        queue.skip(self.user.userprofile.id, self.teacher.id)
+        self.assertIsNone(queue.claim_next(self.teacher.id))
+        self.assertEqual(AssessmentQueue(self.exercise).claim_next(self.student.id), entry)
+        queue.release(self.student.userprofile.id, self.student.id)
+
+        queue.reset_skipped(self.teacher.id)
+        self.assertEqual(queue.skipped_count(self.teacher.id), 0)
+        self.assertEqual(queue.claim_next(self.teacher.id), entry)
+
+    def test_progress(self):
+        queue = AssessmentQueue(self.exercise)
+        self.assertEqual(queue.progress(), (0, 2))
+        version = queue.snapshot['version']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.submission.grader = self.teacher.userprofile
+            self.submission.save()
+        queue = AssessmentQueue(self.exercise)
+        self.assertEqual(queue.snapshot['version'], version)
+        self.assertEqual(queue.progress(), (1, 2))
+        self.assertEqual(queue.claim_next(self.teacher.id), (self.user.userprofile.id, self.user_submission.id))
+
+        # A new submitter regenerates the queue
+        submission = Submission.objects.create(exercise=self.exercise)
+        submission.submitters.add(self.teacher.userprofile)
+        queue = AssessmentQueue(self.exercise)
+        self.assertNotEqual(queue.snapshot['version'], version)
+        self.assertEqual(queue.progress(), (1, 3))
+
+    def test_unchanged_saves_keep_queue(self):
+        version = AssessmentQueue(self.exercise).snapshot['version']
+        submission = Submission.objects.get(id=self.user_submission.id)
+        submission.feedback = "Feedback"
+        submission.save(update_fields=['feedback'])
+        self.assertEqual(AssessmentQueue(self.exercise).snapshot['version'], version)
+
+        # The grade of an unassessed submission may change the opened submission
+        submission.grade = 5
+        submission.save(update_fields=['grade'])
+        version2 = AssessmentQueue(self.exercise).snapshot['version']
+        self.assertNotEqual(version2, version)
+
+        # Saving an assessed submission marks its submitters assessed
+        # without regenerating the queue
+        submission.grader = self.teacher.userprofile
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.save()
+        queue = AssessmentQueue(self.exercise)
+        self.assertEqual(queue.snapshot['version'], version2)
+        self.assertFalse(queue.is_queued(self.user.userprofile.id))
+        with self.captureOnCommitCallbacks() as callbacks:
+            submission.assistant_feedback = "Feedback"
+            submission.save(update_fields=['assistant_feedback'])
+        self.assertEqual(callbacks, [])
+
+        # The submitters are not queried if the queue is not in the cache
+        AssessmentQueue.invalidate(self.exercise.id)
+        with self.assertNumQueries(0):
+            _mark_assessed(self.exercise.id, submission.id)
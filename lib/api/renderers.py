@@ -1,18 +1,76 @@
+import csv
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from rest_framework.renderers import BaseRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework_csv.renderers import CSVRenderer
 
 def remove_newlines(x):
     return x.replace('\n', ' ').replace('\r', '') if isinstance(x, str) else x
 
-class CSVExcelRenderer(CSVRenderer):
+
+class _LineBuffer:
+    """A file-like object for csv.writer that returns the written line."""
+    def write(self, value):
+        return value
+
+
+class StreamingCSVRenderer(CSVRenderer):
+    """
+    CSV renderer that can also render the rows one by one with `stream`.
+
+    `stream` requires the header to be known beforehand, so that the rows do
+    not need to be gathered in memory. The normal `render` still works for
+    responses that are not streamed.
+    """
+    bom = False
+    file_extension = 'csv'
+
+    def get_writer_opts(self, renderer_context: Dict[str, Any]) -> Dict[str, Any]:
+        return renderer_context.get('writer_opts', self.writer_opts or {})
+
+    def stream(
+            self,
+            rows: Iterable[Dict[str, Any]],
+            header: List[str],
+            renderer_context: Optional[Dict[str, Any]] = None,
+            ) -> Iterator[bytes]:
+        renderer_context = renderer_context or {}
+        encoding = renderer_context.get('encoding', settings.DEFAULT_CHARSET)
+        labels = renderer_context.get('labels', self.labels)
+        writer = csv.writer(_LineBuffer(), **self.get_writer_opts(renderer_context))
+        if self.bom:
+            yield '\uFEFF'.encode(encoding)
+        yield writer.writerow([labels.get(x, x) for x in header] if labels else header).encode(encoding)
+        for item in rows:
+            flat_item = self.flatten_item(item)
+            yield writer.writerow([flat_item.get(key) for key in header]).encode(encoding)
+
+
+class CSVExcelRenderer(StreamingCSVRenderer):
     format = 'excel.csv'
     writer_opts = { 'delimiter': settings.EXCEL_CSV_DEFAULT_DELIMITER }
+    bom = True
 
     def flatten_item(self, item):
         "Remove newlines from the item in addition to flattening"
         flat_item = super().flatten_item(item)
         return {k: remove_newlines(v) for k, v in flat_item.items()}
 
+    def get_writer_opts(self, renderer_context):
+        "Extract sep from GET parameters if specified"
+        if 'request' in renderer_context and 'writer_opts' not in renderer_context:
+            get = renderer_context['request'].GET
+            if 'sep' in get:
+                return { 'delimiter': get['sep'] }
+        return super().get_writer_opts(renderer_context)
+
     # pylint: disable-next=dangerous-default-value
     def render(self, data, media_type=None, renderer_context={}, writer_opts=None):
         "Extract sep from GET parameters if specified"
@@ -25,3 +83,64 @@ class CSVExcelRenderer(CSVRenderer):
                 renderer_context.update(new_writer_opts)
         response = super().render(data, media_type, renderer_context, writer_opts)
         return '\uFEFF'.encode('UTF-8') + response
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders a list of objects as newline delimited JSON, one object per line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+    encoder_class = JSONEncoder
+    file_extension = 'ndjson'
+
+    def dumps(self, item: Any) -> bytes:
+        return json.dumps(item, cls=self.encoder_class, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return b''.join(self.dumps(item) for item in data)
+
+    def stream(
+            self,
+            rows: Iterable[Dict[str, Any]],
+            header: List[str], # pylint: disable=unused-argument
+            renderer_context: Optional[Dict[str, Any]] = None, # pylint: disable=unused-argument
+            ) -> Iterator[bytes]:
+        for item in rows:
+            yield self.dumps(item)
+
+
+def streaming_response(
+        view: Any,
+        request: Request,
+        rows: Iterable[Dict[str, Any]],
+        header: List[str],
+        filename: Optional[str] = None,
+        ) -> HttpResponseBase:
+    """
+    Returns the rows as a streaming response if the accepted renderer supports
+    it, and as a normal REST framework response otherwise.
+
+    The rows are consumed lazily by the streaming renderers, so the rows may
+    be produced by a generator. The header is written before any rows.
+    `filename` is given without the extension, which depends on the renderer.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if not hasattr(renderer, 'stream'):
+        view.renderer_fields = header
+        return Response(list(rows))
+
+    renderer_context = view.get_renderer_context()
+    content_type = request.accepted_media_type or renderer.media_type
+    response = StreamingHttpResponse(
+        renderer.stream(rows, header, renderer_context),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{renderer.file_extension}"'
+    return response
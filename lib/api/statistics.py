@@ -1,10 +1,17 @@
 from datetime import timedelta
+from typing import Any, Dict
 
 from rest_framework import generics
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django.db.models import QuerySet
 from django.utils import timezone
 
-from exercise.submission_models import Submission
+from exercise.submission_models import Submission, SubmissionStatistics
+from lib.querystats import clear_samples, get_samples
 from .serializers import StatisticsSerializer
 
 
@@ -28,6 +35,10 @@ class BaseStatisticsView(generics.RetrieveAPIView):
           of time window we are interested in. Default: now.
         - `starttime`: date and time in ISO 8601 format indicating the start point
           of time window we are interested in. Default: one day before endtime
+
+    The whole hours of the time window are read from the hourly rollups
+    (`SubmissionStatistics`), and only the partial hours at the edges are
+    counted from the submissions.
     """
     serializer_class = StatisticsSerializer
 
@@ -43,12 +54,54 @@ class BaseStatisticsView(generics.RetrieveAPIView):
 
         return queryset.filter(submission_time__range=[self.starttime, self.endtime])
 
+    def get_rollup_scope(self) -> Dict[str, Any]:
+        """Returns the keyword arguments that select the rollups of this view."""
+        return {}
+
     def get_object(self):
         qs = self.get_queryset()
+        submission_count, submitters = SubmissionStatistics.objects.get_statistics(
+            qs,
+            self.starttime,
+            self.endtime,
+            **self.get_rollup_scope(),
+        )
         obj = {
             'starttime': self.starttime,
             'endtime': self.endtime,
-            'submission_count': qs.count(),
-            'submitters': qs.values('submitters').distinct().count()
+            'submission_count': submission_count,
+            'submitters': submitters,
         }
         return obj
+
+
+class QueryStatsView(APIView):
+    """
+    Returns the sampled SQL query and cache call statistics of each view,
+    recorded by `lib.querystats.QueryStatsMiddleware` when QUERY_STATS_ENABLED
+    is set. Only staff users can access this.
+
+    Operations
+    ----------
+
+    `GET /query-stats/`:
+        returns the statistics of each view, the views with the most queries
+        per request first. The attributes of each view are `view`, `requests`,
+        `avg_queries`, `max_queries`, `avg_sql_ms`, `avg_cache_calls` and
+        `duplicates` (the most repeated queries).
+
+    `DELETE /query-stats/`:
+        clears the statistics.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> Response: # pylint: disable=unused-argument
+        return Response({
+            'enabled': settings.QUERY_STATS_ENABLED,
+            'sample_rate': settings.QUERY_STATS_SAMPLE_RATE,
+            'views': get_samples(),
+        })
+
+    def delete(self, request: Request, *args: Any, **kwargs: Any) -> Response: # pylint: disable=unused-argument
+        clear_samples()
+        return Response(status=204)
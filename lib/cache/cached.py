@@ -27,7 +27,7 @@ from typing import (
     Union,
 )
 import logging
-import sys
+import re
 
 from django.db.models import Model
 from django.db.models.signals import ModelSignal
@@ -259,6 +259,11 @@ else:
         """Add the field to the cache separately for each object in the inheritance tree"""
 
 
+_special_annotations = {NoCache: 'NoCache', Varies: 'Varies', ClassVar: 'ClassVar'}
+# Matches e.g. "NoCache[List[int]]" and "typing.ClassVar[int]"
+_special_annotation_re = re.compile(r"\s*(?:[\w.]+\.)?(NoCache|Varies|ClassVar|InitVar)\[(.*)\]\s*$", re.DOTALL)
+
+
 def get_cache_fields(cls) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
     if not hasattr(cls, "__dict__"):
         return (), ()
@@ -271,30 +276,31 @@ def get_cache_fields(cls) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
     varying_fields = set()
 
     annotations = cls.__dict__.get('__annotations__', {})
-    if annotations:
-        m_globals = sys.modules[cls.__module__].__dict__.copy()
-        m_globals[cls.__name__] = cls
-        for k, ty in annotations.items():
-            # get_type_hints returns base class annotations as well but we dont want those.
-            # That also causes issues when the baseclasses use types that aren't imported
-            # in the current class' module. Easier to just resolve the types ourselves.
-            # This is how typing._eval_type resolves the type annotations
-            if ty is None:
-                ty = type(None)
-            if isinstance(ty, str):
-                # pylint: disable-next=eval-used
-                ty = eval(ty, m_globals, cls.__dict__)
-
+    for k, ty in annotations.items():
+        # get_type_hints returns base class annotations as well but we dont want those.
+        # It would also evaluate every annotation of the class, which is slow at
+        # import time. Only the outermost type matters here, so string annotations
+        # are classified by their name without evaluating them.
+        if isinstance(ty, str):
+            match = _special_annotation_re.match(ty)
+            name = match.group(1) if match else None
+            inner = match.group(2) if match else None
+        else:
             origin = get_origin(ty)
-            if origin is NoCache:
-                nocache_fields.add(k)
-                # Remove NoCache from annotations
-                cls.__annotations__[k] = get_args(ty)[0]
-            elif origin is not ClassVar and not isinstance(ty, InitVar):
-                # Add non-NoCache and non-ClassVar to cached fields list
-                cached_fields.add(k)
-                if origin is Varies:
-                    varying_fields.add(k)
+            name = _special_annotations.get(origin)
+            if origin is None and isinstance(ty, InitVar):
+                name = 'InitVar'
+            inner = get_args(ty)[0] if name == 'NoCache' else None
+
+        if name == 'NoCache':
+            nocache_fields.add(k)
+            # Remove NoCache from annotations
+            cls.__annotations__[k] = inner
+        elif name not in ('ClassVar', 'InitVar'):
+            # Add non-NoCache and non-ClassVar to cached fields list
+            cached_fields.add(k)
+            if name == 'Varies':
+                varying_fields.add(k)
 
     # Add the cache fields from parents that aren't loaded separately
     parents = cls.__dict__.get("_parents", ())
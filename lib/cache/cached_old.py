@@ -1,6 +1,6 @@
 from datetime import datetime
 from time import time
-from typing import Generic, Optional, TypeVar
+from typing import Any, Generic, List, Optional, Sequence, Tuple, Type, TypeVar
 import logging
 
 from django.core.cache import cache
@@ -10,6 +10,7 @@ logger = logging.getLogger('aplus.cached')
 
 
 DataType = TypeVar("DataType")
+CachedT = TypeVar("CachedT", bound="CachedAbstract")
 class CachedAbstract(Generic[DataType]):
     KEY_PREFIX = 'abstract'
     data: DataType
@@ -32,6 +33,82 @@ class CachedAbstract(Generic[DataType]):
         cache.set(cache_key, (None, time()), 60*60)
         # TODO: flush old version cache automatically
 
+    @classmethod
+    # pylint: disable-next=dangerous-default-value
+    def invalidate_many(cls, models_list: Sequence[Sequence[Any]], modifiers=[]):
+        """Invalidate the cached data of each models tuple with a single cache operation"""
+        if not models_list:
+            return
+        invalidated = (None, time())
+        items = {cls._key(*models, modifiers=modifiers): invalidated for models in models_list}
+        logger.debug("Invalidating cached data for %s", list(items))
+        cache.set_many(items, 60*60)
+
+    @classmethod
+    def get_many( # pylint: disable=dangerous-default-value
+            cls: Type[CachedT],
+            models_list: Sequence[Sequence[Any]],
+            modifiers=[],
+            ) -> List[CachedT]:
+        """
+        Returns the cached objects for each models tuple, in the same order.
+        CachedStudent.get_many([(instance, user1), (instance, user2)]) is
+        equivalent to [CachedStudent(instance, user1), CachedStudent(instance, user2)],
+        except that the cached data is fetched with a single cache.get_many()
+        and the missing data is generated with a single call to _generate_many().
+
+        The constructor of the class is not called.
+        """
+        objs = []
+        for models in models_list:
+            obj = cls.__new__(cls)
+            obj.__models = tuple(models)
+            obj.__cache_key = cls._key(*models, modifiers=modifiers)
+            objs.append(obj)
+
+        raw_items = cache.get_many([obj.__cache_key for obj in objs])
+        missing = []
+        for obj in objs:
+            updated, data = cls.__split(raw_items.get(obj.__cache_key))
+            if updated is None:
+                data = None
+            obj.data = data
+            if obj._needs_generation(data):
+                missing.append(obj)
+        if not missing:
+            return objs
+
+        gen_start = time()
+        logger.debug(
+            "Generating cached data for %d keys of %s with ts %s",
+            len(missing),
+            cls.__name__,
+            str(datetime.fromtimestamp(gen_start)),
+        )
+        generated = missing[0]._generate_many(
+            [obj.__models for obj in missing],
+            [obj.data for obj in missing],
+        )
+
+        # Store the generated data unless another process invalidated or
+        # updated the value during the generation time. See __get_data().
+        current_items = cache.get_many([obj.__cache_key for obj in missing])
+        new_items = {}
+        for obj, data in zip(missing, generated):
+            key = obj.__cache_key
+            current = current_items.get(key)
+            curr_updated, curr_data = cls.__split(current)
+            if current == raw_items.get(key) or (curr_updated is not None and curr_updated <= gen_start):
+                new_items[key] = (gen_start, data)
+            elif curr_updated is not None:
+                data = curr_data
+            obj.data = data
+        if new_items:
+            failed = cache.set_many(new_items, None)
+            if failed:
+                logger.error("Failed to store values to the cache %s. They might be too big!", failed)
+        return objs
+
     def __init__(self, *models, modifiers=[]): # pylint: disable=dangerous-default-value
         self.__models = models
         self.__cache_key = self.__class__._key(*models, modifiers=modifiers)
@@ -134,8 +211,24 @@ class CachedAbstract(Generic[DataType]):
             # check-and-set (CAS), which is not supported by Django
         return data
 
+    @staticmethod
+    def __split(raw: Any) -> Tuple[Optional[float], Any]:
+        return raw if isinstance(raw, tuple) and len(raw) == 2 else (None, None)
+
     def _needs_generation(self, data):
         return data is None
 
     def _generate_data(self, *models, data: Optional[DataType] = None) -> DataType:
         raise NotImplementedError("Subclass of CachedAbstract needs to implement _generate_data")
+
+    def _generate_many(
+            self,
+            models_list: List[Tuple[Any, ...]],
+            data_list: List[Optional[DataType]],
+            ) -> List[DataType]:
+        """Generate the data for each models tuple for get_many(). Override this
+        to generate the data with fewer database queries."""
+        return [
+            self._generate_data(*models, data=data)
+            for models, data in zip(models_list, data_list)
+        ]
@@ -27,8 +27,9 @@ def mock_get_many(keys):
         if k in mock_cache
     }
 
-def mock_set_many(items):
+def mock_set_many(items, timeout=None): # pylint: disable=unused-argument
     mock_cache.update(items)
+    return []
 
 def mock_add(key, value, timeout=None): # pylint: disable=unused-argument
     if key not in mock_cache:
@@ -272,6 +273,21 @@ class TestCached(CachedAbstract):
         return self._fake_func(data)
 
 
+class TestCachedMany(CachedAbstract):
+
+    __test__ = False
+
+    KEY_PREFIX = "testmany"
+    generated = []
+
+    def _generate_many(self, models_list, data_list):
+        self.generated.append(models_list)
+        return super()._generate_many(models_list, data_list)
+
+    def _generate_data(self, *models, data=None):
+        return sum(models)
+
+
 @cache_patcher('cached_old')
 class CachedTest(SimpleTestCase):
     def setUp(self):
@@ -388,3 +404,21 @@ class CachedTest(SimpleTestCase):
         # thread 3 reads data from thread 2
         cached3 = TestCached(lambda x: "Ignored data")
         self.assertEqual(cached3.data, data2)
+
+    def test_get_many(self):
+        """
+        get_many should generate the missing data in one call and cache it
+        """
+        TestCachedMany.generated = []
+        cached = TestCachedMany.get_many([(1, 2), (3, 4)])
+        self.assertEqual([c.data for c in cached], [3, 7])
+        self.assertEqual(TestCachedMany.generated, [[(1, 2), (3, 4)]])
+
+        cached = TestCachedMany.get_many([(3, 4), (5, 6), (1, 2)])
+        self.assertEqual([c.data for c in cached], [7, 11, 3])
+        self.assertEqual(TestCachedMany.generated[1:], [[(5, 6)]])
+
+        TestCachedMany.invalidate_many([(1, 2), (5, 6)])
+        cached = TestCachedMany.get_many([(1, 2), (3, 4), (5, 6)])
+        self.assertEqual([c.data for c in cached], [3, 7, 11])
+        self.assertEqual(TestCachedMany.generated[2:], [[(1, 2), (5, 6)]])
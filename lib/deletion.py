@@ -0,0 +1,116 @@
+"""
+Deleting large numbers of rows in small batches.
+
+One queryset.delete() over a large table holds its locks for the whole
+delete, including the cascades, and writes all of it to the WAL at once.
+delete_in_batches() selects the primary keys of the rows to delete in
+ascending order and deletes them one batch per transaction, optionally
+pausing between the batches so that other queries can proceed.
+
+Each batch continues from the last deleted primary key, so an interrupted
+run can be resumed from the primary key it last reported. The rows are
+deleted with queryset.filter(pk__in=...).delete(), so the filters of the
+queryset are checked again for each batch and the cascades and the signals
+work like with queryset.delete().
+
+Management commands add the common options with add_batch_arguments() and
+pass the parsed options to delete_in_batches() with batch_options().
+"""
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import QuerySet
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class DeletionProgress:
+    """The numbers of the deleted rows so far, and where to resume from"""
+    batches: int
+    deleted: int
+    deleted_by_type: Counter
+    last_pk: Any
+
+    def __init__(self, last_pk: Any = None) -> None:
+        self.batches = 0
+        self.deleted = 0
+        self.deleted_by_type = Counter()
+        self.last_pk = last_pk
+
+
+def delete_in_batches(
+        queryset: QuerySet,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        pause: float = 0,
+        start_after: Any = None,
+        progress: Optional[Callable[[DeletionProgress], None]] = None,
+        ) -> DeletionProgress:
+    """
+    Deletes the rows of the queryset in batches of `batch_size` rows in
+    primary key order, sleeping `pause` seconds between the batches. The
+    rows whose primary key is at most `start_after` are skipped. The progress
+    callback is called after each batch.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch size must be a positive integer.")
+    state = DeletionProgress(start_after)
+    queryset = queryset.order_by('pk')
+    while True:
+        remaining = queryset if state.last_pk is None else queryset.filter(pk__gt=state.last_pk)
+        pks = list(remaining.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return state
+        if state.batches and pause:
+            time.sleep(pause)
+        with transaction.atomic():
+            _, deleted_by_type = queryset.filter(pk__in=pks).delete()
+        state.batches += 1
+        state.deleted_by_type.update(deleted_by_type)
+        state.deleted = sum(state.deleted_by_type.values())
+        state.last_pk = pks[-1]
+        if progress is not None:
+            progress(state)
+        if len(pks) < batch_size:
+            return state
+
+
+def add_batch_arguments(parser: Any, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+    """Adds the options of delete_in_batches() to a management command"""
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=batch_size,
+        metavar='N',
+        help=f"Delete N rows in each transaction. By default, {batch_size}.",
+    )
+    parser.add_argument(
+        '--pause',
+        type=float,
+        default=0,
+        metavar='SECONDS',
+        help="Sleep the given number of seconds between the batches. By default, 0.",
+    )
+    parser.add_argument(
+        '--start-after',
+        type=int,
+        metavar='ID',
+        help="Resume an interrupted run: skip the rows whose id is at most the given id. "
+             "The id is reported after each batch.",
+    )
+
+
+def batch_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the keyword arguments of delete_in_batches() from the command options"""
+    if options['batch_size'] < 1:
+        raise CommandError("'--batch-size' must be a positive integer.")
+    if options['pause'] < 0:
+        raise CommandError("'--pause' must not be negative.")
+    return {
+        'batch_size': options['batch_size'],
+        'pause': options['pause'],
+        'start_after': options['start_after'],
+    }
@@ -0,0 +1,121 @@
+"""
+Opt-in profiling of sampled requests.
+
+When PROFILER_ENABLED is set, ProfilerMiddleware profiles a fraction of the
+requests (PROFILER_SAMPLE_RATE) and the requests of staff users that have the
+X-Aplus-Profile header. Each profiled request is written to PROFILER_DIR as
+a cProfile dump (.prof) with the request metadata next to it (.json).
+
+The dumps are aggregated per view with `manage.py profile_report`.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+
+
+logger = logging.getLogger('aplus.profiler')
+
+PROFILE_HEADER = 'HTTP_X_APLUS_PROFILE'
+
+
+def should_profile(request: HttpRequest) -> bool:
+    if request.META.get(PROFILE_HEADER):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+    return random.random() < settings.PROFILER_SAMPLE_RATE
+
+
+def get_metadata(request: HttpRequest, response: HttpResponse) -> Dict[str, Any]:
+    match = request.resolver_match
+    kwargs = match.kwargs if match else {}
+    instance = None
+    if 'course_slug' in kwargs and 'instance_slug' in kwargs:
+        instance = f"{kwargs['course_slug']}/{kwargs['instance_slug']}"
+    return {
+        'view': match.view_name if match else 'unresolved',
+        'instance': instance,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'time': timezone.now().isoformat(),
+    }
+
+
+def write_profile(profile: cProfile.Profile, metadata: Dict[str, Any]) -> str:
+    """Writes the profile and its metadata to PROFILER_DIR and returns the
+    path of the profile without the extension."""
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(settings.PROFILER_DIR, name)
+    profile.dump_stats(path + '.prof')
+    with open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f)
+    return path
+
+
+def read_profiles(directory: str) -> Iterator[Tuple[Dict[str, Any], str]]:
+    """Yields the metadata and the profile path of each dump in the directory.
+    Nothing is yielded if the directory does not exist yet."""
+    if not os.path.isdir(directory):
+        return
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(directory, filename[:-len('.json')])
+        if not os.path.exists(path + '.prof'):
+            continue
+        try:
+            with open(path + '.json', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        yield metadata, path + '.prof'
+
+
+def group_profiles(directory: str) -> Dict[str, List[Tuple[Dict[str, Any], str]]]:
+    views: Dict[str, List[Tuple[Dict[str, Any], str]]] = {}
+    for metadata, path in read_profiles(directory):
+        views.setdefault(metadata['view'], []).append((metadata, path))
+    return views
+
+
+class ProfilerMiddleware:
+    """Middleware that profiles sampled requests when PROFILER_ENABLED is set."""
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.PROFILER_ENABLED or not should_profile(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return self.get_response(request)
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+
+        metadata = get_metadata(request, response)
+        metadata['wall_ms'] = (time.perf_counter() - start) * 1000
+        metadata['cpu_ms'] = (time.process_time() - cpu_start) * 1000
+        try:
+            write_profile(profile, metadata)
+        except OSError:
+            logger.exception("Could not write the profile of %s", request.path)
+        return response
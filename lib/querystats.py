@@ -0,0 +1,235 @@
+"""
+Records the SQL queries and cache calls made while handling a request.
+
+QueryStatsMiddleware records every request when QUERY_STATS_ENABLED is set.
+The statistics are logged to the `aplus.querystats` logger, returned to
+staff users in the X-Aplus-Query-Stats response header, and a sample of the
+requests (QUERY_STATS_SAMPLE_RATE) is aggregated per view for the
+query-stats API.
+
+record_stats() can also be used directly, e.g. in tests to assert the number
+of queries a view makes (see CourseTestCase.assertQueryBudget).
+"""
+from __future__ import annotations
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+
+logger = logging.getLogger('aplus.querystats')
+
+SAMPLES_CACHE_KEY = 'querystats:views'
+SAMPLES_LOCK_KEY = 'querystats:views:lock'
+# Seconds after which the lock expires if the process holding it died
+SAMPLES_LOCK_TIMEOUT = 10
+# The cache methods that make a round-trip to the cache server
+CACHE_METHODS = (
+    'add', 'get', 'set', 'touch', 'delete', 'has_key', 'incr', 'decr',
+    'get_many', 'set_many', 'delete_many', 'clear',
+)
+# Number of most repeated query fingerprints kept in the statistics
+MAX_DUPLICATES = 5
+
+_in_list_re = re.compile(r'\((?:%s, )+%s\)')
+_whitespace_re = re.compile(r'\s+')
+
+
+def fingerprint(sql: str) -> str:
+    """Returns the SQL without its parameters and with IN lists collapsed, so
+    that the same query made for different rows has the same fingerprint."""
+    return _whitespace_re.sub(' ', _in_list_re.sub('(...)', sql)).strip()
+
+
+class RequestStats:
+    queries: int
+    sql_time: float
+    cache_calls: int
+    fingerprints: Counter[str]
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cache_calls = 0
+        self.fingerprints = Counter()
+        self._in_cache_call = False
+
+    def __call__(self, execute, sql, params, many, context): # pylint: disable=too-many-arguments
+        """The database execute wrapper"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def count_cache_calls(self, method: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            # Cache backends may implement their methods using the other
+            # methods (e.g. get_many with get), which is a single call
+            if self._in_cache_call:
+                return method(*args, **kwargs)
+            self._in_cache_call = True
+            self.cache_calls += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._in_cache_call = False
+        return wrapper
+
+    @property
+    def duplicates(self) -> List[Tuple[str, int]]:
+        """The most repeated queries that were made more than once"""
+        return [
+            (sql, count)
+            for sql, count in self.fingerprints.most_common(MAX_DUPLICATES)
+            if count > 1
+        ]
+
+    @property
+    def duplicate_count(self) -> int:
+        return sum(count - 1 for count in self.fingerprints.values())
+
+    def header(self) -> str:
+        return (
+            f"queries={self.queries}; sql-ms={self.sql_time * 1000:.1f}; "
+            f"duplicates={self.duplicate_count}; cache={self.cache_calls}"
+        )
+
+
+@contextmanager
+def _patch_caches(stats: RequestStats) -> Iterator[None]:
+    # Cache backend objects are thread specific, so the patched methods are
+    # only seen by the current request
+    patched = []
+    for backend in caches.all():
+        for name in CACHE_METHODS:
+            patched.append((backend, name, backend.__dict__.get(name)))
+            setattr(backend, name, stats.count_cache_calls(getattr(backend, name)))
+    try:
+        yield
+    finally:
+        for backend, name, previous in reversed(patched):
+            if previous is None:
+                delattr(backend, name)
+            else:
+                setattr(backend, name, previous)
+
+
+@contextmanager
+def record_stats() -> Iterator[RequestStats]:
+    """Records the queries of all database connections and the cache calls
+    made inside the with block."""
+    stats = RequestStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        stack.enter_context(_patch_caches(stats))
+        yield stats
+
+
+def add_sample(view_name: str, stats: RequestStats) -> None:
+    """Adds the statistics of a request to the samples of the view.
+
+    The samples are read and written under a lock taken with cache.add, which
+    is atomic, so concurrent requests do not overwrite each other's samples.
+    If another request holds the lock, the sample is dropped instead of
+    waiting for it."""
+    if not cache.add(SAMPLES_LOCK_KEY, True, SAMPLES_LOCK_TIMEOUT):
+        return
+    try:
+        _add_sample(view_name, stats)
+    finally:
+        cache.delete(SAMPLES_LOCK_KEY)
+
+
+def _add_sample(view_name: str, stats: RequestStats) -> None:
+    samples = cache.get(SAMPLES_CACHE_KEY) or {}
+    sample = samples.setdefault(view_name, {
+        'requests': 0,
+        'queries': 0,
+        'max_queries': 0,
+        'sql_time': 0.0,
+        'cache_calls': 0,
+        'duplicates': {},
+    })
+    sample['requests'] += 1
+    sample['queries'] += stats.queries
+    sample['max_queries'] = max(sample['max_queries'], stats.queries)
+    sample['sql_time'] += stats.sql_time
+    sample['cache_calls'] += stats.cache_calls
+    duplicates = Counter(sample['duplicates'])
+    duplicates.update(dict(stats.duplicates))
+    sample['duplicates'] = dict(duplicates.most_common(MAX_DUPLICATES))
+    cache.set(SAMPLES_CACHE_KEY, samples, None)
+
+
+def get_samples() -> List[Dict[str, Any]]:
+    """Returns the sampled statistics of each view, the views with the most
+    queries per request first."""
+    samples = cache.get(SAMPLES_CACHE_KEY) or {}
+    views = []
+    for view_name, sample in samples.items():
+        requests = sample['requests']
+        views.append({
+            'view': view_name,
+            'requests': requests,
+            'avg_queries': sample['queries'] / requests,
+            'max_queries': sample['max_queries'],
+            'avg_sql_ms': sample['sql_time'] * 1000 / requests,
+            'avg_cache_calls': sample['cache_calls'] / requests,
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in sample['duplicates'].items()
+            ],
+        })
+    views.sort(key=lambda v: v['avg_queries'], reverse=True)
+    return views
+
+
+def clear_samples() -> None:
+    cache.delete(SAMPLES_CACHE_KEY)
+
+
+class QueryStatsMiddleware:
+    """Middleware that records the queries and cache calls of each request
+    when QUERY_STATS_ENABLED is set."""
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.QUERY_STATS_ENABLED:
+            return self.get_response(request)
+
+        with record_stats() as stats:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        if stats.queries > settings.QUERY_STATS_LOG_THRESHOLD:
+            logger.warning(
+                "%s %s: %s, most repeated: %s",
+                request.method,
+                view_name,
+                stats.header(),
+                stats.duplicates,
+            )
+        else:
+            logger.debug("%s %s: %s", request.method, view_name, stats.header())
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['X-Aplus-Query-Stats'] = stats.header()
+
+        if random.random() < settings.QUERY_STATS_SAMPLE_RATE:
+            add_sample(view_name, stats)
+        return response
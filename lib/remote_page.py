@@ -1,11 +1,11 @@
+from __future__ import annotations
 import logging
 import posixpath
 import re
 import time
-from typing import Mapping, Optional, Sequence, Tuple
+from typing import Mapping, Optional, Sequence, Tuple, TYPE_CHECKING
 from urllib.parse import urlparse, urljoin
 
-from bs4 import BeautifulSoup, Tag
 import requests
 from requests.models import Response
 
@@ -17,6 +17,9 @@ from django.utils.translation import gettext_lazy as _
 
 from aplus_auth.requests import post as aplus_post, get as aplus_get
 
+if TYPE_CHECKING:
+    from bs4 import Tag
+
 
 logger = logging.getLogger('aplus.remote_page')
 
@@ -125,6 +128,8 @@ class RemotePage:
         self.url = urlparse(url)
         self.response = request_for_response(url, post, data, files, stamp, instance_id)
         self.response.encoding = "utf-8"
+        # bs4 is imported here, because it is slow to import at startup
+        from bs4 import BeautifulSoup # pylint: disable=import-outside-toplevel
         self.soup = BeautifulSoup(self.response.text, 'html5lib')
 
     def base_address(self):
@@ -1,4 +1,7 @@
+from contextlib import contextmanager
 from datetime import timedelta
+from typing import Iterator
+
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.test import TestCase
@@ -15,6 +18,7 @@ from exercise.models import (
     StaticExercise,
     Submission,
 )
+from lib.querystats import RequestStats, record_stats
 
 
 class CourseTestCase(TestCase):
@@ -167,3 +171,31 @@ class CourseTestCase(TestCase):
         )
         self.submission3.submitters.add(self.student.userprofile)
         self.submission3.submitters.add(self.user.userprofile)
+
+    @classmethod
+    def setUpStudents(cls, count):
+        """Enrolls `count` more students who each have a submission in
+        exercise and exercise2, to test views with a course of realistic size."""
+        for i in range(count):
+            user = User.objects.create(username=f'testStudent{i}')
+            cls.instance.enroll_student(user)
+            for exercise in (cls.exercise, cls.exercise2):
+                submission = Submission.objects.create(
+                    exercise=exercise,
+                    submission_data={'submission': i},
+                )
+                submission.submitters.add(user.userprofile)
+                submission.set_points(1, 2)
+                submission.set_ready()
+                submission.save()
+
+    @contextmanager
+    def assertQueryBudget(self, queries: int) -> Iterator[RequestStats]:
+        """Fails if the with block makes more than `queries` SQL queries."""
+        with record_stats() as stats:
+            yield stats
+        self.assertLessEqual(
+            stats.queries,
+            queries,
+            f"{stats.queries} queries, the budget is {queries}. Most repeated: {stats.duplicates}",
+        )
@@ -1,9 +1,21 @@
+import os
+import tempfile
+from io import StringIO
 from typing import Optional
 
-from django.test import SimpleTestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.http import HttpResponse
 
+from exercise.models import CourseChapter
+from .api.renderers import CSVExcelRenderer, NDJSONRenderer, StreamingCSVRenderer
+from .deletion import delete_in_batches
+from .profiler import read_profiles
+from .querystats import clear_samples, fingerprint, get_samples, record_stats
 from .request_globals import RequestGlobal
+from .testdata import CourseTestCase
 
 
 class TestGlobal(RequestGlobal):
@@ -69,3 +81,210 @@ class RequestGlobalTest(SimpleTestCase):
     def test_init_called(self):
         obj = TestGlobal()
         self.assertEqual(obj.test, "test")
+
+
+class StreamingRendererTest(SimpleTestCase):
+    header = ['a', 'b', 'c']
+
+    def rows(self):
+        yield {'a': 1, 'b': 'x\ny'}
+        yield {'a': 2, 'c': 'z'}
+
+    def test_csv_stream_matches_render(self):
+        renderer = StreamingCSVRenderer()
+        streamed = b''.join(renderer.stream(self.rows(), self.header))
+        rendered = renderer.render(list(self.rows()), renderer_context={'header': self.header})
+        self.assertEqual(streamed, rendered)
+
+    def test_csv_stream_yields_header_first(self):
+        chunks = StreamingCSVRenderer().stream(iter(()), self.header)
+        self.assertEqual(next(chunks), b'a,b,c\r\n')
+        self.assertEqual(list(chunks), [])
+
+    def test_excel_csv_stream(self):
+        request = RequestFactory().get('/', {'sep': '|'})
+        streamed = b''.join(CSVExcelRenderer().stream(self.rows(), self.header, {'request': request}))
+        self.assertEqual(streamed, '\uFEFFa|b|c\r\n1|x y|\r\n2||z\r\n'.encode('utf-8'))
+
+    def test_ndjson_stream(self):
+        lines = list(NDJSONRenderer().stream(self.rows(), self.header))
+        self.assertEqual(lines, [b'{"a": 1, "b": "x\\ny"}\n', b'{"a": 2, "c": "z"}\n'])
+
+
+class QueryStatsTest(CourseTestCase):
+
+    def test_fingerprint_collapses_in_lists(self):
+        self.assertEqual(
+            fingerprint('SELECT "id" FROM "a" WHERE "id" IN (%s, %s, %s)'),
+            fingerprint('SELECT "id" FROM "a" WHERE "id" IN (%s, %s)'),
+        )
+
+    @override_settings(QUERY_STATS_ENABLED=True, QUERY_STATS_SAMPLE_RATE=1)
+    def test_middleware(self):
+        clear_samples()
+        User.objects.create_user(username='staff', password='staffPassword', is_staff=True)
+        self.client.login(username='testStudent', password='testPassword')
+        response = self.client.get(self.instance.get_absolute_url())
+        self.assertNotIn('X-Aplus-Query-Stats', response)
+        self.client.login(username='staff', password='staffPassword')
+        response = self.client.get(self.instance.get_absolute_url())
+        self.assertIn('queries=', response['X-Aplus-Query-Stats'])
+        samples = {sample['view']: sample for sample in get_samples()}
+        self.assertEqual(samples['course']['requests'], 2)
+        self.assertGreater(samples['course']['avg_queries'], 0)
+
+        response = self.client.get('/api/v2/query-stats/')
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetTest(CourseTestCase):
+    """The number of queries of the main views must not grow with the number
+    of students and submissions in the course."""
+
+    def get_requests(self):
+        # The submission redirects to the submission page
+        return [
+            ('testStudent', 'get', self.instance.get_absolute_url(), 200),
+            ('testStudent', 'get', self.module.get_absolute_url(), 200),
+            ('testStudent', 'get', self.exercise.get_absolute_url(), 200),
+            ('testStudent', 'post', self.exercise.get_absolute_url(), 302),
+            ('testStudent', 'get', self.instance.get_url('results'), 200),
+            ('testTeacher', 'get', self.instance.get_url('participants'), 200),
+            ('testTeacher', 'get', self.instance.get_url('all-submissions'), 200),
+        ]
+
+    def request(self, username, method, url, status):
+        self.client.login(username=username, password='testPassword')
+        response = getattr(self.client, method)(url)
+        # An error page or a redirect to the login makes fewer queries, so
+        # the budget would not mean anything
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_queries_do_not_grow_with_course_size(self):
+        budgets = []
+        for request in self.get_requests():
+            # The first request fills the caches
+            self.request(*request)
+            with record_stats() as stats:
+                self.request(*request)
+            budgets.append(stats.queries)
+
+        self.setUpStudents(30)
+
+        for request, budget in zip(self.get_requests(), budgets):
+            with self.subTest(method=request[1], url=request[2]):
+                self.request(*request)
+                with self.assertQueryBudget(budget):
+                    self.request(*request)
+
+
+class LargeCourseQueryBudgetTest(CourseTestCase):
+    """The key views must stay within their query budgets in a course with
+    hundreds of students and submissions, both when the caches are empty
+    and when they are filled."""
+    STUDENTS = 300
+    # The (cold cache, warm cache) query budgets of each request
+    BUDGETS = {
+        'front page': (70, 25),
+        'chapter': (70, 25),
+        'exercise': (70, 30),
+        'exercise submit': (100, 70),
+        'results': (70, 25),
+        'participants': (70, 25),
+        'all submissions': (80, 35),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.chapter = CourseChapter.objects.create(
+            name="Test Chapter",
+            course_module=cls.module,
+            category=cls.category,
+            url="c1",
+        )
+        cls.setUpStudents(cls.STUDENTS)
+
+    def get_requests(self):
+        # The submission redirects to the submission page
+        return [
+            ('front page', 'testStudent', 'get', self.instance.get_absolute_url(), 200),
+            ('chapter', 'testStudent', 'get', self.chapter.get_absolute_url(), 200),
+            ('exercise', 'testStudent', 'get', self.exercise.get_absolute_url(), 200),
+            ('exercise submit', 'testStudent', 'post', self.exercise.get_absolute_url(), 302),
+            ('results', 'testStudent', 'get', self.instance.get_url('results'), 200),
+            ('participants', 'testTeacher', 'get', self.instance.get_url('participants'), 200),
+            ('all submissions', 'testTeacher', 'get', self.instance.get_url('all-submissions'), 200),
+        ]
+
+    def test_query_budgets(self):
+        for name, username, method, url, status in self.get_requests():
+            cold_budget, warm_budget = self.BUDGETS[name]
+            self.client.login(username=username, password='testPassword')
+            for cache_state, budget in (('cold', cold_budget), ('warm', warm_budget)):
+                with self.subTest(view=name, cache=cache_state):
+                    if cache_state == 'cold':
+                        cache.clear()
+                    with self.assertQueryBudget(budget):
+                        response = getattr(self.client, method)(url)
+                        # An error page or a redirect to the login makes
+                        # fewer queries, so the status is checked first
+                        self.assertEqual(response.status_code, status)
+
+
+class DeleteInBatchesTest(TestCase):
+
+    def setUp(self):
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(5)])
+
+    def test_batches(self):
+        states = []
+        result = delete_in_batches(
+            User.objects.filter(username__startswith='user'),
+            batch_size=2,
+            progress=lambda state: states.append((state.batches, state.deleted)),
+        )
+        self.assertEqual(states, [(1, 2), (2, 4), (3, 5)])
+        self.assertEqual(result.deleted_by_type[User._meta.label], 5)
+        self.assertFalse(User.objects.filter(username__startswith='user').exists())
+
+    def test_resume(self):
+        ids = list(User.objects.filter(username__startswith='user').order_by('id').values_list('id', flat=True))
+        result = delete_in_batches(User.objects.filter(username__startswith='user'), start_after=ids[2])
+        self.assertEqual(result.last_pk, ids[4])
+        self.assertEqual(
+            list(User.objects.filter(username__startswith='user').values_list('id', flat=True).order_by('id')),
+            ids[:3],
+        )
+
+
+class ProfilerTest(TestCase):
+
+    def test_profile_and_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=1, PROFILER_DIR=directory):
+                self.client.get('/')
+            profiles = list(read_profiles(directory))
+            self.assertEqual(len(profiles), 1)
+            metadata, _ = profiles[0]
+            self.assertEqual(metadata['view'], 'home')
+            self.assertGreater(metadata['wall_ms'], 0)
+
+            out = StringIO()
+            call_command('profile_report', dir=directory, top=5, stdout=out)
+            self.assertIn('home: 1 requests', out.getvalue())
+
+    def test_disabled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILER_ENABLED=False, PROFILER_SAMPLE_RATE=1, PROFILER_DIR=directory):
+                self.client.get('/')
+            self.assertEqual(list(read_profiles(directory)), [])
+
+    def test_report_without_profiles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            missing = os.path.join(directory, 'profiles')
+            self.assertEqual(list(read_profiles(missing)), [])
+            out = StringIO()
+            call_command('profile_report', dir=missing, stdout=out)
+            self.assertIn('No profiles found', out.getvalue())
@@ -1,3 +1,5 @@
+import time
+
 from django.db.models.signals import post_save, post_delete
 from django.utils import timezone
 
@@ -5,51 +7,70 @@ from lib.cache import CachedAbstract
 from .models import News
 
 
+# The audience of the news that are shown to external (True) and internal
+# (False) users, in addition to the news for all users
+USER_AUDIENCES = {
+    True: News.AUDIENCE.EXTERNAL_USERS,
+    False: News.AUDIENCE.INTERNAL_USERS,
+}
+
+
 class CachedNews(CachedAbstract):
-    KEY_PREFIX = 'news'
+    # The entries are stored under a new prefix because the entries under the
+    # old one did not have the visible news and the expiry
+    KEY_PREFIX = 'newsaudience'
 
     def __init__(self, course_instance):
         self.instance = course_instance
         super().__init__(course_instance)
 
+    def _needs_generation(self, data):
+        # The entry expires when the next future news item is published
+        expires = data['expires_on'] if data else None
+        return data is None or (expires is not None and time.time() >= expires)
+
     def _generate_data(self, instance, data=None): # pylint: disable=arguments-differ
-        news = [
-            {
-                'id': item.id,
-                'audience': item.audience,
-                'publish': item.publish,
-                'language': item.language,
-                'title': item.title,
-                'body': item.body,
-                'pin': item.pin,
-            }
-            for item in instance.news.all()
-        ]
+        # An expired entry is partitioned again from the cached items, which
+        # does not query the database
+        if data is None:
+            news = [
+                {
+                    'id': item.id,
+                    'audience': item.audience,
+                    'publish': item.publish,
+                    'language': item.language,
+                    'title': item.title,
+                    'body': item.body,
+                    'pin': item.pin,
+                }
+                for item in instance.news.all()
+            ]
+        else:
+            news = data['news']
+
+        now = timezone.now()
+        visible = {audience: [] for audience in USER_AUDIENCES.values()}
+        expires_on = None
+        for item in news:
+            if item['publish'] > now:
+                publish = item['publish'].timestamp()
+                expires_on = publish if expires_on is None else min(expires_on, publish)
+                continue
+            for audience in visible:
+                if item['audience'] in (audience, News.AUDIENCE.ALL_USERS):
+                    visible[audience].append(item)
 
         return {
             'news': news,
+            'visible': visible,
+            'expires_on': expires_on,
         }
 
     def for_staff(self):
         return self.data['news']
 
     def for_user(self, is_external=True):
-        EXTERNAL = (News.AUDIENCE.EXTERNAL_USERS, News.AUDIENCE.ALL_USERS)
-        INTERNAL = (News.AUDIENCE.INTERNAL_USERS, News.AUDIENCE.ALL_USERS)
-
-        def filter_news(items, audiences):
-            now = timezone.now()
-            return [
-                item for item in items if (
-                    item['publish'] <= now
-                    and item['audience'] in audiences
-                )
-            ]
-        if is_external:
-            return filter_news(self.data['news'], EXTERNAL)
-
-        return filter_news(self.data['news'], INTERNAL)
-
+        return self.data['visible'][USER_AUDIENCES[bool(is_external)]]
 
     @classmethod
     def is_visible(cls, entry, when=None):
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+
+from lib.testdata import CourseTestCase
+from .cache import CachedNews
+from .models import News
+
+
+class CachedNewsTest(CourseTestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.all_news = News.objects.create(
+            course_instance=self.instance,
+            audience=News.AUDIENCE.ALL_USERS,
+            title="All",
+            body="",
+            publish=now - timedelta(days=1),
+        )
+        self.internal_news = News.objects.create(
+            course_instance=self.instance,
+            audience=News.AUDIENCE.INTERNAL_USERS,
+            title="Internal",
+            body="",
+            publish=now - timedelta(days=1),
+        )
+        self.future_news = News.objects.create(
+            course_instance=self.instance,
+            audience=News.AUDIENCE.EXTERNAL_USERS,
+            title="Future",
+            body="",
+            publish=now + timedelta(hours=1),
+        )
+
+    def ids(self, items):
+        return {item['id'] for item in items}
+
+    def test_audiences(self):
+        news = CachedNews(self.instance)
+        self.assertEqual(
+            self.ids(news.for_staff()),
+            {self.all_news.id, self.internal_news.id, self.future_news.id},
+        )
+        self.assertEqual(self.ids(news.for_user(is_external=False)), {self.all_news.id, self.internal_news.id})
+        self.assertEqual(self.ids(news.for_user(is_external=True)), {self.all_news.id})
+        self.assertEqual(news.data['expires_on'], self.future_news.publish.timestamp())
+
+    def test_future_news_published(self):
+        CachedNews(self.instance)
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('news.cache.timezone.now', return_value=later), \
+                mock.patch('news.cache.time.time', return_value=later.timestamp()):
+            # The cached items are partitioned again without queries
+            with self.assertNumQueries(0):
+                news = CachedNews(self.instance)
+        self.assertEqual(self.ids(news.for_user(is_external=True)), {self.all_news.id, self.future_news.id})
+        self.assertIsNone(news.data['expires_on'])
+
+    def test_invalidation(self):
+        CachedNews(self.instance)
+        self.internal_news.audience = News.AUDIENCE.EXTERNAL_USERS
+        self.internal_news.save()
+        news = CachedNews(self.instance)
+        self.assertEqual(self.ids(news.for_user(is_external=True)), {self.all_news.id, self.internal_news.id})
@@ -1,9 +1,17 @@
+from typing import Iterable
+
+from django.core.cache import cache
 from django.db.models.signals import post_save, post_delete
 
 from lib.cache import CachedAbstract
 from .models import Notification
 
 
+# The unread counts are recounted at least this often, so that a count
+# cannot drift from the database for long
+UNREAD_COUNT_TIMEOUT = 24 * 60 * 60
+
+
 class CachedNotifications(CachedAbstract):
     KEY_PREFIX = "notifications"
 
@@ -58,8 +66,57 @@ class CachedNotifications(CachedAbstract):
         return self.data['notifications']
 
 
+def _unread_count_key(user_id: int) -> str:
+    return "notificationcount:{:d}".format(user_id)
+
+
+def unread_count(user) -> int:
+    """
+    Returns the number of unseen notifications of the user. The count is
+    kept in the cache separately from CachedNotifications and incremented
+    when notifications are sent, so it does not require the notifications to
+    be loaded.
+    """
+    if not user or not user.is_authenticated:
+        return 0
+    key = _unread_count_key(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = (
+            Notification.objects
+            .filter(
+                recipient__user=user,
+                seen=False,
+                course_instance__visible_to_students=True,
+            )
+            .count()
+        )
+        cache.add(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_unread_counts(user_ids: Iterable[int]) -> None:
+    cache.delete_many([_unread_count_key(user_id) for user_id in user_ids])
+
+
+def notifications_sent(notifications: Iterable[Notification]) -> None:
+    """Updates the caches of the recipients of the new notifications"""
+    user_ids = set()
+    for notification in notifications:
+        user_id = notification.recipient.user_id
+        user_ids.add(user_id)
+        if notification.course_instance.visible_to_students:
+            try:
+                cache.incr(_unread_count_key(user_id))
+            except ValueError:
+                # The count is not in the cache, so it is counted when needed
+                pass
+    CachedNotifications.invalidate_many([(user_id,) for user_id in user_ids])
+
+
 def invalidate_notifications(sender, instance, **kwargs): # pylint: disable=unused-argument
     CachedNotifications.invalidate(instance.recipient.user)
+    invalidate_unread_counts([instance.recipient.user_id])
 
 
 # Automatically invalidate cache when notifications change.
@@ -3,6 +3,7 @@ import datetime
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from lib.deletion import add_batch_arguments, batch_options, delete_in_batches
 from notification.models import Notification
 
 
@@ -36,6 +37,7 @@ class Command(BaseCommand):
             action='store_true',
             help="Delete unseen notifications in addition to seen notifications.",
         )
+        add_batch_arguments(parser)
 
     def handle(self, *args, **options):
         until = options['until']
@@ -50,11 +52,20 @@ class Command(BaseCommand):
         if options['delete_unseen']:
             del conditions['seen']
 
-        num_deleted, num_deleted_by_type = Notification.objects.filter(**conditions).delete()
-        if num_deleted == 0:
+        def progress(state):
+            self.stdout.write(
+                f"Deleted {state.deleted} rows. To resume, use --start-after {state.last_pk}."
+            )
+
+        result = delete_in_batches(
+            Notification.objects.filter(**conditions),
+            progress=progress,
+            **batch_options(options),
+        )
+        if result.deleted == 0:
             self.stdout.write("No notifications deleted.")
         else:
-            for typ, n in num_deleted_by_type.items():
+            for typ, n in result.deleted_by_type.items():
                 self.stdout.write('Deleted {rows} rows from table {table}.'.format(
                     rows=n,
                     table=typ,
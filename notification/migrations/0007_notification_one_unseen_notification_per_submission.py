@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+# Mark the extra unseen notifications of the same submission and recipient as
+# seen, so that the unique constraint can be added.
+def mark_duplicates_seen(apps, schema_editor):
+    Notification = apps.get_model('notification', 'Notification')
+    duplicates = (
+        Notification.objects
+        .filter(seen=False, submission__isnull=False)
+        .values('submission_id', 'recipient_id')
+        .annotate(count=Count('id'), first_id=Min('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        (Notification.objects
+            .filter(
+                seen=False,
+                submission_id=duplicate['submission_id'],
+                recipient_id=duplicate['recipient_id'],
+            )
+            .exclude(id=duplicate['first_id'])
+            .update(seen=True)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0006_notification_regrade_when_seen'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_duplicates_seen, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('seen', False)),
+                fields=('submission', 'recipient'),
+                name='one_unseen_notification_per_submission',
+            ),
+        ),
+    ]
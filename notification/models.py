@@ -1,4 +1,7 @@
-from django.db import models
+from typing import Iterable, List, Optional
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q, prefetch_related_objects
 from django.utils.translation import gettext_lazy as _
 
 from course.models import CourseInstance
@@ -58,6 +61,14 @@ class Notification(UrlMixin, models.Model):
         verbose_name = _('MODEL_NAME_NOTIFICATION')
         verbose_name_plural = _('MODEL_NAME_NOTIFICATION_PLURAL')
         ordering = ['-timestamp']
+        constraints = [
+            # A submission has at most one unseen notification per recipient
+            models.UniqueConstraint(
+                fields=['submission', 'recipient'],
+                condition=Q(seen=False),
+                name='one_unseen_notification_per_submission',
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -67,20 +78,72 @@ class Notification(UrlMixin, models.Model):
 
     @classmethod
     def send(cls, sender: UserProfile, submission: Submission, regrade_when_seen: bool = False) -> None:
-        for recipient in submission.submitters.all():
-            if not Notification.objects.filter(
-                submission=submission,
-                recipient=recipient,
+        cls.send_many(sender, [submission], regrade_when_seen)
+
+    @classmethod
+    def send_many(
+            cls,
+            sender: Optional[UserProfile],
+            submissions: Iterable[Submission],
+            regrade_when_seen: bool = False,
+            ) -> List['Notification']:
+        """
+        Notifies the submitters of each submission, unless they already have
+        an unseen notification of the submission. Returns the new
+        notifications.
+        """
+        submissions = list(submissions)
+        if not submissions:
+            return []
+        prefetch_related_objects(submissions, 'submitters', 'exercise__course_module__course_instance')
+        existing = set(
+            Notification.objects
+            .filter(
+                submission__in=submissions,
+                recipient__in={r for s in submissions for r in s.submitters.all()},
                 seen=False,
-            ).exists():
-                notification = Notification(
+            )
+            .values_list('submission_id', 'recipient_id')
+        )
+        notifications = []
+        for submission in submissions:
+            for recipient in submission.submitters.all():
+                if (submission.id, recipient.id) in existing:
+                    continue
+                existing.add((submission.id, recipient.id))
+                notifications.append(Notification(
                     sender=sender,
                     recipient=recipient,
                     course_instance=submission.exercise.course_instance,
                     submission=submission,
-                    regrade_when_seen=regrade_when_seen
-                )
-                notification.save()
+                    regrade_when_seen=regrade_when_seen,
+                ))
+        if not notifications:
+            return []
+        try:
+            with transaction.atomic():
+                Notification.objects.bulk_create(notifications)
+        except IntegrityError:
+            # Some of the notifications were created concurrently after the
+            # check above. The rest are created one at a time so that only the
+            # notifications that were actually created are counted and returned.
+            created = []
+            for notification in notifications:
+                try:
+                    with transaction.atomic():
+                        Notification.objects.bulk_create([notification])
+                except IntegrityError:
+                    continue
+                created.append(notification)
+            notifications = created
+
+        # bulk_create does not send the signals that update the caches
+        # pylint: disable-next=import-outside-toplevel
+        from exercise.cache.points import invalidate_notifications_sent
+        from .cache import notifications_sent # pylint: disable=import-outside-toplevel
+        notifications_sent(notifications)
+        invalidate_notifications_sent(notifications)
+        return notifications
 
     @classmethod
     def remove(cls, submission):
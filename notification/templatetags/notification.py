@@ -1,29 +1,38 @@
 from django import template
 from django.utils.translation import ngettext
 
-from ..cache import CachedNotifications
+from ..cache import CachedNotifications, unread_count
 
 
 register = template.Library()
 
 
+def _context_user(context):
+    return context['request'].user if 'request' in context else None
+
+
 def _context_unread(context):
     if 'notifications' not in context:
-        context['notifications'] = CachedNotifications(
-            context['request'].user if 'request' in context else None
-        )
+        context['notifications'] = CachedNotifications(_context_user(context))
     return context['notifications']
 
 
+def _context_count(context):
+    if 'notification_count' not in context:
+        context['notification_count'] = unread_count(_context_user(context))
+    return context['notification_count']
+
+
 def _unread_messages(context):
-    notifications = _context_unread(context)
+    count = _context_count(context)
+    # The notifications are loaded only if there are unread ones
     return {
-        'count': notifications.count(),
-        'notifications': notifications.notifications(),
+        'count': count,
+        'notifications': _context_unread(context).notifications() if count else [],
         "unread_message": ngettext(
             'NEW_NOTIFICATION',
             'NEW_NOTIFICATIONS',
-            notifications.count()
+            count
         ),
     }
 
@@ -40,5 +49,4 @@ def notification_menu(context):
 
 @register.simple_tag(takes_context=True)
 def notification_count(context):
-    notifications = _context_unread(context)
-    return notifications.count()
+    return _context_count(context)
@@ -1,5 +1,10 @@
+from unittest import mock
+
+from exercise.cache.points import CachedPoints
+from exercise.models import Submission
+from lib.querystats import record_stats
 from lib.testdata import CourseTestCase
-from .cache import CachedNotifications
+from .cache import CachedNotifications, unread_count
 from .models import Notification
 
 
@@ -37,3 +42,63 @@ class NotificationTest(CourseTestCase):
         Notification.remove(self.submission3)
         cn = CachedNotifications(self.student)
         self.assertEqual(cn.count(), 0)
+
+    def test_send_many(self):
+        self.assertEqual(unread_count(self.student), 0)
+        self.assertEqual(unread_count(self.user), 0)
+
+        with self.assertQueryBudget(15):
+            notifications = Notification.send_many(
+                self.teacher.userprofile,
+                [self.submission, self.submission2, self.submission3],
+            )
+        self.assertEqual(len(notifications), 4)
+        # The counts are incremented without counting them again
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.student), 3)
+            self.assertEqual(unread_count(self.user), 1)
+        self.assertEqual(CachedNotifications(self.student).count(), 3)
+
+        # The submitters that already have unseen notifications are skipped
+        self.assertEqual(Notification.send_many(None, [self.submission, self.submission3]), [])
+        self.assertEqual(Notification.objects.filter(seen=False).count(), 4)
+
+        n = Notification.objects.filter(recipient=self.user.userprofile).first()
+        n.seen = True
+        n.save()
+        self.assertEqual(unread_count(self.user), 0)
+        self.assertEqual(len(Notification.send_many(None, [self.submission3])), 1)
+        self.assertEqual(unread_count(self.user), 1)
+
+    def send_to_new_submissions(self, count):
+        submissions = []
+        for _ in range(count):
+            submission = Submission.objects.create(exercise=self.exercise)
+            submission.submitters.add(self.student.userprofile, self.user.userprofile)
+            submissions.append(submission)
+        with record_stats() as stats:
+            notifications = Notification.send_many(self.teacher.userprofile, submissions)
+        self.assertEqual(len(notifications), 2 * count)
+        return stats.queries
+
+    def test_send_many_queries_do_not_grow(self):
+        self.assertEqual(self.send_to_new_submissions(3), self.send_to_new_submissions(10))
+
+    def test_send_many_invalidates_points(self):
+        self.assertFalse(CachedPoints(self.instance, self.student).find(self.exercise)[0].notified)
+        Notification.send_many(None, [self.submission])
+        entry = CachedPoints(self.instance, self.student).find(self.exercise)[0]
+        self.assertTrue(entry.notified)
+        self.assertTrue(entry.unseen)
+
+    def test_send_many_concurrently(self):
+        Notification.send_many(None, [self.submission])
+        self.assertEqual(unread_count(self.student), 1)
+        # Another sender created the notification of the first submission
+        # after the existing notifications were checked
+        with mock.patch.object(Notification.objects, 'filter') as notification_filter:
+            notification_filter.return_value.values_list.return_value = []
+            notifications = Notification.send_many(None, [self.submission, self.submission2])
+        self.assertEqual([n.submission for n in notifications], [self.submission2])
+        self.assertEqual(unread_count(self.student), 2)
+        self.assertEqual(Notification.objects.filter(seen=False, recipient=self.student.userprofile).count(), 2)
@@ -3,9 +3,11 @@ import datetime
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
 from django.db.models.query import QuerySet
-from course.models import CourseInstance
+from course.models import Enrollment
 from django.utils import timezone
 
+from lib.deletion import add_batch_arguments, batch_options, delete_in_batches
+
 
 class Command(BaseCommand):
     help = 'Delete inactive users based on the last_login timestamp, and course enrollment status'
@@ -21,18 +23,38 @@ class Command(BaseCommand):
             action='store_true',
             help='Do not delete anything, but show which users would be deleted.',
         )
+        # Deleting a user cascades to the submissions of the user, so the
+        # batches are smaller than by default
+        add_batch_arguments(parser, batch_size=100)
 
     def handle(self, *args, **options):
         since_delta = datetime.timedelta(days=options['days_ago'])
         since = timezone.now() - since_delta
-        users: QuerySet[User] = User.objects.filter(last_login__lte=since)
+        # Users that are active in any role on any course instance are not
+        # deleted. Admins are ignored.
+        users: QuerySet[User] = (
+            User.objects
+            .filter(last_login__lte=since, is_superuser=False)
+            .exclude(
+                id__in=Enrollment.objects
+                .filter(status=Enrollment.ENROLLMENT_STATUS.ACTIVE)
+                .values('user_profile__user_id')
+            )
+        )
+        kwargs = batch_options(options)
 
         if options['dry_run']:
             self.stdout.write('This is just a dry run. Nothing will be deleted.')
+            if kwargs['start_after'] is not None:
+                users = users.filter(id__gt=kwargs['start_after'])
+            for username in users.order_by('id').values_list('username', flat=True).iterator():
+                self.stdout.write(f"Deleting user {username}")
+            return
+
+        def progress(state):
+            self.stdout.write(
+                f"Deleted {state.deleted_by_type[User._meta.label]} users. "
+                f"To resume, use --start-after {state.last_pk}."
+            )
 
-        for u in users:
-            # Is user active in any role on any course instance? Admins are ignored.
-            if not CourseInstance.objects.get_active(u.userprofile).exists() and not u.is_superuser:
-                self.stdout.write(f"Deleting user {u.username}")
-                if not options['dry_run']:
-                    u.delete()
+        delete_in_batches(users, progress=progress, **kwargs)
@@ -1,42 +1,123 @@
+from dataclasses import dataclass
+from functools import lru_cache
 import json
-from random import seed, choice
-
-from faker import Faker
+from random import Random
 import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
 
 from django.contrib.auth.models import User
 from django.contrib.staticfiles import finders
 
 from userprofile.models import UserProfile
 
-fake = Faker(['fi_FI', 'en_US'], use_weighting=False)
+if TYPE_CHECKING:
+    from faker import Faker
+
 num_fakes = 500
+# Number of distinct values whose pseudonyms are remembered in each process
+PSEUDONYM_CACHE_SIZE = 100000
+
+# The fake values and the pseudonym data are only created when they are first
+# needed, so that importing this module (and starting a process) stays fast.
+# The pseudonyms are computed with their own Random instances, so that they do
+# not depend on or change the state of the global random generators.
+
+@lru_cache(maxsize=None)
+def get_faker() -> 'Faker':
+    from faker import Faker # pylint: disable=import-outside-toplevel
+    fake = Faker(['fi_FI', 'en_US'], use_weighting=False)
+    # The same fake values in every process
+    fake.seed_instance(0)
+    return fake
+
 
-fakes = {
-    'email': [fake.email() for _ in range(num_fakes)],
-    'username': [fake.user_name() for _ in range(num_fakes)],
-}
+@lru_cache(maxsize=None)
+def get_fakes() -> Dict[str, List[str]]:
+    fake = get_faker()
+    return {
+        'email': [fake.email() for _ in range(num_fakes)],
+        'username': [fake.user_name() for _ in range(num_fakes)],
+    }
 
-with open(finders.find('../assets/pseudonym.json'), encoding='utf-8') as json_file:
-    DATA = json.load(json_file)
 
+@lru_cache(maxsize=None)
+def get_data() -> Dict[str, Any]:
+    with open(finders.find('../assets/pseudonym.json'), encoding='utf-8') as json_file:
+        return json.load(json_file)
 
+
+@lru_cache(maxsize=PSEUDONYM_CACHE_SIZE)
 def pseudonymize(key: str, data: str):
     hashkey = int(hashlib.sha256(data.encode('utf-8')).hexdigest(), 16) % num_fakes
+    fakes = get_fakes()
     if key in fakes:
         return fakes[key][hashkey]
     return key
 
 
+@lru_cache(maxsize=PSEUDONYM_CACHE_SIZE)
+def pseudonymize_name(first_name: str) -> Tuple[str, str]:
+    data = get_data()
+    rng = Random(first_name)
+    return rng.choice(data["colors"])["name"], rng.choice(data["animals"])
+
+
+@lru_cache(maxsize=PSEUDONYM_CACHE_SIZE)
+def pseudonymize_student_id(student_id: str) -> str:
+    rng = Random(student_id)
+    # The same numbers as Faker(['fi_FI', 'en_US']).random_int(min=10, max=10000)
+    # after seeding Faker with the student id, which first picks the locale.
+    rng.choice((0, 1))
+    return str(rng.randrange(10, 10001))
+
+
+@dataclass(frozen=True)
+class Pseudonym:
+    """The pseudonymized attributes of a user, for rendering them without
+    modifying the User and UserProfile objects."""
+    user_id: int
+    first_name: str
+    last_name: str
+    email: str
+    username: str
+    student_id: Optional[str]
+
+    def get_full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}".strip()
+
+
+def get_pseudonym(user: User, user_profile: Optional[UserProfile] = None) -> Pseudonym:
+    first_name, last_name = pseudonymize_name(user.first_name)
+    student_id = None
+    if user_profile is not None and user_profile.student_id is not None:
+        student_id = pseudonymize_student_id(user_profile.student_id)
+    return Pseudonym(
+        user_id=user.id,
+        first_name=first_name,
+        last_name=last_name,
+        email=pseudonymize('email', user.email),
+        username=pseudonymize('username', user.username),
+        student_id=student_id,
+    )
+
+
+def get_pseudonyms(profiles: Iterable[UserProfile]) -> Dict[int, Pseudonym]:
+    """Returns the pseudonyms of the users of the profiles by user profile id"""
+    return {
+        profile.id: get_pseudonym(profile.user, profile)
+        for profile in profiles
+    }
+
+
 def format_user(user: User, pseudonymized: bool, user_profile: UserProfile = None):
     if pseudonymized:
-        # Return formatted versions of the user's attributes and all the user class's methods
+        # Replace the user's attributes with the pseudonyms for the templates
+        # that render the User and UserProfile objects
+        pseudonym = get_pseudonym(user, user_profile)
         if user_profile is not None:
-            Faker.seed(user_profile.student_id)
-            user_profile.student_id = str(fake.random_int(min=10, max=10000))
-        seed(user.first_name)
-        user.first_name = choice(DATA["colors"])["name"]
-        user.last_name = choice(DATA["animals"])
-        user.email = pseudonymize('email', user.email)
-        user.username = pseudonymize('username', user.username)
+            user_profile.student_id = pseudonym.student_id
+        user.first_name = pseudonym.first_name
+        user.last_name = pseudonym.last_name
+        user.email = pseudonym.email
+        user.username = pseudonym.username
     return user
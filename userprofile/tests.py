@@ -1,13 +1,15 @@
 from datetime import timedelta
+import random
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.utils import timezone
 from django.conf import settings
 
 from course.models import Course, CourseInstance
 from exercise.models import LearningObjectCategory
 from userprofile.models import UserProfile
+from userprofile.pseudonymize import format_user, get_pseudonym, get_pseudonyms
 
 class UserProfileTestCase(TestCase):
 
@@ -191,3 +193,54 @@ class UserProfileTest(UserProfileTestCase):
 #         studentsFromRequestWithoutGroup = StudentGroup.get_students_from_request(requestWithoutGroup)
 #         self.assertEqual(1, len(studentsFromRequestWithoutGroup))
 #         self.assertEqual(self.student_profile, studentsFromRequestWithoutGroup[0])
+
+
+class PseudonymizeTest(SimpleTestCase):
+    def make_profiles(self, count):
+        profiles = []
+        for i in range(count):
+            user = User(
+                id=i + 1,
+                username=f"user{i}",
+                first_name=f"First{i}",
+                last_name=f"Last{i}",
+                email=f"user{i}@example.com",
+            )
+            profiles.append(UserProfile(id=i + 1, user=user, student_id=str(100000 + i)))
+        return profiles
+
+    def test_student_id_matches_faker(self):
+        from faker import Faker # pylint: disable=import-outside-toplevel
+        fake = Faker(['fi_FI', 'en_US'], use_weighting=False)
+        for profile in self.make_profiles(5):
+            type(fake).seed(profile.student_id)
+            expected = str(fake.random_int(min=10, max=10000))
+            self.assertEqual(get_pseudonym(profile.user, profile).student_id, expected)
+        type(fake).seed(None)
+
+    def test_global_random_is_not_changed(self):
+        random.seed(1)
+        expected = random.random()
+        random.seed(1)
+        get_pseudonyms(self.make_profiles(10))
+        self.assertEqual(random.random(), expected)
+
+    def test_format_user(self):
+        profile = self.make_profiles(1)[0]
+        pseudonym = get_pseudonym(profile.user, profile)
+        format_user(profile.user, True, profile)
+        self.assertEqual(profile.user.first_name, pseudonym.first_name)
+        self.assertEqual(profile.user.last_name, pseudonym.last_name)
+        self.assertEqual(profile.user.email, pseudonym.email)
+        self.assertEqual(profile.user.username, pseudonym.username)
+        self.assertEqual(profile.student_id, pseudonym.student_id)
+
+    def test_batch(self):
+        # The size of a large participants table
+        profiles = self.make_profiles(5000)
+        pseudonyms = get_pseudonyms(profiles)
+        self.assertEqual(len(pseudonyms), 5000)
+        self.assertEqual(pseudonyms, get_pseudonyms(profiles))
+        # The profiles are not modified
+        self.assertEqual(profiles[0].user.first_name, "First0")
+        self.assertEqual(profiles[0].student_id, "100000")